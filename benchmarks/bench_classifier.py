@@ -0,0 +1,62 @@
+"""
+Spam classifier benchmark: model load time and scoring throughput per batch size.
+
+    python -m benchmarks.bench_classifier [--messages 20000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from services.spam_classifier import SpamClassifier
+
+HAM_WORDS = "salom bugun ertaga uchrashuv dars guruh savol javob rahmat yordam kitob vaqt soat uy ish".split()
+SPAM_WORDS = "pul bonus kazino yutuq bepul kripto daromad reklama obuna link tez chegirma aksiya".split()
+
+
+def synthetic_messages(count: int, spam_rate: float, rng: random.Random):
+    texts, labels = [], []
+    for _ in range(count):
+        spam = rng.random() < spam_rate
+        words = rng.choices(HAM_WORDS, k=rng.randint(4, 40))
+        if spam:
+            words += rng.choices(SPAM_WORDS, k=rng.randint(2, 8))
+            rng.shuffle(words)
+        texts.append(" ".join(words))
+        labels.append(1 if spam else 0)
+    return texts, labels
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    texts, labels = synthetic_messages(args.messages, 0.2, rng)
+
+    started = time.perf_counter()
+    model = SpamClassifier.train(texts, labels)
+    print(f"train: {len(texts)} messages in {time.perf_counter() - started:.3f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.npz")
+        model.save(path)
+        started = time.perf_counter()
+        model = SpamClassifier.load(path)
+        print(f"load: {(time.perf_counter() - started) * 1000:.1f} ms ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+    accuracy = sum((s >= 0.5) == bool(l) for s, l in zip(model.score(texts), labels)) / len(texts)
+    print(f"training-set accuracy: {accuracy:.3f}")
+
+    for batch_size in (1, 16, 64, 256):
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        started = time.perf_counter()
+        for batch in batches:
+            model.score(batch)
+        elapsed = time.perf_counter() - started
+        print(f"batch {batch_size:>4}: {len(texts) / elapsed:>10.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
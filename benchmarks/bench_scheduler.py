@@ -0,0 +1,82 @@
+"""
+Post scheduler benchmark.
+
+Replays a simulated day (services/simulator.py) for synthetic groups over a matrix of
+group counts and schedules per group. Schedules are either spread over the day or all
+at the same minutes (the worst case for the rate limits). Reports the wall time of the
+replay, the scheduler ticks, and the peak minute and lateness the rate limits cause.
+
+    python -m benchmarks.bench_scheduler
+    python -m benchmarks.bench_scheduler --groups 1000 --schedules 4 --layouts burst --rate 30
+"""
+import argparse
+import itertools
+import random
+from datetime import datetime
+from config import SEND_WORKERS, SEND_RATE, SEND_CHAT_INTERVAL
+from services.simulator import Snapshot, run_simulation
+
+START = datetime(2024, 1, 1)
+
+
+def build_snapshot(group_count: int, schedules: int, layout: str, posts: int, seed: int) -> Snapshot:
+    rng = random.Random(seed)
+    groups, post_rows, schedule_rows = [], [], []
+    # Burst: every group fires at the same minutes
+    burst_times = [f"{(9 + 12 * i // max(schedules, 1)) % 24:02d}:00" for i in range(schedules)]
+    for g in range(1, group_count + 1):
+        groups.append({"id": g, "telegram_id": -1000000 - g, "title": f"Group {g}", "next_post_index": 0, "rotation_mode": "sequential"})
+        for i in range(posts):
+            post_rows.append({"id": g * posts + i, "group_id": g, "content_type": "text", "text": f"post {i}", "version": 1, "weight": 1})
+        for i in range(schedules):
+            if layout == "burst":
+                at = burst_times[i]
+            else:
+                at = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+            schedule_rows.append({
+                "id": g * schedules + i, "group_id": g, "post_id": None, "time": at,
+                "is_recurring": 1, "next_run_at": START
+            })
+    return Snapshot({"groups": groups, "posts": post_rows, "post_items": [], "schedule_times": schedule_rows})
+
+
+def parse_list(value: str, cast):
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", default="10,100,1000")
+    parser.add_argument("--schedules", default="1,4")
+    parser.add_argument("--layouts", default="spread,burst")
+    parser.add_argument("--posts", type=int, default=5, help="posts per group")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--workers", type=int, default=SEND_WORKERS)
+    parser.add_argument("--rate", type=float, default=SEND_RATE)
+    parser.add_argument("--chat-interval", type=float, default=SEND_CHAT_INTERVAL)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    matrix = itertools.product(
+        parse_list(args.groups, int),
+        parse_list(args.schedules, int),
+        parse_list(args.layouts, str)
+    )
+
+    header = f"{'groups':>6} {'sched':>5} {'layout':>6} {'wall s':>7} {'ticks':>5} {'sent':>6} {'failed':>6} {'peak/min':>8} {'late p50':>8} {'late p99':>8} {'late max':>8}"
+    print(header)
+    print("-" * len(header))
+    for group_count, schedules, layout in matrix:
+        snapshot = build_snapshot(group_count, schedules, layout, args.posts, args.seed)
+        r = run_simulation(
+            snapshot, START,
+            hours=args.hours, workers=args.workers, rate=args.rate, chat_interval=args.chat_interval
+        )
+        print(
+            f"{group_count:>6} {schedules:>5} {layout:>6} {r.wall_seconds:>7.2f} {r.ticks:>5} {r.sent:>6} {r.failed:>6} "
+            f"{r.peak_minute[1]:>8} {r.lateness_percentile(0.5):>8.2f} {r.lateness_percentile(0.99):>8.2f} {max(r.lateness, default=0.0):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+SpamFilterMiddleware throughput benchmark.
+
+Drives the real middleware with synthetic group messages over a matrix of keyword
+counts, message lengths, group counts and spam hit rates. Groups and keywords live
+in an in-memory SQLite database, and a fake bot records the spam actions.
+
+    python -m benchmarks.bench_spam_filter
+    python -m benchmarks.bench_spam_filter --keywords 100 --lengths 500 --groups 1,1000 --hit-rates 0.1 --messages 5000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import string
+import time
+from datetime import datetime
+from typing import List
+from aiogram.types import Chat, Message, User as TgUser
+from sqlalchemy import event as sa_event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, Group, Keyword, User
+from middlewares.spam_filter import SpamFilterMiddleware
+from services.group_cache import GroupCache
+from services.spam_actions import SpamActionQueue
+from services.spam_digest import SpamDigest
+from services.spam_samples import SampleRecorder
+from services.flood import FloodDetector
+from services.fingerprint import FingerprintIndex
+from services.spam_classifier import ClassifierBatcher
+
+
+class FakeBot:
+    """Stands in for aiogram.Bot; counts the API calls the spam actions make."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def _call(self, *args, **kwargs):
+        self.calls += 1
+
+    forward_message = delete_message = send_message = restrict_chat_member = _call
+
+
+def random_words(rng: random.Random, length: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+async def build_database(group_count: int, keyword_count: int, rng: random.Random):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    keywords = [f"spam{i}{''.join(rng.choices(string.ascii_lowercase, k=4))}" for i in range(keyword_count)]
+
+    async with Session() as session:
+        owner = User(telegram_id=1, full_name="Owner")
+        session.add(owner)
+        await session.flush()
+        await session.execute(insert(Group), [
+            {"id": i + 1, "telegram_id": -1000000 - i, "title": f"Group {i}", "owner_id": owner.id}
+            for i in range(group_count)
+        ])
+        await session.execute(insert(Keyword), [
+            {"group_id": i + 1, "word": kw} for i in range(group_count) for kw in keywords
+        ])
+        await session.commit()
+    return engine, Session, keywords
+
+
+def build_messages(count: int, group_count: int, length: int, hit_rate: float, keywords: List[str], bot, rng: random.Random):
+    messages = []
+    for i in range(count):
+        text = random_words(rng, length)
+        if rng.random() < hit_rate:
+            pos = rng.randint(0, max(0, len(text) - 1))
+            text = text[:pos] + " " + rng.choice(keywords) + " " + text[pos:]
+        chat_id = -1000000 - rng.randrange(group_count)
+        message = Message(
+            message_id=i + 1,
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="supergroup"),
+            from_user=TgUser(id=100 + rng.randrange(1000), is_bot=False, first_name="User"),
+            text=text
+        )
+        messages.append(message.as_(bot))
+    return messages
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+async def run_scenario(keyword_count: int, length: int, group_count: int, hit_rate: float, messages_count: int, seed: int):
+    rng = random.Random(seed)
+    engine, Session, keywords = await build_database(group_count, keyword_count, rng)
+
+    queries = 0
+
+    def count_query(*args):
+        nonlocal queries
+        queries += 1
+
+    sa_event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    bot = FakeBot()
+    actions = SpamActionQueue(max_size=messages_count + 1, workers=4, digest=SpamDigest(window=0), samples=SampleRecorder())
+    middleware = SpamFilterMiddleware(
+        cache=GroupCache(max_size=max(group_count, 1)),
+        actions=actions,
+        flood=FloodDetector(),
+        fingerprints=FingerprintIndex(),
+        dup_threshold=0,
+        classifier=ClassifierBatcher()
+    )
+
+    async def handler(event, data):
+        return None
+
+    async def feed(messages):
+        latencies = []
+        for message in messages:
+            session = Session()
+            started = time.perf_counter()
+            await middleware(handler, message, {"session": session})
+            latencies.append(time.perf_counter() - started)
+            await session.close()
+        return latencies
+
+    # Warm-up: one message per group fills the cache (the cold path)
+    warmup = build_messages(group_count, group_count, length, 0.0, keywords, bot, rng)
+    for i, message in enumerate(warmup):
+        warmup[i] = message.model_copy(update={"chat": Chat(id=-1000000 - i, type="supergroup")}).as_(bot)
+    cold = sorted(await feed(warmup))
+
+    messages = build_messages(messages_count, group_count, length, hit_rate, keywords, bot, rng)
+    queries = 0
+    started = time.perf_counter()
+    latencies = sorted(await feed(messages))
+    elapsed = time.perf_counter() - started
+    await actions.join()
+    await actions.stop()
+    await engine.dispose()
+
+    return {
+        "keywords": keyword_count,
+        "length": length,
+        "groups": group_count,
+        "hit_rate": hit_rate,
+        "cold_p50_ms": percentile(cold, 0.5) * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "msg_per_s": len(messages) / elapsed,
+        "queries": queries,
+        "actions": actions.processed,
+    }
+
+
+def parse_list(value: str, cast):
+    return [cast(v) for v in value.split(",") if v]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", default="10,100,1000")
+    parser.add_argument("--lengths", default="50,500,4000")
+    parser.add_argument("--groups", default="1,100")
+    parser.add_argument("--hit-rates", default="0,0.1")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    matrix = itertools.product(
+        parse_list(args.keywords, int),
+        parse_list(args.lengths, int),
+        parse_list(args.groups, int),
+        parse_list(args.hit_rates, float)
+    )
+
+    header = f"{'keywords':>8} {'length':>6} {'groups':>6} {'hits':>5} {'cold p50':>9} {'p50 ms':>8} {'p99 ms':>8} {'msg/s':>9} {'queries':>7} {'actions':>7}"
+    print(header)
+    print("-" * len(header))
+    for keyword_count, length, group_count, hit_rate in matrix:
+        r = await run_scenario(keyword_count, length, group_count, hit_rate, args.messages, args.seed)
+        print(
+            f"{r['keywords']:>8} {r['length']:>6} {r['groups']:>6} {r['hit_rate']:>5.2f} "
+            f"{r['cold_p50_ms']:>9.3f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['msg_per_s']:>9.0f} "
+            f"{r['queries']:>7} {r['actions']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,20 @@
 import asyncio
 import logging
+from datetime import datetime, timezone
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
+from config import BOT_TOKEN, CLASSIFIER_MODEL_PATH
 from middlewares.db import DbSessionMiddleware
 from middlewares.spam_filter import SpamFilterMiddleware
-from services.scheduler import setup_scheduler
-from database.engine import init_db
+from services.scheduler import setup_scheduler, stop_scheduler
+from database.engine import init_db, AsyncSessionLocal
+from services.group_cache import group_cache
+from services.schedule_index import schedule_index
+from services.recurrence import backfill_next_run_at
+from services.rotation import backfill_rotation
+from services.spam_actions import spam_actions
+from services.broadcast import broadcasts
+from services.spam_samples import sample_recorder
+from services.spam_classifier import classifier_batcher
 from utils.notify_admins import on_startup_notify
 
 # Logger setup
@@ -23,6 +32,20 @@ async def main():
     # Initialize Database
     await init_db()
 
+    # Bloom prefilter of registered chats, so unknown chats skip the DB in the spam filter
+    async with AsyncSessionLocal() as session:
+        await group_cache.load_known_ids(session)
+        # Schedules created before next_run_at existed get it computed once
+        await backfill_next_run_at(session, datetime.now(timezone.utc))
+        # Rotation cursors and weight ranges of groups from before they existed
+        await backfill_rotation(session)
+        # next_run_at heap of schedules for the scheduler tick
+        await schedule_index.load(session)
+
+    # Optional spam classifier, trained offline with train_classifier.py
+    if classifier_batcher.load(CLASSIFIER_MODEL_PATH):
+        logger.info(f"Spam classifier loaded from {CLASSIFIER_MODEL_PATH}")
+
     bot = Bot(token=BOT_TOKEN)
     dp = Dispatcher()
 
@@ -43,6 +66,17 @@ async def main():
     # Scheduler
     setup_scheduler(bot)
 
+    # Classifier training samples are written in batches in the background
+    sample_recorder.start()
+
+    # Groups registered by other replicas reach the bloom prefilter on its periodic rebuild
+    group_cache.start(AsyncSessionLocal)
+
+    # Broadcasts interrupted by the last shutdown continue after their last sent batch
+    resumed = await broadcasts.resume_all(bot)
+    if resumed:
+        logger.info(f"Resumed {resumed} broadcast(s)")
+
     # Delete webhook to run polling
     await bot.delete_webhook(drop_pending_updates=True)
 
@@ -52,6 +86,11 @@ async def main():
     try:
         await dp.start_polling(bot)
     finally:
+        await stop_scheduler()
+        await broadcasts.stop()
+        await spam_actions.stop()
+        await sample_recorder.stop()
+        await group_cache.stop()
         await bot.session.close()
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,3 +15,92 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "auto_post_guard_bot")
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Spam filter caches
+GROUP_CACHE_SIZE = int(os.getenv("GROUP_CACHE_SIZE", "10000"))
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "600"))
+NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "50000"))
+# Seconds between rebuilds of the registered-chat prefilter, to see groups added by other replicas (0: never)
+KNOWN_IDS_REFRESH_SECONDS = int(os.getenv("KNOWN_IDS_REFRESH_SECONDS", "300"))
+
+# Background spam actions (deletions and owner notifications)
+SPAM_QUEUE_SIZE = int(os.getenv("SPAM_QUEUE_SIZE", "10000"))
+SPAM_QUEUE_WORKERS = int(os.getenv("SPAM_QUEUE_WORKERS", "4"))
+
+# Spam digest: 0 sends a notice per deleted message, otherwise one summary per owner every N seconds
+SPAM_DIGEST_WINDOW = int(os.getenv("SPAM_DIGEST_WINDOW", "0"))
+SPAM_DIGEST_SAMPLES = int(os.getenv("SPAM_DIGEST_SAMPLES", "3"))
+
+# Flood detection defaults, used when a group has no own thresholds (0 disables)
+FLOOD_USER_LIMIT = int(os.getenv("FLOOD_USER_LIMIT", "0"))
+FLOOD_CHAT_LIMIT = int(os.getenv("FLOOD_CHAT_LIMIT", "0"))
+FLOOD_WINDOW = int(os.getenv("FLOOD_WINDOW", "10"))
+FLOOD_MUTE_SECONDS = int(os.getenv("FLOOD_MUTE_SECONDS", "300"))
+FLOOD_IDLE_TTL = int(os.getenv("FLOOD_IDLE_TTL", "300"))
+FLOOD_MAX_KEYS = int(os.getenv("FLOOD_MAX_KEYS", "100000"))
+
+# Cross-group duplicate detection: act when the same text hits more than N groups (0 disables)
+DUP_GROUP_THRESHOLD = int(os.getenv("DUP_GROUP_THRESHOLD", "0"))
+DUP_WINDOW = int(os.getenv("DUP_WINDOW", "120"))
+DUP_MAX_ENTRIES = int(os.getenv("DUP_MAX_ENTRIES", "50000"))
+DUP_MIN_CHARS = int(os.getenv("DUP_MIN_CHARS", "30"))
+
+# Spam classifier (optional last stage of the spam filter)
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", "spam_model.npz")
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.9"))
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "64"))
+CLASSIFIER_BATCH_DELAY = float(os.getenv("CLASSIFIER_BATCH_DELAY", "0.005"))
+# Share of passed group messages stored as "not spam" training samples
+CLASSIFIER_HAM_SAMPLE_RATE = float(os.getenv("CLASSIFIER_HAM_SAMPLE_RATE", "0"))
+
+# Scheduled post delivery
+# Timezone of schedules in groups that have not set their own (IANA name)
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Tashkent")
+# Upper bound on the scheduler's sleep between due posts, in seconds
+SCHEDULER_MAX_SLEEP = int(os.getenv("SCHEDULER_MAX_SLEEP", "3600"))
+# Seconds before a fire instant at which its deliveries are planned, claimed and prepared;
+# at the instant itself the scheduler only flushes the ready sends
+SCHEDULER_PRESTAGE_SECONDS = int(os.getenv("SCHEDULER_PRESTAGE_SECONDS", "10"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+# Global Bot API budget in messages per second (0: unlimited)
+SEND_RATE = float(os.getenv("SEND_RATE", "25"))
+# Minimum seconds between two posts to the same chat
+SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", "3"))
+# RetryAfter answers tolerated per post before it is given up
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Posts whose ready-to-send payload (decoded entities, method, arguments) is kept in memory
+POST_PAYLOAD_CACHE_SIZE = int(os.getenv("POST_PAYLOAD_CACHE_SIZE", "10000"))
+
+# Delivery outbox
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry of a failed post; doubles with every attempt
+DELIVERY_RETRY_BACKOFF = int(os.getenv("DELIVERY_RETRY_BACKOFF", "30"))
+# Minutes of missed slots caught up at startup; older pending posts expire
+DELIVERY_GRACE_MINUTES = int(os.getenv("DELIVERY_GRACE_MINUTES", "30"))
+DELIVERY_RETENTION_DAYS = int(os.getenv("DELIVERY_RETENTION_DAYS", "30"))
+
+# Several bot replicas can share the scheduler: due rows are claimed with
+# FOR UPDATE SKIP LOCKED and deliveries are leased to the replica sending them
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# Seconds a claimed delivery stays with its replica before others may take it over
+DELIVERY_LEASE_SECONDS = int(os.getenv("DELIVERY_LEASE_SECONDS", "300"))
+DELIVERY_CLAIM_BATCH = int(os.getenv("DELIVERY_CLAIM_BATCH", "500"))
+# Seconds between reloads of the schedule index, to pick up other replicas' changes
+SCHEDULER_RESYNC_SECONDS = int(os.getenv("SCHEDULER_RESYNC_SECONDS", "300"))
+# >0: scheduled sends run in this many worker processes, groups split by id % N;
+# each worker sends at (SEND_RATE - BROADCAST_RATE) / N
+SCHEDULER_SHARDS = int(os.getenv("SCHEDULER_SHARDS", "0"))
+
+# /broadcast jobs, sent in the background with a resumable cursor
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+# Share of SEND_RATE (messages per second) broadcasts may use; scheduled posts keep the rest.
+# Kept below SEND_RATE: an out-of-range value falls back to half of it
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "10"))
+if SEND_RATE > 0 and not 0 < BROADCAST_RATE < SEND_RATE:
+    BROADCAST_RATE = SEND_RATE / 2
+# Recipients sent between two commits of the cursor (at most this many repeat after a crash)
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))
+# Minimum seconds between two edits of the admin's progress message
+BROADCAST_PROGRESS_SECONDS = float(os.getenv("BROADCAST_PROGRESS_SECONDS", "5"))
+# Users read per round trip when the whole table is walked (/export)
+USER_STREAM_BATCH_SIZE = int(os.getenv("USER_STREAM_BATCH_SIZE", "1000"))
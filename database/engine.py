@@ -25,4 +25,41 @@ async def init_db():
         await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS is_channel INTEGER DEFAULT 0;"))
         await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS is_recurring INTEGER DEFAULT 1;"))
         await conn.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS name VARCHAR;"))
+        await conn.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS flood_user_limit INTEGER;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS flood_chat_limit INTEGER;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS flood_window INTEGER;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS timezone VARCHAR;"))
+        await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS weekdays VARCHAR;"))
+        await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS every_hours INTEGER;"))
+        await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS start_date DATE;"))
+        await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS end_date DATE;"))
+        await conn.execute(text("ALTER TABLE schedule_times ADD COLUMN IF NOT EXISTS next_run_at TIMESTAMP;"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_schedule_times_next_run_at ON schedule_times (next_run_at);"))
+        # Delivery leases (replicas) and lateness
+        await conn.execute(text("ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS claimed_by VARCHAR;"))
+        await conn.execute(text("ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP;"))
+        await conn.execute(text("ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS lateness_ms INTEGER;"))
+        # Rotation cursor and modes, filled by backfill_rotation at startup
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS rotation_mode VARCHAR DEFAULT 'sequential';"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS rotation_cursor INTEGER;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS rotation_cursor_key DOUBLE PRECISION;"))
+        await conn.execute(text("ALTER TABLE groups ADD COLUMN IF NOT EXISTS rotation_weight_total INTEGER;"))
+        await conn.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS weight INTEGER DEFAULT 1;"))
+        await conn.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS weight_offset INTEGER;"))
+        await conn.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS shuffle_key DOUBLE PRECISION;"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_posts_group_id_id ON posts (group_id, id);"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_posts_group_weight ON posts (group_id, weight_offset);"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_posts_group_shuffle ON posts (group_id, shuffle_key, id);"))
+        # Outbox rows are keyed by occurrence since schedules can fire several times a day.
+        # Replaced only while it is missing or still the old (schedule_id, fire_date) one: the
+        # ALTER takes an ACCESS EXCLUSIVE lock, which replicas starting together would fight over
+        slot_is_current = (await conn.execute(text(
+            "SELECT 1 FROM pg_constraint c "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey) "
+            "WHERE c.conname = 'uq_deliveries_slot' AND c.conrelid = 'deliveries'::regclass AND a.attname = 'fire_at';"
+        ))).first() is not None
+        if not slot_is_current:
+            await conn.execute(text("ALTER TABLE deliveries DROP CONSTRAINT IF EXISTS uq_deliveries_slot;"))
+            await conn.execute(text("ALTER TABLE deliveries ADD CONSTRAINT uq_deliveries_slot UNIQUE (schedule_id, fire_at);"))
         await conn.commit()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Time, Text
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Time, Text, DateTime, Date, Float, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -20,33 +20,75 @@ class Group(Base):
     title = Column(String)
     is_channel = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey('users.id'))
-    next_post_index = Column(Integer, default=0)
+    next_post_index = Column(Integer, default=0) # Superseded by rotation_cursor; read once by backfill_rotation
+    # Rotation of schedules without a specific post, see services/rotation.py
+    rotation_mode = Column(String, default='sequential') # sequential, weighted, shuffle
+    rotation_cursor = Column(Integer, nullable=True) # Id of the last rotated post (no FK: it may be deleted since)
+    rotation_cursor_key = Column(Float, nullable=True) # Its shuffle_key when it was picked
+    rotation_weight_total = Column(Integer, nullable=True) # Sum of the posts' weights
+    # Flood thresholds; NULL falls back to the FLOOD_* defaults in config
+    flood_user_limit = Column(Integer, nullable=True)
+    flood_chat_limit = Column(Integer, nullable=True)
+    flood_window = Column(Integer, nullable=True)
+    timezone = Column(String, nullable=True) # IANA name for schedule times; NULL: DEFAULT_TIMEZONE
 
     owner = relationship("User", back_populates="groups")
     posts = relationship("Post", back_populates="group")
     schedule_times = relationship("ScheduleTimes", back_populates="group")
     keywords = relationship("Keyword", back_populates="group")
+    domains = relationship("Domain", back_populates="group")
 
 class Post(Base):
     __tablename__ = 'posts'
+    __table_args__ = (
+        # Keyset lookups of the rotation modes
+        Index('ix_posts_group_id_id', 'group_id', 'id'),
+        Index('ix_posts_group_weight', 'group_id', 'weight_offset'),
+        Index('ix_posts_group_shuffle', 'group_id', 'shuffle_key', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     group_id = Column(Integer, ForeignKey('groups.id'))
     name = Column(String, nullable=True)  # Custom post name (e.g. "Tandirchi")
-    content_type = Column(String) # text, photo, video, etc.
+    content_type = Column(String) # text, photo, video, document, animation, audio, voice or album (see PostItem)
     file_id = Column(String, nullable=True)
     caption = Column(Text, nullable=True)
     text = Column(Text, nullable=True)
     entities = Column(Text, nullable=True) # JSON stored as text
+    version = Column(Integer, default=1) # Bumped on every content edit; keys the send-payload cache
+    weight = Column(Integer, default=1) # Relative share in weighted rotation
+    weight_offset = Column(Integer, nullable=True) # Sum of the weights of the group's posts with lower ids
+    shuffle_key = Column(Float, nullable=True) # Position in the current shuffle cycle
 
     group = relationship("Group", back_populates="posts")
+    # Album media in order; removed by the database with the post
+    items = relationship("PostItem", back_populates="post", order_by="PostItem.position", passive_deletes=True)
+
+class PostItem(Base):
+    """One photo, video, document or audio of an album post (content_type 'album')."""
+    __tablename__ = 'post_items'
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = Column(Integer, default=0)
+    content_type = Column(String) # photo, video, document, audio
+    file_id = Column(String)
+    caption = Column(Text, nullable=True)
+    entities = Column(Text, nullable=True) # JSON stored as text
+
+    post = relationship("Post", back_populates="items")
 
 class ScheduleTimes(Base):
     __tablename__ = 'schedule_times'
     id = Column(Integer, primary_key=True)
     group_id = Column(Integer, ForeignKey('groups.id'))
     post_id = Column(Integer, ForeignKey('posts.id'), nullable=True) # Link to specific post
-    time = Column(String) # Format: "HH:MM"
+    time = Column(String) # Format: "HH:MM"; the anchor when every_hours is set
     is_recurring = Column(Integer, default=1) # 1: Daily, 0: One-time
+    # Recurrence rule, see services/recurrence.py
+    weekdays = Column(String, nullable=True) # "0,2,4" (Monday is 0); NULL: every day
+    every_hours = Column(Integer, nullable=True) # Repeat every N hours from `time` until midnight
+    start_date = Column(Date, nullable=True) # Active range (inclusive); start == end with is_recurring 0 is a one-shot date
+    end_date = Column(Date, nullable=True)
+    next_run_at = Column(DateTime, nullable=True, index=True) # Naive UTC; NULL: no runs left
 
     group = relationship("Group", back_populates="schedule_times")
 
@@ -57,3 +99,64 @@ class Keyword(Base):
     word = Column(String)
 
     group = relationship("Group", back_populates="keywords")
+
+class Domain(Base):
+    __tablename__ = 'domains'
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey('groups.id'))
+    domain = Column(String) # example.com, t.me/channel or @username
+    is_allowed = Column(Integer, default=0) # 0: Blocked, 1: Allowed (overrides a blocked parent domain)
+
+    group = relationship("Group", back_populates="domains")
+
+class SpamSample(Base):
+    __tablename__ = 'spam_samples'
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey('groups.id'), nullable=True)
+    chat_id = Column(BigInteger)
+    message_id = Column(BigInteger)
+    text = Column(Text)
+    label = Column(Integer, default=1) # 1: Spam, 0: Not spam
+    source = Column(String) # filter, owner (feedback), sample (random passed message)
+    created_at = Column(DateTime, server_default=func.now())
+
+class Delivery(Base):
+    """Outbox row: one planned send of a schedule on a given day."""
+    __tablename__ = 'deliveries'
+    __table_args__ = (
+        # Idempotency key: a retry or a restart never posts the same slot twice
+        UniqueConstraint('schedule_id', 'fire_at', name='uq_deliveries_slot'),
+        Index('ix_deliveries_pending', 'status', 'next_attempt_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    schedule_id = Column(Integer, nullable=False) # No FK: one-time schedules are deleted once sent
+    group_id = Column(Integer, ForeignKey('groups.id'))
+    post_id = Column(Integer, nullable=True) # Post chosen when planned, so retries resend the same rotation post
+    fire_date = Column(Date, nullable=False) # Date of the occurrence in the group's timezone
+    fire_at = Column(DateTime, nullable=False) # Occurrence (the schedule's next_run_at when planned), naive UTC
+    status = Column(String, default='pending') # pending, sending (claimed by a replica), sent, failed, expired
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime) # Naive UTC
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    lateness_ms = Column(Integer, nullable=True) # sent_at - fire_at of the successful send
+    claimed_by = Column(String, nullable=True) # REPLICA_ID of the replica sending it
+    lease_until = Column(DateTime, nullable=True) # Naive UTC; a 'sending' row past it is claimable again
+
+class BroadcastJob(Base):
+    """A /broadcast to every user, sent in the background by services/broadcast.py."""
+    __tablename__ = 'broadcast_jobs'
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    created_by = Column(BigInteger) # Telegram id of the superadmin
+    status = Column(String, default='running') # running, paused, cancelled, done
+    cursor = Column(Integer, default=0) # users.id of the last recipient of the last committed batch
+    total = Column(Integer, default=0) # Users when the job was created
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0) # Blocked the bot, deleted account, or RetryAfter given up
+    progress_chat_id = Column(BigInteger, nullable=True) # Message edited with the progress
+    progress_message_id = Column(Integer, nullable=True)
+    claimed_by = Column(String, nullable=True) # REPLICA_ID of the replica sending it
+    lease_until = Column(DateTime, nullable=True) # Naive UTC; renewed every batch, claimable again once past
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -1,16 +1,31 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
+from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User, Group, Post, ScheduleTimes, Keyword
+from database.models import User, Group, Post, PostItem, ScheduleTimes, Keyword, Domain
 from handlers.admin.states import AdminStates
 from keyboards.inline import admin_kbs
-import json
+from services.group_cache import group_cache
+from services.domain_matcher import normalize_domain
+from services.spam_samples import sample_recorder
+from services.schedule_index import schedule_index
+from services.outbox import outbox
+from services.post_payloads import build_method, post_payloads
+from services.post_content import album_collector, album_items, load_post_items, message_content
+from services.recurrence import describe, group_tz, next_run_utc, parse_rule
+from services.rotation import ROTATION_MODES, append_post, rebuild_weights
+import pytz
+from datetime import datetime, timezone
 from config import ADMINS
 
 router = Router()
 
+UNSUPPORTED_CONTENT = (
+    "Qo'llab-quvvatlanmagan kontent turi. Iltimos, Matn, Rasm, Video, GIF, Fayl, Audio, "
+    "Ovozli xabar yoki albom yuboring."
+)
+
 @router.message(Command("admin"))
 async def cmd_admin(message: types.Message, session: AsyncSession, state: FSMContext):
     # Check if user exists
@@ -82,7 +97,7 @@ async def group_selected(callback: types.CallbackQuery, state: FSMContext, sessi
 # --- Add Post ---
 @router.callback_query(F.data.startswith("add_post_"))
 async def start_add_post(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("Post mazmunini yuboring (Matn, Rasm yoki Video).", reply_markup=admin_kbs.cancel_keyboard())
+    await callback.message.edit_text("Post mazmunini yuboring (Matn, Rasm, Video, GIF, Fayl, Audio, Ovozli xabar yoki albom).", reply_markup=admin_kbs.cancel_keyboard())
     await state.set_state(AdminStates.waiting_for_post_content)
 
 @router.message(AdminStates.waiting_for_post_content)
@@ -90,42 +105,24 @@ async def receive_post_content(message: types.Message, state: FSMContext, sessio
     data = await state.get_data()
     group_id = data.get("selected_group_id")
     
-    content_type = "text"
-    file_id = None
-    text = None
-    caption = None
-    entities = None
-    
-    if message.text:
-        content_type = "text"
-        text = message.text
-        if message.entities:
-            entities = json.dumps([e.model_dump(mode='json') for e in message.entities])
-    elif message.photo:
-        content_type = "photo"
-        file_id = message.photo[-1].file_id # Best quality
-        caption = message.caption
-        if message.caption_entities:
-            entities = json.dumps([e.model_dump(mode='json') for e in message.caption_entities])
-    elif message.video:
-        content_type = "video"
-        file_id = message.video.file_id
-        caption = message.caption
-        if message.caption_entities:
-            entities = json.dumps([e.model_dump(mode='json') for e in message.caption_entities])
+    if message.media_group_id:
+        # An album becomes one post; the first message's call gets all of it
+        messages = await album_collector.collect(message)
+        if messages is None:
+            return
+        items = album_items(messages)
+        if not items:
+            await message.answer("Albomda qo'llab-quvvatlanadigan fayl topilmadi.")
+            return
+        post = Post(group_id=group_id, content_type="album", items=items)
     else:
-        await message.answer("Qollab-quvvatlanmagan kontent turi. Iltimos, Matn, Rasm yoki Video yuboring.")
-        return
-
-    post = Post(
-        group_id=group_id,
-        content_type=content_type,
-        file_id=file_id,
-        caption=caption,
-        text=text,
-        entities=entities
-    )
+        content = message_content(message)
+        if content is None:
+            await message.answer(UNSUPPORTED_CONTENT)
+            return
+        post = Post(group_id=group_id, **content)
     session.add(post)
+    await append_post(session, post)
     await session.commit()
     
     # Store post ID for naming
@@ -174,20 +171,24 @@ async def receive_schedule_time(message: types.Message, state: FSMContext, sessi
         
     data = await state.get_data()
     group_id = data.get("selected_group_id")
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
     
     schedule = ScheduleTimes(
         group_id=group_id,
-        time=time_str
+        time=time_str,
+        is_recurring=1
     )
+    schedule.next_run_at = next_run_utc(schedule, datetime.now(timezone.utc), group_tz(group))
     session.add(schedule)
     await session.commit()
+    schedule_index.add(schedule.id, schedule.next_run_at, schedule.group_id)
     
     await message.answer(f"{time_str} ga jadval qo'shildi!")
     
     # Return to menu
-    stmt = select(Group).where(Group.id == group_id)
-    res = await session.execute(stmt)
-    group = res.scalars().first()
     await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group_id))
     await state.set_state(AdminStates.group_menu)
 
@@ -210,6 +211,7 @@ async def receive_keyword(message: types.Message, state: FSMContext, session: As
     )
     session.add(kw)
     await session.commit()
+    group_cache.invalidate_group(group_id)
     
     await message.answer(f"'{keyword_text}' so'zi qo'shildi!")
     
@@ -287,7 +289,9 @@ async def delete_post(message: types.Message, session: AsyncSession):
         
         if post:
             await session.delete(post)
+            await rebuild_weights(session, post.group_id)
             await session.commit()
+            post_payloads.invalidate(post_id)
             await message.answer(f"Post {post_id} o'chirildi.")
         else:
             await message.answer("Post topilmadi.")
@@ -307,9 +311,10 @@ async def view_schedules(callback: types.CallbackQuery, session: AsyncSession):
         await callback.message.answer("Jadvallar topilmadi.")
         return
 
-    text = "Jadvallar:\n"
+    group = await session.get(Group, group_id)
+    text = f"Jadvallar ({group_tz(group).zone}):\n"
     for s in schedules:
-        text += f"Time: {s.time} | /del_schedule_{s.id}\n"
+        text += f"{describe(s)} | /del_schedule_{s.id}\n"
     
     await callback.message.answer(text)
 
@@ -323,7 +328,9 @@ async def delete_schedule(message: types.Message, session: AsyncSession):
         
         if schedule:
             await session.delete(schedule)
+            await outbox.cancel_schedule(session, schedule_id)
             await session.commit()
+            schedule_index.remove(schedule_id)
             await message.answer(f"Jadval {schedule_id} o'chirildi.")
         else:
             await message.answer("Jadval topilmadi.")
@@ -358,13 +365,285 @@ async def delete_keyword(message: types.Message, session: AsyncSession):
         keyword = res.scalars().first()
         
         if keyword:
+            group_id = keyword.group_id
             await session.delete(keyword)
             await session.commit()
+            group_cache.invalidate_group(group_id)
             await message.answer(f"Kalit so'z {keyword_id} o'chirildi.")
         else:
             await message.answer("Kalit so'z topilmadi.")
     except Exception:
         await message.answer("Noto'g'ri buyruq.")
+# --- Domains ---
+@router.callback_query(F.data.startswith("view_domains_"))
+async def view_domains(callback: types.CallbackQuery, session: AsyncSession):
+    group_id = int(callback.data.split("_")[2])
+
+    stmt = select(Domain).where(Domain.group_id == group_id)
+    res = await session.execute(stmt)
+    domains = res.scalars().all()
+
+    if not domains:
+        text = "Domenlar ro'yxati bo'sh."
+    else:
+        text = "Domenlar:\n"
+        for d in domains:
+            status = "✅" if d.is_allowed else "🚫"
+            text += f"{status} {d.domain} | /del_domain_{d.id}\n"
+
+    await callback.message.edit_text(text, reply_markup=admin_kbs.domains_keyboard(group_id))
+
+@router.callback_query(F.data.startswith("add_domain_"))
+async def start_add_domain(callback: types.CallbackQuery, state: FSMContext):
+    parts = callback.data.split("_")
+    is_allowed = parts[2] == "allow"
+    group_id = int(parts[3])
+
+    await state.update_data(selected_group_id=group_id, domain_is_allowed=is_allowed)
+    action = "ruxsat beriladigan" if is_allowed else "bloklanadigan"
+    await callback.message.edit_text(
+        f"{action.capitalize()} domenni yuboring (masalan example.com, t.me/kanal yoki @username).",
+        reply_markup=admin_kbs.cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_domain)
+
+@router.message(AdminStates.waiting_for_domain)
+async def receive_domain(message: types.Message, state: FSMContext, session: AsyncSession):
+    host = normalize_domain(message.text or "")
+    if not host:
+        await message.answer("Noto'g'ri domen. Masalan: example.com")
+        return
+
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+
+    domain = Domain(
+        group_id=group_id,
+        domain=host,
+        is_allowed=1 if data.get("domain_is_allowed") else 0
+    )
+    session.add(domain)
+    await session.commit()
+    group_cache.invalidate_group(group_id)
+
+    await message.answer(f"'{host}' domeni qo'shildi!")
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+    await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group_id))
+    await state.set_state(AdminStates.group_menu)
+
+@router.message(F.text.startswith("/del_domain_"))
+async def delete_domain(message: types.Message, session: AsyncSession):
+    try:
+        domain_id = int(message.text.split("_")[2])
+        stmt = select(Domain).where(Domain.id == domain_id)
+        res = await session.execute(stmt)
+        domain = res.scalars().first()
+
+        if domain:
+            group_id = domain.group_id
+            await session.delete(domain)
+            await session.commit()
+            group_cache.invalidate_group(group_id)
+            await message.answer(f"Domen {domain_id} o'chirildi.")
+        else:
+            await message.answer("Domen topilmadi.")
+    except Exception:
+        await message.answer("Noto'g'ri buyruq.")
+
+# --- Spam Feedback ---
+@router.callback_query(F.data.startswith("not_spam_"))
+async def not_spam_feedback(callback: types.CallbackQuery, session: AsyncSession):
+    parts = callback.data.split("_")
+    chat_id = int(parts[2])
+    message_id = int(parts[3])
+
+    # Only the group's owner can relabel its messages
+    stmt = select(Group).join(User, Group.owner_id == User.id).where(
+        Group.telegram_id == chat_id,
+        User.telegram_id == callback.from_user.id
+    )
+    res = await session.execute(stmt)
+    if not res.scalars().first():
+        await callback.answer("Ruxsat yo'q.", show_alert=True)
+        return
+
+    await sample_recorder.mark_not_spam(chat_id, message_id)
+    await callback.answer("Rahmat! Bu xabar spam emas deb belgilandi.")
+    await callback.message.edit_reply_markup(reply_markup=None)
+
+# --- Flood Settings ---
+@router.callback_query(F.data.startswith("flood_settings_"))
+async def start_flood_settings(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+    group_id = int(callback.data.split("_")[2])
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await callback.answer("Guruh topilmadi.")
+        return
+
+    def fmt(value):
+        return "standart" if value is None else value
+
+    await state.update_data(selected_group_id=group_id)
+    await callback.message.edit_text(
+        f"Hozirgi flood sozlamalari:\n"
+        f"Foydalanuvchi limiti: {fmt(group.flood_user_limit)}\n"
+        f"Guruh limiti: {fmt(group.flood_chat_limit)}\n"
+        f"Oyna (soniya): {fmt(group.flood_window)}\n\n"
+        "Yangi qiymatlarni yuboring: <foydalanuvchi_limiti> <guruh_limiti> <soniya>\n"
+        "Masalan: 5 30 10 (bitta foydalanuvchidan 10 soniyada 5 ta, guruhdan 30 ta xabar).\n"
+        "0 - o'chirish, 'standart' - umumiy sozlamalarga qaytarish.",
+        reply_markup=admin_kbs.cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_flood_settings)
+
+@router.message(AdminStates.waiting_for_flood_settings)
+async def receive_flood_settings(message: types.Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await message.answer("Guruh topilmadi.")
+        await state.clear()
+        return
+
+    value = message.text.strip().lower()
+    if value == "standart":
+        group.flood_user_limit = None
+        group.flood_chat_limit = None
+        group.flood_window = None
+    else:
+        parts = value.split()
+        if len(parts) != 3 or not all(p.isdigit() for p in parts):
+            await message.answer("Noto'g'ri format. Masalan: 5 30 10")
+            return
+        group.flood_user_limit, group.flood_chat_limit, group.flood_window = (int(p) for p in parts)
+
+    await session.commit()
+    group_cache.invalidate_group(group.id)
+
+    await message.answer("Flood sozlamalari saqlandi!")
+    await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group.id))
+    await state.set_state(AdminStates.group_menu)
+
+# --- Timezone ---
+@router.callback_query(F.data.startswith("set_timezone_"))
+async def start_set_timezone(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+    group_id = int(callback.data.split("_")[2])
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await callback.answer("Guruh topilmadi.")
+        return
+
+    await state.update_data(selected_group_id=group_id)
+    await callback.message.edit_text(
+        f"Hozirgi vaqt zonasi: {group_tz(group).zone}\n\n"
+        "Jadval vaqtlari shu zonada hisoblanadi. Yangi zonani yuboring (IANA nomi),\n"
+        "masalan: Asia/Tashkent, Europe/Moscow, Europe/Berlin.\n"
+        "'standart' - umumiy sozlamaga qaytarish.",
+        reply_markup=admin_kbs.cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_timezone)
+
+@router.message(AdminStates.waiting_for_timezone)
+async def receive_timezone(message: types.Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await message.answer("Guruh topilmadi.")
+        await state.clear()
+        return
+
+    value = message.text.strip()
+    if value.lower() == "standart":
+        group.timezone = None
+    else:
+        try:
+            group.timezone = pytz.timezone(value).zone
+        except pytz.UnknownTimeZoneError:
+            await message.answer("Bunday vaqt zonasi topilmadi. Masalan: Europe/Moscow")
+            return
+
+    # Pending runs move to the same wall-clock times in the new zone; fired one-time schedules stay fired
+    tz = group_tz(group)
+    now = datetime.now(timezone.utc)
+    sched_stmt = select(ScheduleTimes).where(ScheduleTimes.group_id == group.id, ScheduleTimes.next_run_at.is_not(None))
+    schedules = (await session.execute(sched_stmt)).scalars().all()
+    for schedule in schedules:
+        schedule.next_run_at = next_run_utc(schedule, now, tz)
+    await session.commit()
+    for schedule in schedules:
+        schedule_index.add(schedule.id, schedule.next_run_at, schedule.group_id)
+
+    await message.answer(f"Vaqt zonasi saqlandi: {tz.zone}")
+    await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group.id))
+    await state.set_state(AdminStates.group_menu)
+
+# --- Rotation ---
+@router.callback_query(F.data.startswith("rotation_mode_"))
+async def show_rotation_mode(callback: types.CallbackQuery, session: AsyncSession):
+    group_id = int(callback.data.split("_")[2])
+
+    stmt = select(Group).where(Group.id == group_id)
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await callback.answer("Guruh topilmadi.")
+        return
+
+    mode = group.rotation_mode or 'sequential'
+    await callback.message.edit_text(
+        f"Rotatsiya rejimi: {ROTATION_MODES.get(mode, mode)}\n\n"
+        "Aniq post belgilanmagan jadvallar guruh postlarini navbat bilan yuboradi:\n"
+        "Ketma-ket - qo'shilish tartibida.\n"
+        "Vazn bo'yicha - har bir post o'z vazniga mos ulushda (vazn post sozlamalarida).\n"
+        "Aralash - har aylanishda yangi tasodifiy tartib, aylanish ichida takrorlanmaydi.",
+        reply_markup=admin_kbs.rotation_mode_keyboard(group.id, mode)
+    )
+
+@router.callback_query(F.data.startswith("set_rotation_"))
+async def set_rotation_mode(callback: types.CallbackQuery, session: AsyncSession):
+    _, _, group_id, mode = callback.data.split("_", 3)
+    if mode not in ROTATION_MODES:
+        await callback.answer("Noma'lum rejim.")
+        return
+
+    stmt = select(Group).where(Group.id == int(group_id))
+    res = await session.execute(stmt)
+    group = res.scalars().first()
+
+    if not group:
+        await callback.answer("Guruh topilmadi.")
+        return
+
+    group.rotation_mode = mode
+    # Shuffle starts a fresh pass over the current order
+    group.rotation_cursor_key = None
+    await session.commit()
+
+    await callback.answer("Saqlandi")
+    await callback.message.edit_reply_markup(reply_markup=admin_kbs.rotation_mode_keyboard(group.id, mode))
+
 # --- Manual Channel Addition ---
 @router.callback_query(F.data == "manual_add_channel")
 async def start_manual_add_channel(callback: types.CallbackQuery, state: FSMContext):
@@ -438,6 +717,8 @@ async def process_manual_channel(message: types.Message, state: FSMContext, sess
         await message.answer(f"{chat.title} ma'lumotlari yangilandi va sizga biriktirildi.")
         
     await session.commit()
+    group_cache.invalidate(chat.id)
+    group_cache.mark_registered(chat.id)
     await state.clear()
     
     # Show main menu
@@ -501,36 +782,71 @@ async def receive_schedule_type(callback: types.CallbackQuery, state: FSMContext
     post_id = data.get("schedule_post_id")
     time_str = data.get("schedule_time")
     
-    is_recurring = 1 if callback.data == "schedule_daily" else 0
-    
+    if callback.data == "schedule_rule":
+        await callback.message.edit_text(
+            "Qoidani yuboring (bo'sh joy bilan ajrating):\n"
+            "• du,ch,ju — faqat shu kunlari\n"
+            "• 3h — vaqtdan boshlab har 3 soatda (yarim tungacha)\n"
+            "• 2025-05-01 — shu sanada bir marta\n"
+            "• 2025-05-01 2025-06-01 — faqat shu sanalar oralig'ida\n"
+            "Masalan: du,ju 3h 2025-05-01 2025-06-01",
+            reply_markup=admin_kbs.cancel_keyboard()
+        )
+        await state.set_state(AdminStates.waiting_for_schedule_rule)
+        return
+
+    await save_post_schedule(callback.message, state, session, post_id, time_str, {"is_recurring": 1 if callback.data == "schedule_daily" else 0}, edit=True)
+
+@router.message(AdminStates.waiting_for_schedule_rule)
+async def receive_schedule_rule(message: types.Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    try:
+        rule = parse_rule(message.text or "")
+    except ValueError as e:
+        await message.answer(f"Noto'g'ri qoida: {e}")
+        return
+
+    await save_post_schedule(message, state, session, data.get("schedule_post_id"), data.get("schedule_time"), rule)
+
+async def save_post_schedule(message: types.Message, state: FSMContext, session: AsyncSession, post_id, time_str, rule: dict, edit: bool = False):
     stmt = select(Post).where(Post.id == post_id)
     res = await session.execute(stmt)
     post = res.scalars().first()
     
     if not post:
-        await callback.message.answer("Post topilmadi.")
+        await message.answer("Post topilmadi.")
         return
 
+    group_stmt = select(Group).where(Group.id == post.group_id)
+    group_res = await session.execute(group_stmt)
+    group = group_res.scalars().first()
+    tz = group_tz(group)
+
     schedule = ScheduleTimes(
         group_id=post.group_id,
         time=time_str,
         post_id=post_id,
-        is_recurring=is_recurring
+        **rule
     )
+    schedule.next_run_at = next_run_utc(schedule, datetime.now(timezone.utc), tz)
+    if schedule.next_run_at is None:
+        await message.answer("Bu qoida bo'yicha kelgusida hech qanday vaqt yo'q. Boshqa qoida yuboring.")
+        return
     session.add(schedule)
     await session.commit()
+    schedule_index.add(schedule.id, schedule.next_run_at, schedule.group_id)
     
-    type_str = "har kuni" if is_recurring else "bir marta"
-    await callback.message.edit_text(f"Post {time_str} vaqtiga ({type_str}) rejalashtirildi!")
+    next_local = schedule.next_run_at.replace(tzinfo=timezone.utc).astimezone(tz)
+    text = f"Post rejalashtirildi: {describe(schedule)}\nKeyingi yuborish: {next_local:%Y-%m-%d %H:%M} ({tz.zone})"
+    if edit:
+        await message.edit_text(text)
+    else:
+        await message.answer(text)
     
     await state.clear()
     
-    group_stmt = select(Group).where(Group.id == post.group_id)
-    group_res = await session.execute(group_stmt)
-    group = group_res.scalars().first()
-    
     if group:
-        await callback.message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group.id))
+        await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group.id))
         await state.set_state(AdminStates.group_menu)
 
 @router.callback_query(F.data == "skip_schedule")
@@ -567,32 +883,22 @@ async def manage_post(callback: types.CallbackQuery, session: AsyncSession):
     
     post_name_display = post.name if post.name else f"Post {post.id}"
     info_text = f"📌 Nom: {post_name_display}\nPost ID: {post.id}\nTur: {post.content_type}\n"
+    if post.content_type == 'album':
+        item_count = await session.scalar(select(func.count()).select_from(PostItem).where(PostItem.post_id == post.id))
+        info_text += f"Albom: {item_count} ta fayl\n"
     if sched:
-        type_str = "Doimiy" if sched.is_recurring else "Bir martalik"
-        info_text += f"\nJadval: {sched.time} ({type_str})"
+        info_text += f"\nJadval: {describe(sched)}"
     else:
         info_text += "\nJadval: Belgilanmagan"
         
     # Send preview if possible (delete old menu msg first)
     await callback.message.delete()
     
-    # Load entities
-    entities = None
-    if post.entities:
-        try:
-            from aiogram.types import MessageEntity
-            data = json.loads(post.entities)
-            entities = [MessageEntity(**e) for e in data]
-        except:
-             pass
-
     try:
-        if post.content_type == 'text':
-            await callback.message.answer(post.text, entities=entities)
-        elif post.content_type == 'photo':
-            await callback.message.answer_photo(post.file_id, caption=post.caption, caption_entities=entities)
-        elif post.content_type == 'video':
-            await callback.message.answer_video(post.file_id, caption=post.caption, caption_entities=entities)
+        items = (await load_post_items(session, [post.id])).get(post.id) if post.content_type == 'album' else None
+        method = build_method(post, callback.message.chat.id, items)
+        if method is not None:
+            await callback.bot(method)
     except Exception as e:
         info_text += f"\n\n(Postni ko'rsatishda xatolik: {e})"
         
@@ -602,6 +908,7 @@ async def manage_post(callback: types.CallbackQuery, session: AsyncSession):
     
     builder.button(text="✏️ Nomni o'zgartirish", callback_data=f"edit_name_{post.id}")
     builder.button(text="✏️ Mazmunni tahrirlash", callback_data=f"edit_content_{post.id}")
+    builder.button(text=f"⚖️ Vazn: {post.weight or 1}", callback_data=f"edit_weight_{post.id}")
     
     if not sched:
         builder.button(text="Jadval belgilash", callback_data=f"set_sched_btn_{post.id}")
@@ -630,7 +937,9 @@ async def btn_del_schedule(callback: types.CallbackQuery, session: AsyncSession)
     
     if sched:
         await session.delete(sched)
+        await outbox.cancel_schedule(session, sched_id)
         await session.commit()
+        schedule_index.remove(sched_id)
         await callback.answer("Jadval o'chirildi")
         # Refresh management view
         # We need post_id to refresh view
@@ -649,7 +958,9 @@ async def btn_del_post(callback: types.CallbackQuery, session: AsyncSession):
     
     if post:
         await session.delete(post)
+        await rebuild_weights(session, post.group_id)
         await session.commit()
+        post_payloads.invalidate(post_id)
         await callback.answer("Post o'chirildi")
         await callback.message.delete()
         await callback.message.answer("Post o'chirildi.")
@@ -681,6 +992,7 @@ async def receive_edit_name(message: types.Message, state: FSMContext, session:
     
     post.name = new_name
     await session.commit()
+    post_payloads.invalidate(post.id)
     
     await message.answer(f"Post nomi '{new_name}' ga o'zgartirildi!")
     
@@ -695,12 +1007,62 @@ async def receive_edit_name(message: types.Message, state: FSMContext, session:
     else:
         await state.clear()
 
+# --- Edit Post Weight ---
+@router.callback_query(F.data.startswith("edit_weight_"))
+async def edit_post_weight_start(callback: types.CallbackQuery, state: FSMContext):
+    post_id = int(callback.data.split("_")[2])
+    await state.update_data(edit_post_id=post_id)
+    await callback.message.answer(
+        "Post vaznini yuboring (1-100). Vazn bo'yicha rotatsiyada vazni 3 bo'lgan post\n"
+        "vazni 1 bo'lgan postdan uch baravar ko'p yuboriladi.",
+        reply_markup=admin_kbs.cancel_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_post_weight)
+
+@router.message(AdminStates.waiting_for_post_weight)
+async def receive_post_weight(message: types.Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    post_id = data.get("edit_post_id")
+
+    try:
+        weight = int(message.text.strip())
+    except (AttributeError, ValueError):
+        weight = 0
+    if not 1 <= weight <= 100:
+        await message.answer("1 dan 100 gacha butun son yuboring.")
+        return
+
+    stmt = select(Post).where(Post.id == post_id)
+    res = await session.execute(stmt)
+    post = res.scalars().first()
+
+    if not post:
+        await message.answer("Post topilmadi.")
+        await state.clear()
+        return
+
+    post.weight = weight
+    await rebuild_weights(session, post.group_id)
+    await session.commit()
+
+    await message.answer(f"Post vazni {weight} ga o'zgartirildi!")
+
+    group_stmt = select(Group).where(Group.id == post.group_id)
+    group_res = await session.execute(group_stmt)
+    group = group_res.scalars().first()
+
+    if group:
+        await message.answer(f"Guruhni boshqarish: {group.title}", reply_markup=admin_kbs.group_main_menu_keyboard(group.id))
+        await state.set_state(AdminStates.group_menu)
+    else:
+        await state.clear()
+
 # --- Edit Post Content ---
 @router.callback_query(F.data.startswith("edit_content_"))
 async def edit_post_content_start(callback: types.CallbackQuery, state: FSMContext):
     post_id = int(callback.data.split("_")[2])
     await state.update_data(edit_post_id=post_id)
-    await callback.message.answer("Yangi mazmunni yuboring (Matn, Rasm yoki Video):", reply_markup=admin_kbs.cancel_keyboard())
+    await callback.message.answer("Yangi mazmunni yuboring (Matn, Rasm, Video, GIF, Fayl, Audio, Ovozli xabar yoki albom):", reply_markup=admin_kbs.cancel_keyboard())
     await state.set_state(AdminStates.waiting_for_edit_content)
 
 @router.message(AdminStates.waiting_for_edit_content)
@@ -718,38 +1080,34 @@ async def receive_edit_content(message: types.Message, state: FSMContext, sessio
         return
     
     # Update content based on type
-    if message.text:
-        post.content_type = "text"
-        post.text = message.text
-        post.file_id = None
-        post.caption = None
-        if message.entities:
-            post.entities = json.dumps([e.model_dump(mode='json') for e in message.entities])
-        else:
-            post.entities = None
-    elif message.photo:
-        post.content_type = "photo"
-        post.file_id = message.photo[-1].file_id
-        post.caption = message.caption
-        post.text = None
-        if message.caption_entities:
-            post.entities = json.dumps([e.model_dump(mode='json') for e in message.caption_entities])
-        else:
-            post.entities = None
-    elif message.video:
-        post.content_type = "video"
-        post.file_id = message.video.file_id
-        post.caption = message.caption
-        post.text = None
-        if message.caption_entities:
-            post.entities = json.dumps([e.model_dump(mode='json') for e in message.caption_entities])
-        else:
-            post.entities = None
+    if message.media_group_id:
+        messages = await album_collector.collect(message)
+        if messages is None:
+            return
+        items = album_items(messages)
+        if not items:
+            await message.answer("Albomda qo'llab-quvvatlanadigan fayl topilmadi.")
+            return
+        content = {"content_type": "album", "text": None, "file_id": None, "caption": None, "entities": None}
     else:
-        await message.answer("Qollab-quvvatlanmagan kontent turi. Iltimos, Matn, Rasm yoki Video yuboring.")
-        return
-    
+        content = message_content(message)
+        if content is None:
+            await message.answer(UNSUPPORTED_CONTENT)
+            return
+        items = []
+
+    for field, value in content.items():
+        setattr(post, field, value)
+    # The old album items go; the new ones are added in the same transaction
+    await session.execute(delete(PostItem).where(PostItem.post_id == post.id))
+    for item in items:
+        item.post_id = post.id
+    session.add_all(items)
+
+    # New version: cached send payloads of the old content are dropped here and ignored elsewhere
+    post.version = (post.version or 1) + 1
     await session.commit()
+    post_payloads.invalidate(post.id)
     
     post_name = post.name if post.name else f"Post {post.id}"
     await message.answer(f"'{post_name}' mazmuni muvaffaqiyatli yangilandi!")
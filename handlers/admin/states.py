@@ -13,16 +13,27 @@ class AdminStates(StatesGroup):
     waiting_for_time = State()
     waiting_for_schedule_type = State()
     waiting_for_specific_schedule_time = State()
+    waiting_for_schedule_rule = State()
     
     # Post naming & editing
     waiting_for_post_name = State()
     waiting_for_edit_name = State()
     waiting_for_edit_content = State()
+    waiting_for_post_weight = State()
 
     # Keyword management
     waiting_for_keyword = State()
     waiting_for_channel_id = State()
 
+    # Flood settings
+    waiting_for_flood_settings = State()
+
+    # Domain blocklist
+    waiting_for_domain = State()
+
+    # Schedule timezone
+    waiting_for_timezone = State()
+
     # Admin management
     waiting_for_new_admin_id = State()
     waiting_for_remove_admin_id = State()
@@ -1,10 +1,16 @@
+import os
+import tempfile
+from datetime import timedelta
 from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram import F
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User
-from services.excel import export_users_to_excel
+from keyboards.inline.admin_kbs import broadcast_keyboard
+from services.broadcast import broadcasts, progress_text
+from services.excel import USER_EXPORT_COLUMNS, export_users_to_excel
+from services.spam_actions import spam_actions
+from services.user_stream import stream_users
+from services.outbox import outbox, utcnow
 from config import ADMINS
 
 router = Router()
@@ -22,19 +28,33 @@ async def cmd_broadcast(message: types.Message, session: AsyncSession):
         await message.answer("Foydalanish: /broadcast <xabar>")
         return
 
-    stmt = select(User)
-    res = await session.execute(stmt)
-    users = res.scalars().all()
-    
-    count = 0
-    for user in users:
-        try:
-            await message.bot.send_message(user.telegram_id, text)
-            count += 1
-        except Exception as e:
-            print(f"Failed to send to {user.telegram_id}: {e}")
-            
-    await message.answer(f"Xabar yuborish tugadi. {count} foydalanuvchilarga yuborildi.")
+    # Sent in the background; the progress message gets the pause/resume/cancel buttons
+    await broadcasts.create(session, message.bot, text, message.chat.id, message.from_user.id)
+
+
+@router.callback_query(F.data.startswith("broadcast_"))
+async def broadcast_control(callback: types.CallbackQuery, session: AsyncSession):
+    if not is_superadmin(callback.from_user.id):
+        await callback.answer()
+        return
+
+    _, action, job_id = callback.data.split("_")
+    job_id = int(job_id)
+    if action == "pause":
+        job = await broadcasts.pause(session, job_id)
+        notice = "To'xtatildi (joriy qism yuborilgach)"
+    elif action == "resume":
+        job = await broadcasts.resume(session, callback.bot, job_id)
+        notice = "Davom ettirilmoqda"
+    else:
+        job = await broadcasts.cancel(session, job_id)
+        notice = "Bekor qilindi"
+
+    if job is None:
+        await callback.answer("Bu xabar yuborish allaqachon tugagan.", show_alert=True)
+        return
+    await callback.message.edit_text(progress_text(job), reply_markup=broadcast_keyboard(job.id, job.status))
+    await callback.answer(notice)
 
 
 @router.message(Command("export"))
@@ -43,16 +63,47 @@ async def cmd_export(message: types.Message, session: AsyncSession):
         return
 
     await message.answer("Eksport qilinmoqda...")
-    
-    stmt = select(User)
-    res = await session.execute(stmt)
-    users = res.scalars().all()
-    
-    if not users:
-        await message.answer("Foydalanuvchilar topilmadi.")
+
+    # Rows go from a server-side cursor straight to a file on disk, and the file is uploaded from there
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.xlsx")
+        count = await export_users_to_excel(stream_users(session, USER_EXPORT_COLUMNS), path)
+        if not count:
+            await message.answer("Foydalanuvchilar topilmadi.")
+            return
+
+        file = types.FSInputFile(path, filename="users.xlsx")
+        await message.answer_document(file, caption="Foydalanuvchilar eksporti")
+
+
+@router.message(Command("spam_stats"))
+async def cmd_spam_stats(message: types.Message):
+    if not is_superadmin(message.from_user.id):
+        return
+
+    stats = spam_actions.stats()
+    await message.answer(
+        "Spam navbati:\n"
+        f"Navbatda: {stats['depth']}/{stats['max_size']} (workerlar: {stats['workers']})\n"
+        f"Qabul qilindi: {stats['enqueued']}\n"
+        f"Bajarildi: {stats['processed']}\n"
+        f"Xatolar: {stats['failed']}\n"
+        f"Tashlab yuborildi: {stats['dropped']}\n"
+        f"Kechikish p50/p99/max: {stats['latency_p50']:.3f}s / {stats['latency_p99']:.3f}s / {stats['latency_max']:.3f}s"
+    )
+
+
+@router.message(Command("delivery_stats"))
+async def cmd_delivery_stats(message: types.Message, session: AsyncSession):
+    if not is_superadmin(message.from_user.id):
         return
 
-    file_io = export_users_to_excel(users)
-    file = types.BufferedInputFile(file_io.read(), filename="users.xlsx")
-    
-    await message.answer_document(file, caption="Foydalanuvchilar eksporti")
+    stats = await outbox.stats(session, utcnow() - timedelta(days=1))
+    await message.answer(
+        "Rejalashtirilgan postlar (so'nggi 24 soat):\n"
+        f"Yuborildi: {stats.get('sent', 0)}\n"
+        f"Kutilmoqda: {stats.get('pending', 0) + stats.get('sending', 0)}\n"
+        f"Xatolar: {stats.get('failed', 0)}\n"
+        f"Muddati o'tdi: {stats.get('expired', 0)}\n"
+        f"Kechikish p50/p99/max: {stats['lateness_p50']:.3f}s / {stats['lateness_p99']:.3f}s / {stats['lateness_max']:.3f}s"
+    )
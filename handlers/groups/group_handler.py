@@ -4,6 +4,7 @@ from aiogram.types import Message, ChatMemberUpdated
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Group, User
+from services.group_cache import group_cache
 
 router = Router()
 
@@ -60,4 +61,5 @@ async def cmd_register_group(message: Message, session: AsyncSession):
     )
     session.add(new_group)
     await session.commit()
+    group_cache.mark_registered(message.chat.id)
     await message.reply("Group registered successfully! You can now configure it in my private chat.")
@@ -3,6 +3,7 @@ from aiogram.filters import ChatMemberUpdatedFilter, JOIN_TRANSITION, LEAVE_TRAN
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Group, User
+from services.group_cache import group_cache
 
 router = Router()
 
@@ -55,6 +56,8 @@ async def on_bot_join_group(event: types.ChatMemberUpdated, session: AsyncSessio
         group.owner_id = user.id
     
     await session.commit()
+    group_cache.invalidate(event.chat.id)
+    group_cache.mark_registered(event.chat.id)
     
     chat_type_str = "Kanal" if event.chat.type == "channel" else "Guruh"
     await event.chat.send_message(f"Meni qo'shganingiz uchun rahmat! Men {chat_type_str.lower()}ingizni boshqarishga tayyorman. Agar hali qilmagan bo'lsangiz, meni admin qiling.")
@@ -2,6 +2,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config import ADMINS
+from services.rotation import ROTATION_MODES
 
 def groups_keyboard(groups, show_admin_btn=False):
     builder = InlineKeyboardBuilder()
@@ -34,15 +35,38 @@ def group_main_menu_keyboard(group_id):
     # builder.button(text="Kalit so'z qo'shish", callback_data=f"add_keyword_{group_id}") # Removed
     builder.button(text="Postlarni ko'rish", callback_data=f"view_posts_{group_id}")
     builder.button(text="Jadvalni ko'rish", callback_data=f"view_schedules_{group_id}")
+    builder.button(text="Flood sozlamalari", callback_data=f"flood_settings_{group_id}")
+    builder.button(text="Domenlar", callback_data=f"view_domains_{group_id}")
+    builder.button(text="Vaqt zonasi", callback_data=f"set_timezone_{group_id}")
+    builder.button(text="Rotatsiya", callback_data=f"rotation_mode_{group_id}")
     # builder.button(text="Kalit so'zlarni ko'rish", callback_data=f"view_keywords_{group_id}") # Removed
     builder.button(text="Guruhlarga qaytish", callback_data="back_to_groups")
     builder.adjust(2)
     return builder.as_markup()
 
+def rotation_mode_keyboard(group_id, current):
+    builder = InlineKeyboardBuilder()
+    for mode, label in ROTATION_MODES.items():
+        mark = "✅ " if mode == current else ""
+        builder.button(text=f"{mark}{label}", callback_data=f"set_rotation_{group_id}_{mode}")
+    builder.button(text="Orqaga", callback_data=f"group_{group_id}")
+    builder.adjust(1)
+    return builder.as_markup()
+
 def recurring_options_keyboard():
     builder = InlineKeyboardBuilder()
     builder.button(text="Bir martalik", callback_data="schedule_once")
     builder.button(text="Doimiy (Har kuni)", callback_data="schedule_daily")
+    builder.button(text="Boshqa qoida (kunlar, soatlar, sanalar)", callback_data="schedule_rule")
+    builder.adjust(2, 1)
+    return builder.as_markup()
+
+def domains_keyboard(group_id):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🚫 Domen bloklash", callback_data=f"add_domain_block_{group_id}")
+    builder.button(text="✅ Domenga ruxsat berish", callback_data=f"add_domain_allow_{group_id}")
+    builder.button(text="Orqaga", callback_data=f"group_{group_id}")
+    builder.adjust(1)
     return builder.as_markup()
 
 def cancel_keyboard():
@@ -63,3 +87,21 @@ def back_to_admin_management():
     builder = InlineKeyboardBuilder()
     builder.button(text="Orqaga", callback_data="admin_management")
     return builder.as_markup()
+
+def not_spam_keyboard(chat_id, message_id):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="Spam emas", callback_data=f"not_spam_{chat_id}_{message_id}")
+    return builder.as_markup()
+
+def broadcast_keyboard(job_id, status):
+    """Controls under a broadcast's progress message; none once it is over."""
+    builder = InlineKeyboardBuilder()
+    if status == 'running':
+        builder.button(text="⏸ To'xtatish", callback_data=f"broadcast_pause_{job_id}")
+    elif status == 'paused':
+        builder.button(text="▶️ Davom ettirish", callback_data=f"broadcast_resume_{job_id}")
+    else:
+        return None
+    builder.button(text="✖️ Bekor qilish", callback_data=f"broadcast_cancel_{job_id}")
+    builder.adjust(2)
+    return builder.as_markup()
@@ -1,11 +1,48 @@
+import random
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Keyword, Group as DBGroup
+from services.group_cache import CachedGroup, GroupCache, group_cache
+from services.spam_actions import SpamAction, SpamActionQueue, spam_actions
+from services.flood import FloodDetector, flood_detector
+from services.fingerprint import FingerprintIndex, fingerprint_index
+from services.domain_matcher import entity_links
+from services.spam_classifier import ClassifierBatcher, classifier_batcher
+from services.spam_samples import sample_recorder
+from config import FLOOD_MUTE_SECONDS, DUP_GROUP_THRESHOLD, CLASSIFIER_HAM_SAMPLE_RATE
 
 class SpamFilterMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        cache: GroupCache = group_cache,
+        actions: SpamActionQueue = spam_actions,
+        flood: FloodDetector = flood_detector,
+        fingerprints: FingerprintIndex = fingerprint_index,
+        dup_threshold: int = DUP_GROUP_THRESHOLD,
+        classifier: ClassifierBatcher = classifier_batcher
+    ):
+        self.cache = cache
+        self.actions = actions
+        self.flood = flood
+        self.fingerprints = fingerprints
+        self.dup_threshold = dup_threshold
+        self.classifier = classifier
+
+    async def block(self, event: Message, session: AsyncSession, group: CachedGroup, reason: str, text: str):
+        """Queues deletion and owner notification of a content-based spam hit."""
+        owner_telegram_id = await self.cache.resolve_owner(session, group)
+        self.actions.enqueue(SpamAction(
+            bot=event.bot,
+            chat_id=event.chat.id,
+            message_id=event.message_id,
+            group_title=group.title,
+            owner_telegram_id=owner_telegram_id,
+            keyword=reason,
+            group_id=group.id,
+            text=text
+        ))
+
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
@@ -24,66 +61,75 @@ class SpamFilterMiddleware(BaseMiddleware):
             # Should not happen if DbSessionMiddleware is registered before
             return await handler(event, data)
 
-        # Check if group is registered and has keywords
-        # Optimization: We might want to cache this, but for now we query.
-        # We need the group from DB.
-        
-        # NOTE: Group registration logic should probably happen in another middleware or handler. 
-        # But assuming the group is known or we look it up by telegram_id.
-        
-        stmt = select(DBGroup).where(DBGroup.telegram_id == event.chat.id)
-        result = await session.execute(stmt)
-        group = result.scalars().first()
+        # Group metadata and compiled keywords come from the in-process cache,
+        # so steady-state traffic does not touch the database.
+        group = await self.cache.get_or_load(session, event.chat.id)
 
         if not group:
             return await handler(event, data)
 
-        # Fetch keywords for this group
-        # Ideally we join or lazy load on the group object if we had it, but session usage intricacies...
-        # Let's just fetch keywords directly.
-        stmt_kw = select(Keyword.word).where(Keyword.group_id == group.id)
-        result_kw = await session.execute(stmt_kw)
-        keywords = result_kw.scalars().all()
-
-        if not keywords:
-            return await handler(event, data)
+        # Flood check runs before keyword matching and needs nothing but in-memory counters
+        if group.flood_user_limit or group.flood_chat_limit:
+            sender_id = event.from_user.id if event.from_user else None
+            flood, first_trip = self.flood.check(
+                event.chat.id,
+                sender_id,
+                user_limit=group.flood_user_limit,
+                chat_limit=group.flood_chat_limit,
+                window=group.flood_window
+            )
+            if flood:
+                self.actions.enqueue(SpamAction(
+                    bot=event.bot,
+                    chat_id=event.chat.id,
+                    message_id=event.message_id,
+                    group_title=group.title,
+                    owner_telegram_id=None,
+                    keyword=f"flood ({flood})",
+                    notify_owner=False,
+                    # Mute the sender once per burst; chat-wide floods only delete
+                    mute_user_id=sender_id if flood == "user" and first_trip else None,
+                    mute_seconds=FLOOD_MUTE_SECONDS
+                ))
+                return
 
         text = event.text or event.caption or ""
+
+        # Same text posted into many registered groups within a short window
+        if self.dup_threshold and text:
+            seen_in = self.fingerprints.observe(event.chat.id, text)
+            if seen_in > self.dup_threshold:
+                await self.block(event, session, group, "cross-group duplicate", text)
+                return
+
+        # Blocked domains are looked up only in link/mention entities, including hidden text_link URLs
+        if group.domains:
+            links = entity_links(text, event.entities or event.caption_entities)
+            blocked = group.domains.find_blocked(links)
+            if blocked:
+                await self.block(event, session, group, blocked, text)
+                return
+
         if not text:
             return await handler(event, data)
-            
-        text_lower = text.lower()
-        
-        for kw in keywords:
-            if kw.lower() in text_lower:
-                # Spam detected
-                try:
-                    await event.delete()
-                    if group.owner_id:
-                        # Fetch owner telegram_id
-                        # group.owner might not be loaded if we didn't eager load.
-                        # But group.owner_id is an integer (FK). 
-                        # We need the User object to get telegram_id.
-                        from database.models import User
-                        stmt_user = select(User).where(User.id == group.owner_id)
-                        res_user = await session.execute(stmt_user)
-                        owner = res_user.scalars().first()
-                        
-                        if owner:
-                            await event.bot.forward_message(
-                                chat_id=owner.telegram_id,
-                                from_chat_id=event.chat.id,
-                                message_id=event.message_id
-                            )
-                            # Maybe send a notification too?
-                            await event.bot.send_message(
-                                chat_id=owner.telegram_id,
-                                text=f"Spam detected in group {group.title} and deleted.\nKeyword: {kw}"
-                            )
-                except Exception as e:
-                    print(f"Error in spam filter: {e}")
-                
-                # Stop propagation
+
+        kw = group.matcher.find_first(text) if group.matcher else None
+
+        if kw:
+            # Spam detected: deletion and owner notification run in the background queue
+            await self.block(event, session, group, kw, text)
+
+            # Stop propagation
+            return
+
+        # Optional statistical stage; concurrent messages are scored together in micro-batches
+        if self.classifier.enabled:
+            probability = await self.classifier.score(text)
+            if self.classifier.is_spam(probability):
+                await self.block(event, session, group, "classifier", text)
                 return
 
+        if CLASSIFIER_HAM_SAMPLE_RATE and random.random() < CLASSIFIER_HAM_SAMPLE_RATE:
+            sample_recorder.add(group.id, event.chat.id, event.message_id, text, label=0, source="sample")
+
         return await handler(event, data)
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Set
+from aiogram import Bot
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import (
+    BROADCAST_WORKERS, BROADCAST_RATE, BROADCAST_BATCH_SIZE, BROADCAST_PROGRESS_SECONDS,
+    SEND_MAX_RETRIES, REPLICA_ID, DELIVERY_LEASE_SECONDS
+)
+from database.engine import AsyncSessionLocal
+from database.models import BroadcastJob, User
+from keyboards.inline.admin_kbs import broadcast_keyboard
+from services.dispatch import Dispatcher, SendJob, TokenBucket, dispatcher
+from services.outbox import utcnow
+from services.user_stream import user_pages
+
+logger = logging.getLogger(__name__)
+
+STATUS_LABELS = {
+    'running': "yuborilmoqda",
+    'paused': "to'xtatildi",
+    'cancelled': "bekor qilindi",
+    'done': "tugadi",
+}
+
+
+def progress_text(job: BroadcastJob, rate: Optional[float] = None) -> str:
+    done = job.sent + job.failed
+    # Users who joined during the job get it too, so done can pass the initial total
+    percent = min(100, done * 100 // job.total) if job.total else 100
+    lines = [
+        f"📣 Xabar yuborish: {STATUS_LABELS.get(job.status, job.status)}",
+        f"Jarayon: {done}/{job.total} ({percent}%)",
+        f"Yuborildi: {job.sent}",
+        f"Xatolar: {job.failed}",
+    ]
+    if rate and job.status == 'running':
+        left = max(0, job.total - done)
+        lines.append(f"Tezlik: {rate:.1f} xabar/s, qoldi ~{timedelta(seconds=int(left / rate))}")
+    return "\n".join(lines)
+
+
+async def send_text(bot: Bot, chat_id: int, text: str):
+    await bot.send_message(chat_id, text)
+
+
+class BroadcastRunner:
+    """
+    Sends /broadcast jobs in the background, one task per job.
+
+    A job walks the users table in id order, one keyset page (user_pages) at a time. Each
+    page of recipients goes through a rate-limited Dispatcher (concurrent sends; a
+    RetryAfter pauses all of them), then the cursor and the counters are committed, so a
+    restart resumes after the last committed page. Pause and cancel are status changes
+    of the job row, read between pages. Jobs are leased like deliveries: with several
+    replicas, one of them sends each job.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        workers: int = BROADCAST_WORKERS,
+        rate: float = BROADCAST_RATE,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+        progress_interval: float = BROADCAST_PROGRESS_SECONDS,
+        max_retries: int = SEND_MAX_RETRIES,
+        replica_id: str = REPLICA_ID,
+        lease_seconds: int = DELIVERY_LEASE_SECONDS,
+        shared_bucket: Optional[TokenBucket] = dispatcher.bucket
+    ):
+        self.session_factory = session_factory
+        # One budget for all running jobs, taken out of the scheduler's SEND_RATE bucket so the
+        # bot as a whole stays within it; one message per chat, so no chat interval
+        self.dispatcher = Dispatcher(
+            workers=workers, rate=rate, chat_interval=0, max_retries=max_retries,
+            global_backoff=True, parent_bucket=shared_bucket
+        )
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.replica_id = replica_id
+        self.lease_seconds = lease_seconds
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Jobs resumed while their task was still winding down after a pause
+        self._restart: Set[int] = set()
+        self._stopping = False
+
+    async def create(self, session: AsyncSession, bot: Bot, text: str, chat_id: int, created_by: int) -> BroadcastJob:
+        """Saves a job for every current user, posts its progress message to `chat_id` and starts it."""
+        total = (await session.execute(select(func.count(User.id)))).scalar() or 0
+        job = BroadcastJob(text=text, created_by=created_by, status='running', cursor=0, total=total, sent=0, failed=0)
+        session.add(job)
+        await session.flush()
+        progress = await bot.send_message(chat_id, progress_text(job), reply_markup=broadcast_keyboard(job.id, job.status))
+        job.progress_chat_id = chat_id
+        job.progress_message_id = progress.message_id
+        await session.commit()
+        self.start(bot, job.id)
+        return job
+
+    def start(self, bot: Bot, job_id: int):
+        if job_id in self._tasks:
+            self._restart.add(job_id)
+            return
+        self._tasks[job_id] = asyncio.create_task(self._run(bot, job_id))
+
+    async def resume_all(self, bot: Bot) -> int:
+        """Restarts the jobs that were running when the bot stopped; paused ones wait for the admin."""
+        async with self.session_factory() as session:
+            ids = (await session.execute(select(BroadcastJob.id).where(BroadcastJob.status == 'running'))).scalars().all()
+        for job_id in ids:
+            self.start(bot, job_id)
+        return len(ids)
+
+    async def pause(self, session: AsyncSession, job_id: int) -> Optional[BroadcastJob]:
+        """Stops the job after its current batch. None if it was not running."""
+        return await self._transition(session, job_id, ('running',), 'paused')
+
+    async def resume(self, session: AsyncSession, bot: Bot, job_id: int) -> Optional[BroadcastJob]:
+        job = await self._transition(session, job_id, ('paused',), 'running')
+        if job is not None:
+            self.start(bot, job_id)
+        return job
+
+    async def cancel(self, session: AsyncSession, job_id: int) -> Optional[BroadcastJob]:
+        return await self._transition(session, job_id, ('running', 'paused'), 'cancelled')
+
+    async def _transition(self, session: AsyncSession, job_id: int, from_statuses: Iterable[str], status: str) -> Optional[BroadcastJob]:
+        values = {"status": status}
+        if status == 'cancelled':
+            values["finished_at"] = utcnow()
+        res = await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status.in_(list(from_statuses)))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if not res.rowcount:
+            return None
+        return await session.get(BroadcastJob, job_id, populate_existing=True)
+
+    async def _claim(self, session: AsyncSession, job: BroadcastJob) -> bool:
+        now = utcnow()
+        res = await session.execute(
+            update(BroadcastJob)
+            .where(
+                BroadcastJob.id == job.id,
+                BroadcastJob.status == 'running',
+                or_(
+                    BroadcastJob.lease_until.is_(None),
+                    BroadcastJob.lease_until <= now,
+                    BroadcastJob.claimed_by == self.replica_id
+                )
+            )
+            .values(claimed_by=self.replica_id, lease_until=now + timedelta(seconds=self.lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if not res.rowcount:
+            return False
+        await session.refresh(job)
+        return True
+
+    async def _run(self, bot: Bot, job_id: int):
+        try:
+            while not self._stopping:
+                async with self.session_factory() as session:
+                    job = await session.get(BroadcastJob, job_id)
+                    if job is None or job.status != 'running':
+                        return
+                    if await self._claim(session, job):
+                        await self._send(bot, session, job)
+                        return
+                    # Another replica sends it; take over if its lease runs out
+                    wait = (job.lease_until - utcnow()).total_seconds() if job.lease_until else 0
+                await asyncio.sleep(max(1.0, wait))
+        except Exception:
+            logger.exception("Broadcast %s stopped", job_id)
+        finally:
+            self._tasks.pop(job_id, None)
+            if job_id in self._restart:
+                self._restart.discard(job_id)
+                if not self._stopping:
+                    self.start(bot, job_id)
+
+    async def _send(self, bot: Bot, session: AsyncSession, job: BroadcastJob):
+        started = time.monotonic()
+        sent_here = 0
+        reported_at = started
+        async with aclosing(user_pages(session, (User.telegram_id,), self.batch_size, after=job.cursor)) as pages:
+            async for rows in pages:
+                jobs = [SendJob(chat_id=telegram_id, payload=job.text, title=str(telegram_id)) for _, telegram_id in rows]
+                report = await self.dispatcher.run(bot, jobs, send_text)
+                job.cursor = rows[-1][0]
+                job.sent += report.sent
+                job.failed += report.failed
+                job.lease_until = utcnow() + timedelta(seconds=self.lease_seconds)
+                await session.commit()
+                sent_here += len(rows)
+
+                # Pause and cancel may come from another replica, so the row decides
+                await session.refresh(job, ["status"])
+                if job.status != 'running' or self._stopping:
+                    break
+                now = time.monotonic()
+                if now - reported_at >= self.progress_interval:
+                    reported_at = now
+                    await self._report(bot, job, sent_here / (now - started) if now > started else None)
+            else:
+                # Only a running job finishes; a pause or cancel that came in meanwhile stands
+                await session.execute(
+                    update(BroadcastJob)
+                    .where(BroadcastJob.id == job.id, BroadcastJob.status == 'running')
+                    .values(status='done', finished_at=utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+
+        # Released, so a restart or a resume picks the job up without waiting for the lease
+        job.lease_until = None
+        await session.commit()
+        await session.refresh(job)
+        await self._report(bot, job)
+        if job.status == 'done' and job.progress_chat_id:
+            try:
+                await bot.send_message(job.progress_chat_id, f"Xabar yuborish tugadi. {job.sent} foydalanuvchilarga yuborildi.")
+            except Exception as e:
+                logger.warning("Failed to report the end of broadcast %s: %s", job.id, e)
+
+    async def _report(self, bot: Bot, job: BroadcastJob, rate: Optional[float] = None):
+        if job.progress_message_id is None:
+            return
+        try:
+            await bot.edit_message_text(
+                text=progress_text(job, rate),
+                chat_id=job.progress_chat_id,
+                message_id=job.progress_message_id,
+                reply_markup=broadcast_keyboard(job.id, job.status)
+            )
+        except Exception as e:
+            # "Message is not modified", or the admin deleted it; the job row keeps the progress
+            logger.debug("Progress of broadcast %s not updated: %s", job.id, e)
+
+    async def join(self):
+        """Waits until no job task of this process is left (finished, paused or cancelled)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Lets running jobs finish their current batch and release their lease, so the next
+        start resumes them right away; jobs still busy after `timeout` are cancelled.
+        """
+        self._stopping = True
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+broadcasts = BroadcastRunner()
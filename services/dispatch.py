@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from aiogram.exceptions import TelegramRetryAfter
+from config import SEND_WORKERS, SEND_RATE, SEND_CHAT_INTERVAL, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Global send budget: `rate` tokens per second, bursting up to `burst`. A rate of 0 is
+    unlimited. With a `parent`, every token is also taken from the parent: a share
+    (broadcasts) inside a larger budget (the bot's SEND_RATE).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        parent: Optional["TokenBucket"] = None
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.parent = parent
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._resume_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Holds back every acquire for `seconds`, for a RetryAfter that applies to the whole bot."""
+        self._resume_at = max(self._resume_at, self._clock() + seconds)
+        if self.parent is not None:
+            self.parent.pause(seconds)
+
+    async def acquire(self):
+        await self._acquire_own()
+        # The share's token first: waiting for it must not hold one of the parent's
+        if self.parent is not None:
+            await self.parent.acquire()
+
+    async def _acquire_own(self):
+        while self._resume_at > self._clock():
+            await asyncio.sleep(self._resume_at - self._clock())
+        if self.rate <= 0:
+            return
+        # The lock keeps waiters in FIFO order instead of racing for each refill
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Tolerance for float rounding of the refill, or a sub-nanosecond sleep could repeat forever
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class SendJob:
+    chat_id: int
+    payload: Any
+    title: str = ""
+    schedule_id: Optional[int] = None
+    attempts: int = 0
+    sent: bool = False
+    # Dispatcher clock reading of the successful send
+    sent_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class DispatchReport:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    first_sent_at: Optional[float] = None
+    last_sent_at: Optional[float] = None
+    send_times: List[float] = field(default_factory=list)
+
+    @property
+    def spread(self) -> float:
+        """Seconds between the first and the last successful send of the tick."""
+        if self.first_sent_at is None:
+            return 0.0
+        return self.last_sent_at - self.first_sent_at
+
+    @property
+    def elapsed(self) -> float:
+        return self.finished_at - self.started_at
+
+    def format(self) -> str:
+        return (
+            f"{self.sent}/{self.total} sent, {self.failed} failed, {self.retried} retries, "
+            f"spread {self.spread:.2f}s, elapsed {self.elapsed:.2f}s"
+        )
+
+
+class Dispatcher:
+    """
+    Sends the posts of a scheduler tick concurrently with a bounded worker pool.
+
+    Workers take chats, not posts, from a ready queue: a chat's posts go out one at a
+    time and the chat is put back on the queue after `chat_interval` (or after a
+    RetryAfter's delay), so a slow or throttled chat never holds a worker or delays
+    the others. Every send also takes a token from the global bucket. With
+    `global_backoff` a RetryAfter pauses the bucket as well: broadcasts hit the bot-wide
+    limit rather than a single chat's. With `parent_bucket` the dispatcher's rate is a
+    share of that larger budget.
+    """
+
+    def __init__(
+        self,
+        workers: int = SEND_WORKERS,
+        rate: float = SEND_RATE,
+        chat_interval: float = SEND_CHAT_INTERVAL,
+        max_retries: int = SEND_MAX_RETRIES,
+        clock: Callable[[], float] = time.monotonic,
+        global_backoff: bool = False,
+        parent_bucket: Optional[TokenBucket] = None
+    ):
+        self.workers = max(1, workers)
+        # Send timestamps and the bucket's refills; the dry-run simulator passes its virtual clock
+        self.clock = clock
+        self.bucket = TokenBucket(rate, clock=clock, parent=parent_bucket)
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.global_backoff = global_backoff
+        self.last_report: Optional[DispatchReport] = None
+
+    async def run(self, bot, jobs: List[SendJob], send: Callable[[Any, int, Any], Awaitable[Any]]) -> DispatchReport:
+        report = DispatchReport(total=len(jobs), started_at=self.clock())
+        if not jobs:
+            report.finished_at = report.started_at
+            self.last_report = report
+            return report
+
+        loop = asyncio.get_running_loop()
+        by_chat: Dict[int, Deque[SendJob]] = defaultdict(deque)
+        for job in jobs:
+            by_chat[job.chat_id].append(job)
+
+        ready: asyncio.Queue = asyncio.Queue()
+        for chat_id in by_chat:
+            ready.put_nowait(chat_id)
+
+        remaining = len(jobs)
+        done = asyncio.Event()
+        timers: List[asyncio.TimerHandle] = []
+
+        def finish(job: SendJob):
+            nonlocal remaining
+            by_chat[job.chat_id].popleft()
+            remaining -= 1
+            if remaining == 0:
+                done.set()
+
+        def requeue(chat_id: int, delay: float):
+            if delay > 0:
+                timers.append(loop.call_later(delay, ready.put_nowait, chat_id))
+            else:
+                ready.put_nowait(chat_id)
+
+        async def worker():
+            while True:
+                chat_id = await ready.get()
+                queue = by_chat[chat_id]
+                job = queue[0]
+                await self.bucket.acquire()
+                job.attempts += 1
+                try:
+                    await send(bot, chat_id, job.payload)
+                except TelegramRetryAfter as e:
+                    if self.global_backoff:
+                        self.bucket.pause(e.retry_after)
+                    if job.attempts <= self.max_retries:
+                        report.retried += 1
+                        requeue(chat_id, e.retry_after)
+                        continue
+                    logger.warning("Giving up on %s after %s RetryAfter answers", job.title or chat_id, job.attempts)
+                    job.error = str(e)
+                    report.failed += 1
+                    finish(job)
+                except Exception as e:
+                    logger.warning("Failed to send to %s: %s", job.title or chat_id, e)
+                    job.error = str(e)
+                    report.failed += 1
+                    finish(job)
+                else:
+                    sent_at = self.clock()
+                    job.sent = True
+                    job.sent_at = sent_at
+                    report.sent += 1
+                    report.send_times.append(sent_at - report.started_at)
+                    if report.first_sent_at is None:
+                        report.first_sent_at = sent_at
+                    report.last_sent_at = sent_at
+                    finish(job)
+                if queue:
+                    requeue(chat_id, self.chat_interval)
+
+        tasks = [loop.create_task(worker()) for _ in range(min(self.workers, len(by_chat)))]
+        try:
+            await done.wait()
+        finally:
+            for timer in timers:
+                timer.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        report.finished_at = self.clock()
+        self.last_report = report
+        return report
+
+
+dispatcher = Dispatcher()
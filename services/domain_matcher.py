@@ -0,0 +1,113 @@
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# Telegram links and @mentions are matched as "<username>.t.me"
+_TELEGRAM_HOSTS = {"t.me", "telegram.me", "telegram.dog"}
+_HOST_RE = re.compile(r"^[a-z0-9_\-.]+$")
+
+
+def normalize_domain(raw: str) -> Optional[str]:
+    """
+    Turns a URL, host, t.me link or @mention into a lowercase host name.
+    Returns None when nothing host-like is left.
+    """
+    value = (raw or "").strip().lower()
+    if not value:
+        return None
+
+    if value.startswith("@"):
+        username = value[1:]
+        return f"{username}.t.me" if _HOST_RE.match(username) else None
+
+    if "://" not in value:
+        value = "http://" + value
+    try:
+        parts = urlsplit(value)
+    except ValueError:
+        return None
+
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    if not host or not _HOST_RE.match(host):
+        return None
+
+    if host in _TELEGRAM_HOSTS:
+        username = parts.path.strip("/").split("/")[0]
+        if username and _HOST_RE.match(username):
+            return f"{username}.t.me"
+        return "t.me"
+    return host
+
+
+class DomainMatcher:
+    """
+    Per-group domain block/allow rules compiled into a trie of reversed host labels
+    (com -> example -> www). The most specific rule on a host's path decides, so
+    allowing "docs.example.com" overrides blocking "example.com".
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, bool]]):
+        # node: [children, verdict] where verdict is True (blocked), False (allowed) or None
+        self._root: List = [{}, None]
+        self.size = 0
+        for domain, is_allowed in rules:
+            host = normalize_domain(domain)
+            if host:
+                self._add(host, not is_allowed)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def _add(self, host: str, blocked: bool):
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node[0].setdefault(label, [{}, None])
+        if node[1] is None:
+            self.size += 1
+        # Allow wins if the same host is listed both ways
+        node[1] = blocked if node[1] is None else (node[1] and blocked)
+
+    def is_blocked(self, host: str) -> bool:
+        node = self._root
+        verdict = None
+        for label in reversed(host.split(".")):
+            node = node[0].get(label)
+            if node is None:
+                break
+            if node[1] is not None:
+                verdict = node[1]
+        return bool(verdict)
+
+    def find_blocked(self, values: Sequence[str]) -> Optional[str]:
+        """Returns the first blocked host among raw URLs/mentions, or None."""
+        for raw in values:
+            host = normalize_domain(raw)
+            if host and self.is_blocked(host):
+                return host
+        return None
+
+
+def entity_links(text: Optional[str], entities) -> List[str]:
+    """
+    Collects the raw values of url, text_link and mention entities.
+    Only the entity spans are decoded, not the whole message.
+    """
+    if not entities:
+        return []
+    links: List[str] = []
+    encoded = None
+    for entity in entities:
+        if entity.type == "text_link":
+            if entity.url:
+                links.append(entity.url)
+        elif entity.type in ("url", "mention") and text:
+            if encoded is None:
+                # Entity offsets are in UTF-16 code units
+                encoded = text.encode("utf-16-le")
+            links.append(encoded[entity.offset * 2:(entity.offset + entity.length) * 2].decode("utf-16-le"))
+    return links
@@ -1,25 +1,28 @@
-import pandas as pd
-import io
-from typing import List
+import asyncio
+from typing import AsyncIterator, List
+from openpyxl import Workbook
+from sqlalchemy import Row
 from database.models import User
 
-def export_users_to_excel(users: List[User]) -> io.BytesIO:
-    data = []
-    for user in users:
-        data.append({
-            "ID": user.id,
-            "Telegram ID": user.telegram_id,
-            "Full Name": user.full_name,
-            "Username": user.username,
-            "Is Admin": user.is_admin
-        })
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    
-    # Write to Excel
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Users')
-    
-    output.seek(0)
-    return output
+# Exported columns and their headers
+USER_EXPORT_COLUMNS = (User.id, User.telegram_id, User.full_name, User.username, User.is_admin)
+USER_EXPORT_HEADERS = ("ID", "Telegram ID", "Full Name", "Username", "Is Admin")
+
+
+async def export_users_to_excel(batches: AsyncIterator[List[Row]], path: str) -> int:
+    """
+    Writes batches of USER_EXPORT_COLUMNS rows to an .xlsx file at `path` and returns the
+    number of users. The write-only workbook streams rows to disk as they arrive, so
+    memory does not grow with the number of users.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Users")
+    sheet.append(USER_EXPORT_HEADERS)
+    count = 0
+    async for rows in batches:
+        for row in rows:
+            sheet.append(tuple(row))
+        count += len(rows)
+    # Zipping a large sheet takes a while, off the event loop
+    await asyncio.to_thread(workbook.save, path)
+    return count
@@ -0,0 +1,126 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+from config import DUP_WINDOW, DUP_MAX_ENTRIES, DUP_MIN_CHARS
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# Texts within this Hamming distance count as the same message.
+# With 4 bands, any pair this close shares at least one band exactly.
+MAX_DISTANCE = BANDS - 1
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles of the normalised text."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    if len(words) < 3:
+        shingles = words
+    else:
+        shingles = [" ".join(words[i:i + 3]) for i in range(len(words) - 2)]
+
+    rows = [
+        format(int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big"), "064b")
+        for s in shingles
+    ]
+    half = len(rows) / 2
+    # Column-wise majority vote; zip/count keep the bit loop in C
+    bits = "".join("1" if column.count("1") > half else "0" for column in zip(*rows))
+    return int(bits, 2)
+
+
+class FingerprintEntry:
+    __slots__ = ("fingerprint", "chats", "last_seen")
+
+    def __init__(self, fingerprint: int, now: float):
+        self.fingerprint = fingerprint
+        # chat_id -> last time this text was seen there
+        self.chats: Dict[int, float] = {}
+        self.last_seen = now
+
+
+class FingerprintIndex:
+    """
+    Rolling index of recent message fingerprints across all registered groups.
+    Near-duplicates are found through banded lookup; entries expire after the window.
+    """
+
+    def __init__(self, window: float = DUP_WINDOW, max_entries: int = DUP_MAX_ENTRIES, min_chars: int = DUP_MIN_CHARS):
+        self.window = window
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self._entries: "OrderedDict[int, FingerprintEntry]" = OrderedDict()
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _band_values(fingerprint: int):
+        mask = (1 << BAND_BITS) - 1
+        return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+    def _remove(self, fingerprint: int):
+        self._entries.pop(fingerprint, None)
+        for band, value in zip(self._bands, self._band_values(fingerprint)):
+            bucket = band.get(value)
+            if bucket is not None:
+                bucket.discard(fingerprint)
+                if not bucket:
+                    del band[value]
+
+    def _expire(self, now: float):
+        while self._entries:
+            fingerprint, entry = next(iter(self._entries.items()))
+            if now - entry.last_seen <= self.window and len(self._entries) <= self.max_entries:
+                break
+            self._remove(fingerprint)
+
+    def _find(self, fingerprint: int) -> Optional[FingerprintEntry]:
+        if fingerprint in self._entries:
+            return self._entries[fingerprint]
+        for band, value in zip(self._bands, self._band_values(fingerprint)):
+            for candidate in band.get(value, ()):
+                if bin(candidate ^ fingerprint).count("1") <= MAX_DISTANCE:
+                    return self._entries[candidate]
+        return None
+
+    def observe(self, chat_id: int, text: str, now: Optional[float] = None) -> int:
+        """
+        Records a message and returns in how many distinct chats it (or a near-duplicate)
+        was seen within the window, this one included. Short texts return 0.
+        """
+        if not text or len(text) < self.min_chars:
+            return 0
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return 0
+
+        now = time.monotonic() if now is None else now
+
+        entry = self._find(fingerprint)
+        if entry is None:
+            entry = FingerprintEntry(fingerprint, now)
+            self._entries[fingerprint] = entry
+            for band, value in zip(self._bands, self._band_values(fingerprint)):
+                band.setdefault(value, set()).add(fingerprint)
+        else:
+            self._entries.move_to_end(entry.fingerprint)
+
+        entry.last_seen = now
+        entry.chats[chat_id] = now
+        for other, seen in list(entry.chats.items()):
+            if now - seen > self.window:
+                del entry.chats[other]
+
+        # The touched entry is now the newest, so expiry never drops it
+        self._expire(now)
+        return len(entry.chats)
+
+
+fingerprint_index = FingerprintIndex()
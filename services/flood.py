@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+from config import FLOOD_IDLE_TTL, FLOOD_MAX_KEYS
+
+
+class SlidingWindow:
+    """Timestamps of the last `limit` messages; flooding means all of them fit in the window."""
+    __slots__ = ("hits", "last_seen", "tripped_at")
+
+    def __init__(self, limit: int):
+        self.hits = deque(maxlen=limit)
+        self.last_seen = 0.0
+        self.tripped_at = float("-inf")
+
+
+class FloodDetector:
+    """
+    In-memory per-chat and per-user message rate limiter.
+    Counters are bounded by the limit, and idle ones are evicted.
+    """
+
+    def __init__(self, idle_ttl: float = FLOOD_IDLE_TTL, max_keys: int = FLOOD_MAX_KEYS):
+        self.idle_ttl = idle_ttl
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Tuple[int, int], SlidingWindow]" = OrderedDict()
+        self._last_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _hit(self, key: Tuple[int, int], limit: int, window: float, now: float) -> Tuple[bool, bool]:
+        """Returns (flooding, first trip within this window)."""
+        counter = self._windows.get(key)
+        if counter is None or counter.hits.maxlen != limit:
+            counter = SlidingWindow(limit)
+            self._windows[key] = counter
+        else:
+            self._windows.move_to_end(key)
+
+        counter.last_seen = now
+        counter.hits.append(now)
+        if len(counter.hits) < limit or now - counter.hits[0] > window:
+            return False, False
+
+        first = now - counter.tripped_at > window
+        counter.tripped_at = now
+        return True, first
+
+    def _evict(self, now: float):
+        # Counters are kept in last-seen order, so idle ones sit at the front
+        if now - self._last_sweep >= 1.0:
+            self._last_sweep = now
+            while self._windows:
+                key, counter = next(iter(self._windows.items()))
+                if now - counter.last_seen < self.idle_ttl:
+                    break
+                del self._windows[key]
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+    def check(
+        self,
+        chat_id: int,
+        user_id: Optional[int],
+        user_limit: int,
+        chat_limit: int,
+        window: float,
+        now: Optional[float] = None
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Counts one message. Returns ("user" | "chat" | None, first trip) where first trip
+        is True only for the first flooding message of a burst (used to mute once).
+        """
+        if window <= 0:
+            return None, False
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        reason, first = None, False
+        if user_limit > 0 and user_id is not None:
+            flooding, first = self._hit((chat_id, user_id), user_limit, window, now)
+            if flooding:
+                reason = "user"
+        if chat_limit > 0:
+            # Chat-wide counter uses user id 0
+            flooding, chat_first = self._hit((chat_id, 0), chat_limit, window, now)
+            if flooding and reason is None:
+                reason, first = "chat", chat_first
+        return reason, first
+
+
+flood_detector = FloodDetector()
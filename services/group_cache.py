@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Group, Keyword, Domain, User
+from services.keyword_matcher import KeywordMatcher
+from services.domain_matcher import DomainMatcher
+from config import (
+    GROUP_CACHE_SIZE, NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_SIZE, KNOWN_IDS_REFRESH_SECONDS,
+    FLOOD_USER_LIMIT, FLOOD_CHAT_LIMIT, FLOOD_WINDOW
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedGroup:
+    id: int
+    telegram_id: int
+    title: Optional[str]
+    owner_id: Optional[int]
+    matcher: KeywordMatcher
+    domains: DomainMatcher
+    flood_user_limit: int = FLOOD_USER_LIMIT
+    flood_chat_limit: int = FLOOD_CHAT_LIMIT
+    flood_window: int = FLOOD_WINDOW
+    # Resolved lazily on the first spam hit, then kept with the entry
+    owner_telegram_id: Optional[int] = None
+    owner_resolved: bool = False
+
+
+class NegativeCache:
+    """Chat ids known not to be registered groups, with TTL and LRU eviction."""
+
+    def __init__(self, ttl: float = NEGATIVE_CACHE_TTL, max_size: int = NEGATIVE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expires: "OrderedDict[int, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, chat_id: int) -> bool:
+        expires_at = self._expires.get(chat_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._expires[chat_id]
+            return False
+        self._expires.move_to_end(chat_id)
+        return True
+
+    def add(self, chat_id: int):
+        self._expires[chat_id] = time.monotonic() + self.ttl
+        self._expires.move_to_end(chat_id)
+        while len(self._expires) > self.max_size:
+            self._expires.popitem(last=False)
+
+    def discard(self, chat_id: int):
+        self._expires.pop(chat_id, None)
+
+    def clear(self):
+        self._expires.clear()
+
+
+class BloomFilter:
+    """
+    Compact prefilter over registered chat ids. A negative answer is exact,
+    a positive one may be false and is confirmed through the cache/database.
+    """
+
+    def __init__(self, capacity: int, hashes: int = 7):
+        # ~10 bits per item keeps false positives around 1% at full capacity
+        self.size = max(capacity, 1024) * 10
+        self.hashes = hashes
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: int):
+        # Double hashing over a 64-bit mix of the id (splitmix64 finalizer)
+        x = key & 0xFFFFFFFFFFFFFFFF
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 31
+        h1 = x & 0xFFFFFFFF
+        h2 = (x >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: int):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class GroupCache:
+    """
+    Bounded LRU cache of registered groups and their compiled keywords, keyed by chat id.
+    Entries are dropped by the admin/group handlers whenever they change a group or its keywords.
+    Unregistered chats are answered from a bloom prefilter and a negative cache. The
+    prefilter is rebuilt every `refresh_interval` seconds (start()), so groups registered by
+    other replicas or written to the database directly get through.
+    """
+
+    def __init__(self, max_size: int = GROUP_CACHE_SIZE, refresh_interval: float = KNOWN_IDS_REFRESH_SECONDS):
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._entries: "OrderedDict[int, CachedGroup]" = OrderedDict()
+        self._chat_by_group_id: Dict[int, int] = {}
+        # Bumped on every invalidation so a load that raced with a write is not stored
+        self._generation = 0
+        self.negative = NegativeCache()
+        # Stays None until load_known_ids() runs; until then every chat goes to the DB once
+        self.known: Optional[BloomFilter] = None
+        # Chats registered while load_known_ids() is querying, added to the filter it builds
+        self._registered_during_load: Optional[Set[int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int) -> Optional[CachedGroup]:
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            self._entries.move_to_end(chat_id)
+        return entry
+
+    def put(self, entry: CachedGroup):
+        self._entries[entry.telegram_id] = entry
+        self._entries.move_to_end(entry.telegram_id)
+        self._chat_by_group_id[entry.id] = entry.telegram_id
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._chat_by_group_id.pop(evicted.id, None)
+
+    def invalidate(self, chat_id: int):
+        """Drops the entry for a chat (by Telegram chat id)."""
+        self._generation += 1
+        entry = self._entries.pop(chat_id, None)
+        if entry is not None:
+            self._chat_by_group_id.pop(entry.id, None)
+
+    def invalidate_group(self, group_id: int):
+        """Drops the entry for a group (by database id)."""
+        self._generation += 1
+        chat_id = self._chat_by_group_id.pop(group_id, None)
+        if chat_id is not None:
+            self._entries.pop(chat_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._chat_by_group_id.clear()
+        self.negative.clear()
+        self.known = None
+
+    def set_known_ids(self, chat_ids: Iterable[int]):
+        chat_ids = list(chat_ids)
+        known = BloomFilter(capacity=len(chat_ids) * 2)
+        for chat_id in chat_ids:
+            known.add(chat_id)
+            # Registered elsewhere since this process cached it as unknown
+            self.negative.discard(chat_id)
+        self.known = known
+
+    async def load_known_ids(self, session: AsyncSession):
+        """Builds the bloom prefilter from every registered Group.telegram_id."""
+        registered = self._registered_during_load = set()
+        try:
+            res = await session.execute(select(Group.telegram_id))
+            chat_ids = res.scalars().all()
+        finally:
+            self._registered_during_load = None
+        self.set_known_ids([*chat_ids, *registered])
+
+    async def _refresh(self, session_factory):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with session_factory() as session:
+                    await self.load_known_ids(session)
+            except Exception as e:
+                logger.warning("Failed to reload registered chat ids: %s", e)
+
+    def start(self, session_factory):
+        """Rebuilds the prefilter in the background; a refresh_interval of 0 keeps the first one."""
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._refresh(session_factory))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def mark_registered(self, chat_id: int):
+        """Called when a chat becomes a registered group."""
+        self._generation += 1
+        self.negative.discard(chat_id)
+        if self.known is not None:
+            self.known.add(chat_id)
+        if self._registered_during_load is not None:
+            self._registered_during_load.add(chat_id)
+
+    async def get_or_load(self, session: AsyncSession, chat_id: int) -> Optional[CachedGroup]:
+        entry = self.get(chat_id)
+        if entry is not None:
+            return entry
+
+        if self.known is not None and chat_id not in self.known:
+            return None
+
+        if chat_id in self.negative:
+            return None
+
+        generation = self._generation
+
+        stmt = select(Group).where(Group.telegram_id == chat_id)
+        result = await session.execute(stmt)
+        group = result.scalars().first()
+
+        if not group:
+            if generation == self._generation:
+                self.negative.add(chat_id)
+            return None
+
+        stmt_kw = select(Keyword.word).where(Keyword.group_id == group.id)
+        result_kw = await session.execute(stmt_kw)
+        keywords = result_kw.scalars().all()
+
+        stmt_domains = select(Domain.domain, Domain.is_allowed).where(Domain.group_id == group.id)
+        result_domains = await session.execute(stmt_domains)
+        domains = [(domain, bool(is_allowed)) for domain, is_allowed in result_domains.all()]
+
+        entry = CachedGroup(
+            id=group.id,
+            telegram_id=group.telegram_id,
+            title=group.title,
+            owner_id=group.owner_id,
+            matcher=KeywordMatcher(keywords),
+            domains=DomainMatcher(domains),
+            flood_user_limit=FLOOD_USER_LIMIT if group.flood_user_limit is None else group.flood_user_limit,
+            flood_chat_limit=FLOOD_CHAT_LIMIT if group.flood_chat_limit is None else group.flood_chat_limit,
+            flood_window=FLOOD_WINDOW if group.flood_window is None else group.flood_window
+        )
+        if generation == self._generation:
+            self.put(entry)
+        return entry
+
+    async def resolve_owner(self, session: AsyncSession, entry: CachedGroup) -> Optional[int]:
+        """Returns the owner's Telegram id, querying the database only once per entry."""
+        if not entry.owner_resolved:
+            if entry.owner_id:
+                stmt = select(User).where(User.id == entry.owner_id)
+                res = await session.execute(stmt)
+                owner = res.scalars().first()
+                entry.owner_telegram_id = owner.telegram_id if owner else None
+            entry.owner_resolved = True
+        return entry.owner_telegram_id
+
+
+group_cache = GroupCache()
@@ -0,0 +1,91 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class KeywordMatcher:
+    """
+    Case-insensitive multi-keyword matcher (Aho-Corasick automaton).
+    Built once from a group's keywords, then scans a message in a single pass
+    regardless of how many keywords the group has.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        # lowered keyword -> keyword as the owner typed it (for notifications)
+        self.keywords: Dict[str, str] = {}
+        for kw in keywords:
+            if not kw:
+                continue
+            lowered = kw.strip().lower()
+            if lowered and lowered not in self.keywords:
+                self.keywords[lowered] = kw.strip()
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for lowered in self.keywords:
+            self._insert(lowered)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def _insert(self, word: str):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(word)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                # Inherit matches that end at the fallback state (suffix keywords)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str, first_only: bool) -> List[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: List[str] = []
+        seen = set()
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for word in out[state]:
+                    if word not in seen:
+                        seen.add(word)
+                        found.append(self.keywords[word])
+                if first_only:
+                    return found[:1]
+        return found
+
+    def find_first(self, text: str) -> Optional[str]:
+        """Returns the first keyword found in the text, or None."""
+        if not self.keywords or not text:
+            return None
+        found = self._scan(text, first_only=True)
+        return found[0] if found else None
+
+    def find_all(self, text: str) -> List[str]:
+        """Returns every distinct keyword found in the text, in order of appearance."""
+        if not self.keywords or not text:
+            return []
+        return self._scan(text, first_only=False)
@@ -0,0 +1,291 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+import pytz
+from sqlalchemy import and_, case, delete, func, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import (
+    DELIVERY_MAX_ATTEMPTS, DELIVERY_RETRY_BACKOFF, DELIVERY_GRACE_MINUTES, DELIVERY_RETENTION_DAYS,
+    DELIVERY_LEASE_SECONDS, DELIVERY_CLAIM_BATCH, REPLICA_ID
+)
+from database.models import Delivery, Group, Post, ScheduleTimes
+from services.recurrence import group_tz, next_run_utc
+from services.rotation import pick_posts
+from services.schedule_index import ScheduleIndex, schedule_index
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    """Naive UTC, the form outbox timestamps are stored in."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Outbox:
+    """
+    Persisted plan of scheduled sends, one Delivery per (schedule, occurrence).
+
+    A tick first plans the schedules whose next_run_at has come: each occurrence gets a
+    delivery, with the post picked (and the rotation advanced) at that moment. It then claims
+    every pending delivery whose attempt time has come, which includes earlier failures
+    waiting for their backoff. Tracking the earliest retry in memory keeps idle ticks
+    free of queries.
+
+    Replicas sharing the database coordinate through row locks: due schedules are
+    planned under FOR UPDATE SKIP LOCKED (the unique outbox key backs it up), and
+    deliveries are leased to one replica before anything is sent.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DELIVERY_MAX_ATTEMPTS,
+        backoff: int = DELIVERY_RETRY_BACKOFF,
+        grace_minutes: int = DELIVERY_GRACE_MINUTES,
+        retention_days: int = DELIVERY_RETENTION_DAYS,
+        index: ScheduleIndex = schedule_index,
+        replica_id: str = REPLICA_ID,
+        lease_seconds: int = DELIVERY_LEASE_SECONDS,
+        claim_batch: int = DELIVERY_CLAIM_BATCH
+    ):
+        self.index = index
+        self.replica_id = replica_id
+        self.lease_seconds = lease_seconds
+        self.claim_batch = claim_batch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.grace_minutes = grace_minutes
+        self.retention_days = retention_days
+        # (index, count) under sharded dispatch: only groups with id % count == index
+        self.shard: Optional[Tuple[int, int]] = None
+        # Earliest pending attempt or lease expiry, refreshed by load_next_retry after every tick that did work
+        self.next_retry_at: Optional[datetime] = None
+
+    def retry_due(self, now: datetime) -> bool:
+        return self.next_retry_at is not None and self.next_retry_at <= now
+
+    def _shard_filter(self, group_id_column):
+        if self.shard is None:
+            return true()
+        index, count = self.shard
+        return group_id_column % count == index
+
+    async def plan(self, session: AsyncSession, due_ids: Set[int], now: datetime, horizon: Optional[datetime] = None) -> int:
+        """
+        Plans every schedule whose next_run_at has come by `horizon` (default: `now`; a later
+        horizon pre-stages the coming occurrences). Each due schedule is stepped through its
+        occurrences up to the horizon: the ones older than the grace window expire, the others
+        get a delivery unless they already have one. next_run_at then moves on to the first
+        run after the horizon. Returns how many deliveries were added.
+        """
+        horizon = horizon or now
+        stmt = (
+            select(ScheduleTimes, Group, Delivery.id)
+            .join(Group, Group.id == ScheduleTimes.group_id)
+            .outerjoin(Delivery, and_(Delivery.schedule_id == ScheduleTimes.id, Delivery.fire_at == ScheduleTimes.next_run_at))
+            .where(ScheduleTimes.next_run_at <= horizon, self._shard_filter(ScheduleTimes.group_id))
+            .order_by(ScheduleTimes.next_run_at, ScheduleTimes.id)
+            # Rows another replica is planning right now are left to it
+            .with_for_update(skip_locked=True, of=[ScheduleTimes, Group])
+        )
+        rows = (await session.execute(stmt)).all()
+
+        # Schedules deleted, or advanced by another replica, since this index saw them
+        missing = due_ids - {schedule.id for schedule, _, _ in rows}
+        if missing:
+            res = await session.execute(
+                select(ScheduleTimes.id, ScheduleTimes.next_run_at).where(ScheduleTimes.id.in_(missing))
+            )
+            current = dict(res.all())
+            for schedule_id in missing:
+                self.index.add(schedule_id, current.get(schedule_id))
+
+        cutoff = now - timedelta(minutes=self.grace_minutes)
+        # (schedule, group, fire_at) of every occurrence to plan; the first occurrence's
+        # delivery came with the schedule row, later ones (a catch-up) are looked up below
+        slots = []
+        later = []
+        for schedule, group, delivery_id in rows:
+            fire_at = schedule.next_run_at
+            if delivery_id is None and fire_at >= cutoff:
+                slots.append((schedule, group, fire_at))
+            tz = group_tz(group)
+            while schedule.is_recurring:
+                # Occurrences older than the grace window expire unplanned, so the steps skip to its start
+                after = max(fire_at, cutoff - timedelta(microseconds=1))
+                fire_at = next_run_utc(schedule, pytz.utc.localize(after), tz)
+                if fire_at is None or fire_at > horizon:
+                    break
+                later.append((schedule, group, fire_at))
+            schedule.next_run_at = fire_at if schedule.is_recurring else None
+            self.index.add(schedule.id, schedule.next_run_at, group.id)
+
+        if later:
+            planned = set((await session.execute(
+                select(Delivery.schedule_id, Delivery.fire_at).where(
+                    Delivery.schedule_id.in_({schedule.id for schedule, _, _ in later}),
+                    Delivery.fire_at >= min(fire_at for _, _, fire_at in later)
+                )
+            )).all())
+            slots += [slot for slot in later if (slot[0].id, slot[2]) not in planned]
+            slots.sort(key=lambda slot: (slot[2], slot[0].id))
+
+        # One keyset pick per rotating group; a second rotation slot of a group in the same tick picks again
+        picks = await pick_posts(session, {group.id: group for schedule, group, _ in slots if not schedule.post_id}.values())
+
+        added = 0
+        for schedule, group, fire_at in slots:
+            post_id = schedule.post_id
+            if not post_id:
+                if group.id in picks:
+                    post_id = picks.pop(group.id)
+                else:
+                    post_id = (await pick_posts(session, [group])).get(group.id)
+                if not post_id:
+                    continue
+
+            session.add(Delivery(
+                schedule_id=schedule.id,
+                group_id=group.id,
+                post_id=post_id,
+                fire_date=pytz.utc.localize(fire_at).astimezone(group_tz(group)).date(),
+                fire_at=fire_at,
+                status='pending',
+                attempts=0,
+                next_attempt_at=fire_at
+            ))
+            added += 1
+        return added
+
+    async def claim(
+        self, session: AsyncSession, now: datetime, horizon: Optional[datetime] = None
+    ) -> List[Tuple[Delivery, Group, Optional[Post], int]]:
+        """
+        Leases the deliveries due by `horizon` (default: `now`) to this replica and returns them
+        with their group, post and the schedule's is_recurring. Due means pending with its
+        attempt time come, or 'sending' with an expired lease (the replica sending it died).
+        Rows another replica is claiming are skipped, and the lease is committed before
+        anything is sent.
+        """
+        horizon = horizon or now
+        ids_stmt = (
+            select(Delivery.id)
+            # Deliveries of a deleted schedule are left alone, as in the rows query below
+            .join(ScheduleTimes, ScheduleTimes.id == Delivery.schedule_id)
+            .where(
+                or_(
+                    and_(Delivery.status == 'pending', Delivery.next_attempt_at <= horizon),
+                    and_(Delivery.status == 'sending', Delivery.lease_until <= now)
+                ),
+                self._shard_filter(Delivery.group_id)
+            )
+            .order_by(Delivery.fire_at, Delivery.id)
+            .limit(self.claim_batch)
+            .with_for_update(skip_locked=True, of=Delivery)
+        )
+        ids = (await session.execute(ids_stmt)).scalars().all()
+        if not ids:
+            await session.commit()
+            return []
+        await session.execute(
+            update(Delivery)
+            .where(Delivery.id.in_(ids))
+            .values(status='sending', claimed_by=self.replica_id, lease_until=horizon + timedelta(seconds=self.lease_seconds))
+        )
+        await session.commit()
+
+        stmt = (
+            select(Delivery, Group, Post, ScheduleTimes.is_recurring)
+            .join(Group, Group.id == Delivery.group_id)
+            .join(ScheduleTimes, ScheduleTimes.id == Delivery.schedule_id)
+            .outerjoin(Post, Post.id == Delivery.post_id)
+            .where(Delivery.id.in_(ids))
+            .order_by(Delivery.fire_at, Delivery.id)
+        )
+        return (await session.execute(stmt)).all()
+
+    def mark_sent(self, delivery: Delivery, now: datetime):
+        delivery.status = 'sent'
+        delivery.attempts = (delivery.attempts or 0) + 1
+        delivery.sent_at = now
+        delivery.lateness_ms = int((now - delivery.fire_at).total_seconds() * 1000)
+        delivery.last_error = None
+        delivery.lease_until = None
+
+    def mark_failed(self, delivery: Delivery, now: datetime, error: Optional[str]):
+        delivery.attempts = (delivery.attempts or 0) + 1
+        delivery.last_error = error
+        delivery.lease_until = None
+        if delivery.attempts >= self.max_attempts:
+            delivery.status = 'failed'
+            logger.warning("Delivery %s of schedule %s failed after %s attempts: %s", delivery.id, delivery.schedule_id, delivery.attempts, error)
+            return
+        delivery.status = 'pending'
+        delivery.next_attempt_at = now + timedelta(seconds=self.backoff * 2 ** (delivery.attempts - 1))
+
+    async def cancel_schedule(self, session: AsyncSession, schedule_id: int) -> int:
+        """Expires the unsent deliveries of a schedule the admin deletes."""
+        res = await session.execute(
+            update(Delivery)
+            .where(Delivery.schedule_id == schedule_id, Delivery.status.in_(['pending', 'sending']))
+            .values(status='expired', lease_until=None)
+        )
+        return res.rowcount
+
+    async def expire_stale(self, session: AsyncSession, now: datetime) -> int:
+        """Pending deliveries older than the grace window are not sent any more."""
+        cutoff = now - timedelta(minutes=self.grace_minutes)
+        res = await session.execute(
+            update(Delivery)
+            .where(
+                or_(Delivery.status == 'pending', and_(Delivery.status == 'sending', Delivery.lease_until < now)),
+                Delivery.fire_at < cutoff
+            )
+            .values(status='expired')
+        )
+        return res.rowcount
+
+    async def load_next_retry(self, session: AsyncSession):
+        wake_at = case((Delivery.status == 'pending', Delivery.next_attempt_at), else_=Delivery.lease_until)
+        res = await session.execute(
+            select(func.min(wake_at))
+            .join(ScheduleTimes, ScheduleTimes.id == Delivery.schedule_id)
+            .where(Delivery.status.in_(['pending', 'sending']), self._shard_filter(Delivery.group_id))
+        )
+        self.next_retry_at = res.scalar()
+
+    async def stats(self, session: AsyncSession, since: datetime) -> Dict[str, float]:
+        """Deliveries fired since `since` by status, and the lateness of the sent ones in seconds."""
+        res = await session.execute(
+            select(Delivery.status, func.count()).where(Delivery.fire_at >= since).group_by(Delivery.status)
+        )
+        stats: Dict[str, float] = {status: count for status, count in res.all()}
+        res = await session.execute(
+            select(Delivery.lateness_ms).where(Delivery.fire_at >= since, Delivery.lateness_ms.is_not(None))
+        )
+        lateness = sorted(ms / 1000 for ms in res.scalars().all())
+
+        def percentile(p: float) -> float:
+            if not lateness:
+                return 0.0
+            return lateness[min(len(lateness) - 1, int(p * len(lateness)))]
+
+        stats.update({
+            "lateness_p50": percentile(0.50),
+            "lateness_p99": percentile(0.99),
+            "lateness_max": lateness[-1] if lateness else 0.0,
+        })
+        return stats
+
+    async def prune(self, session: AsyncSession, now: datetime) -> int:
+        cutoff = now - timedelta(days=self.retention_days)
+        res = await session.execute(
+            delete(Delivery).where(Delivery.status != 'pending', Delivery.fire_at < cutoff)
+        )
+        return res.rowcount
+
+
+outbox = Outbox()
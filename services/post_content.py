@@ -0,0 +1,95 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from aiogram.types import Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import PostItem
+
+# Single-file content types, in the order they are checked
+MEDIA_TYPES = ("photo", "video", "animation", "document", "audio", "voice")
+# Types Telegram accepts inside a media group
+ALBUM_ITEM_TYPES = ("photo", "video", "document", "audio")
+# Seconds to wait for the rest of an album after its first message
+ALBUM_COLLECT_DELAY = 1.0
+
+
+def _entities_json(entities) -> Optional[str]:
+    if not entities:
+        return None
+    return json.dumps([e.model_dump(mode='json') for e in entities])
+
+
+def message_content(message: Message) -> Optional[dict]:
+    """Post fields of a single message, or None for content that cannot be posted."""
+    if message.text:
+        return {
+            "content_type": "text", "text": message.text, "file_id": None,
+            "caption": None, "entities": _entities_json(message.entities),
+        }
+    for content_type in MEDIA_TYPES:
+        media = getattr(message, content_type)
+        if media:
+            # Photos come in several sizes, the last is the best quality
+            file_id = media[-1].file_id if content_type == "photo" else media.file_id
+            return {
+                "content_type": content_type, "text": None, "file_id": file_id,
+                "caption": message.caption, "entities": _entities_json(message.caption_entities),
+            }
+    return None
+
+
+def album_items(messages: Iterable[Message]) -> List[PostItem]:
+    """PostItems of an album's messages; messages of other types are left out."""
+    items = []
+    for message in messages:
+        content = message_content(message)
+        if content is None or content["content_type"] not in ALBUM_ITEM_TYPES:
+            continue
+        items.append(PostItem(
+            position=len(items),
+            content_type=content["content_type"],
+            file_id=content["file_id"],
+            caption=content["caption"],
+            entities=content["entities"]
+        ))
+    return items
+
+
+async def load_post_items(session: AsyncSession, post_ids: Iterable[int]) -> Dict[int, List[PostItem]]:
+    """Album items of several posts in one query."""
+    post_ids = list(post_ids)
+    items: Dict[int, List[PostItem]] = defaultdict(list)
+    if not post_ids:
+        return items
+    res = await session.execute(
+        select(PostItem).where(PostItem.post_id.in_(post_ids)).order_by(PostItem.post_id, PostItem.position)
+    )
+    for item in res.scalars().all():
+        items[item.post_id].append(item)
+    return items
+
+
+class AlbumCollector:
+    """
+    Telegram delivers an album as separate messages sharing a media_group_id. The handler
+    call of the first message waits ALBUM_COLLECT_DELAY for the others and gets them all;
+    the calls of the later messages only add theirs and get None.
+    """
+
+    def __init__(self, delay: float = ALBUM_COLLECT_DELAY):
+        self.delay = delay
+        self._albums: Dict[str, List[Message]] = {}
+
+    async def collect(self, message: Message) -> Optional[List[Message]]:
+        key = message.media_group_id
+        if key in self._albums:
+            self._albums[key].append(message)
+            return None
+        self._albums[key] = [message]
+        await asyncio.sleep(self.delay)
+        return sorted(self._albums.pop(key), key=lambda m: m.message_id)
+
+
+album_collector = AlbumCollector()
@@ -0,0 +1,112 @@
+import json
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from aiogram.methods import (
+    SendAnimation, SendAudio, SendDocument, SendMediaGroup, SendMessage, SendPhoto, SendVideo, SendVoice, TelegramMethod
+)
+from aiogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, MessageEntity
+from config import POST_PAYLOAD_CACHE_SIZE
+from database.models import Post, PostItem
+
+logger = logging.getLogger(__name__)
+
+
+def parse_entities(post) -> Optional[List[MessageEntity]]:
+    """Entities of a Post or PostItem."""
+    if not post.entities:
+        return None
+    try:
+        return [MessageEntity(**e) for e in json.loads(post.entities)]
+    except Exception as e:
+        logger.warning("Error parsing entities of post %s: %s", post.id, e)
+        return None
+
+
+# Single-file types: method and the name of its file argument
+MEDIA_METHODS = {
+    'photo': (SendPhoto, 'photo'),
+    'video': (SendVideo, 'video'),
+    'animation': (SendAnimation, 'animation'),
+    'document': (SendDocument, 'document'),
+    'audio': (SendAudio, 'audio'),
+    'voice': (SendVoice, 'voice'),
+}
+ALBUM_MEDIA = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'audio': InputMediaAudio,
+}
+
+
+def build_method(post: Post, chat_id: int, items: Optional[Sequence[PostItem]] = None) -> Optional[TelegramMethod]:
+    """
+    The validated Bot API call that publishes `post` to `chat_id`; None for unsupported
+    content types. An album is one sendMediaGroup call over its `items`.
+    """
+    if post.content_type == 'album':
+        media = [
+            ALBUM_MEDIA[item.content_type](media=item.file_id, caption=item.caption, caption_entities=parse_entities(item))
+            for item in items or ()
+            if item.content_type in ALBUM_MEDIA
+        ]
+        if not media:
+            return None
+        return SendMediaGroup(chat_id=chat_id, media=media)
+
+    entities = parse_entities(post)
+    if post.content_type == 'text':
+        return SendMessage(chat_id=chat_id, text=post.text, entities=entities)
+    if post.content_type in MEDIA_METHODS:
+        method, file_argument = MEDIA_METHODS[post.content_type]
+        return method(chat_id=chat_id, caption=post.caption, caption_entities=entities, **{file_argument: post.file_id})
+    return None
+
+
+class PostPayloadCache:
+    """
+    LRU of ready-to-send Bot API method objects keyed by post id and checked against the
+    post's content version and target chat, so a recurring post is decoded and validated
+    once. Method objects are only read when a request is built, so one instance is reused
+    for every send. Edits bump Post.version, which also invalidates entries in other
+    processes; the admin handlers drop local entries right away.
+    """
+
+    def __init__(self, max_size: int = POST_PAYLOAD_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[int, int, Optional[TelegramMethod]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cached(self, post: Post, chat_id: int) -> bool:
+        entry = self._entries.get(post.id)
+        return entry is not None and entry[0] == (post.version or 1) and entry[1] == chat_id
+
+    def get(self, post: Post, chat_id: int, items: Optional[Sequence[PostItem]] = None) -> Optional[TelegramMethod]:
+        """Album posts need their `items` when the payload is not cached yet (see cached())."""
+        if self.cached(post, chat_id):
+            self._entries.move_to_end(post.id)
+            self.hits += 1
+            return self._entries[post.id][2]
+
+        self.misses += 1
+        method = build_method(post, chat_id, items)
+        version = post.version or 1
+        self._entries[post.id] = (version, chat_id, method)
+        self._entries.move_to_end(post.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return method
+
+    def invalidate(self, post_id: int):
+        self._entries.pop(post_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+post_payloads = PostPayloadCache()
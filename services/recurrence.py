@@ -0,0 +1,176 @@
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Set
+import pytz
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import DEFAULT_TIMEZONE
+from database.models import Delivery, Group, ScheduleTimes
+
+# Timezone of groups that have not set their own
+TZ = pytz.timezone(DEFAULT_TIMEZONE)
+
+WEEKDAY_NAMES = {
+    "du": 0, "se": 1, "ch": 2, "pa": 3, "ju": 4, "sh": 5, "ya": 6,
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+WEEKDAY_LABELS = ["Du", "Se", "Ch", "Pa", "Ju", "Sh", "Ya"]
+
+_HOURS_RE = re.compile(r"^(\d{1,2})(h|soat)$")
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def minute_of_day(time_str: Optional[str]) -> Optional[int]:
+    """'HH:MM' -> 0..1439, or None for malformed times (those never fire)."""
+    try:
+        hours, minutes = (int(part) for part in (time_str or "").split(":"))
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def group_tz(group: Optional[Group]):
+    """A group's timezone; unset or unknown names fall back to the default."""
+    name = getattr(group, "timezone", None)
+    if name:
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            pass
+    return TZ
+
+
+def localize(tz, moment: datetime) -> datetime:
+    """
+    Wall-clock time in `tz`. A time skipped by a DST jump moves forward by the jump;
+    an ambiguous one resolves to its later (standard time) instant.
+    """
+    return tz.normalize(tz.localize(moment, is_dst=False))
+
+
+def parse_weekdays(value: Optional[str]) -> Optional[Set[int]]:
+    """Stored form '0,2,4' (Monday is 0); None means every day."""
+    if not value:
+        return None
+    return {int(v) for v in value.split(",") if v != ""}
+
+
+def day_minutes(schedule: ScheduleTimes) -> List[int]:
+    """Minutes of the day a schedule fires on an active day: the anchor time, then every N hours until midnight."""
+    anchor = minute_of_day(schedule.time)
+    if anchor is None:
+        return []
+    if schedule.every_hours:
+        return list(range(anchor, 24 * 60, schedule.every_hours * 60))
+    return [anchor]
+
+
+def next_run(schedule: ScheduleTimes, after: datetime, tz=TZ) -> Optional[datetime]:
+    """
+    First fire time of the schedule strictly after `after`, as an aware datetime in `tz`
+    (the group's timezone; the rule is wall-clock time there), or None when the rule has
+    no runs left.
+    """
+    minutes = day_minutes(schedule)
+    if not minutes:
+        return None
+    weekdays = parse_weekdays(schedule.weekdays)
+    local = after.astimezone(tz)
+
+    day = local.date()
+    if schedule.start_date and schedule.start_date > day:
+        day = schedule.start_date
+    # Any weekday set repeats within a week
+    for _ in range(8):
+        if schedule.end_date and day > schedule.end_date:
+            return None
+        if weekdays is None or day.weekday() in weekdays:
+            for minute in minutes:
+                candidate = localize(tz, datetime.combine(day, time(minute // 60, minute % 60)))
+                if candidate > local:
+                    return candidate
+        day += timedelta(days=1)
+    return None
+
+
+def next_run_utc(schedule: ScheduleTimes, after: datetime, tz=TZ) -> Optional[datetime]:
+    """next_run as naive UTC, the form next_run_at is stored in."""
+    moment = next_run(schedule, after, tz)
+    if moment is None:
+        return None
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_rule(text: str) -> dict:
+    """
+    Owner-facing rule syntax, tokens separated by spaces:
+      du,ch,ju (or mon,wed,fri)  - only on these weekdays
+      3h (or 3soat)              - every 3 hours from the given time until midnight
+      2025-05-01                 - once, on that date
+      2025-05-01 2025-06-01      - only between these dates (inclusive)
+    Returns the ScheduleTimes fields; raises ValueError on anything else.
+    """
+    rule = {"weekdays": None, "every_hours": None, "start_date": None, "end_date": None, "is_recurring": 1}
+    dates: List[date] = []
+    for token in text.lower().split():
+        hours = _HOURS_RE.match(token)
+        if hours:
+            every = int(hours.group(1))
+            if not 1 <= every <= 23:
+                raise ValueError(f"Soat oralig'i 1..23 bo'lishi kerak: {token}")
+            rule["every_hours"] = every
+        elif _DATE_RE.match(token):
+            dates.append(date.fromisoformat(token))
+        else:
+            days = set()
+            for name in token.split(","):
+                if name not in WEEKDAY_NAMES:
+                    raise ValueError(f"Tushunarsiz qiymat: {token}")
+                days.add(WEEKDAY_NAMES[name])
+            rule["weekdays"] = ",".join(str(d) for d in sorted(days))
+
+    if len(dates) == 1:
+        rule["start_date"] = rule["end_date"] = dates[0]
+        rule["is_recurring"] = 0 if not rule["every_hours"] else 1
+    elif len(dates) == 2:
+        rule["start_date"], rule["end_date"] = sorted(dates)
+    elif len(dates) > 2:
+        raise ValueError("Ko'pi bilan ikkita sana kiriting.")
+    return rule
+
+
+def describe(schedule: ScheduleTimes) -> str:
+    parts = [schedule.time or "?"]
+    weekdays = parse_weekdays(schedule.weekdays)
+    if weekdays is not None:
+        parts.append("/".join(WEEKDAY_LABELS[d] for d in sorted(weekdays)))
+    if schedule.every_hours:
+        parts.append(f"har {schedule.every_hours} soatda")
+    if schedule.start_date and schedule.start_date == schedule.end_date:
+        parts.append(str(schedule.start_date))
+    elif schedule.start_date or schedule.end_date:
+        parts.append(f"{schedule.start_date or '...'} — {schedule.end_date or '...'}")
+    parts.append("doimiy" if schedule.is_recurring else "bir martalik")
+    return ", ".join(parts)
+
+
+async def backfill_next_run_at(session: AsyncSession, now: datetime) -> int:
+    """
+    Fills next_run_at for schedules created before the column existed. One-time schedules
+    that already have a delivery were fired and keep their NULL.
+    """
+    stmt = (
+        select(ScheduleTimes, Group)
+        .join(Group, Group.id == ScheduleTimes.group_id)
+        .where(
+            ScheduleTimes.next_run_at.is_(None),
+            ~exists().where(Delivery.schedule_id == ScheduleTimes.id)
+        )
+    )
+    rows = (await session.execute(stmt)).all()
+    for schedule, group in rows:
+        schedule.next_run_at = next_run_utc(schedule, now, group_tz(group))
+    await session.commit()
+    return len(rows)
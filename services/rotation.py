@@ -0,0 +1,200 @@
+import random
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import case, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from database.models import Group, Post
+
+ROTATION_MODES = {
+    "sequential": "Ketma-ket",
+    "weighted": "Vazn bo'yicha",
+    "shuffle": "Aralash (takrorlanmasdan)",
+}
+
+PickedPost = Tuple[Optional[int], Optional[float]]
+
+
+def _next_by_id(candidate):
+    """Sequential: the lowest post id after the cursor."""
+    return (
+        select(candidate.id)
+        .where(candidate.group_id == Group.id, candidate.id > func.coalesce(Group.rotation_cursor, 0))
+        .order_by(candidate.id)
+        .limit(1)
+        .correlate(Group)
+        .scalar_subquery()
+    )
+
+
+def _first_by_id(candidate):
+    """Sequential wrap-around: the lowest post id."""
+    return (
+        select(candidate.id)
+        .where(candidate.group_id == Group.id)
+        .order_by(candidate.id)
+        .limit(1)
+        .correlate(Group)
+        .scalar_subquery()
+    )
+
+
+def _next_shuffled(candidate):
+    """Shuffle: the next post of the current cycle's order, NULL once the cycle is through."""
+    after_cursor = tuple_(candidate.shuffle_key, candidate.id) > tuple_(Group.rotation_cursor_key, Group.rotation_cursor)
+    return (
+        select(candidate.id)
+        .where(candidate.group_id == Group.id, or_(Group.rotation_cursor_key.is_(None), after_cursor))
+        .order_by(candidate.shuffle_key, candidate.id)
+        .limit(1)
+        .correlate(Group)
+        .scalar_subquery()
+    )
+
+
+def _weighted(candidate, points: Dict[int, int]):
+    """Weighted: the post whose [weight_offset, weight_offset + weight) range holds the group's random point."""
+    return (
+        select(candidate.id)
+        .where(candidate.group_id == Group.id, candidate.weight_offset <= case(points, value=Group.id))
+        .order_by(candidate.weight_offset.desc())
+        .limit(1)
+        .correlate(Group)
+        .scalar_subquery()
+    )
+
+
+async def _new_cycle(session: AsyncSession, group: Group) -> PickedPost:
+    """Reshuffles the group's posts and returns the first of the new order."""
+    await session.execute(
+        update(Post)
+        .where(Post.group_id == group.id)
+        .values(shuffle_key=func.random())
+        .execution_options(synchronize_session=False)
+    )
+    rows = (await session.execute(
+        select(Post.id, Post.shuffle_key).where(Post.group_id == group.id).order_by(Post.shuffle_key, Post.id).limit(2)
+    )).all()
+    if not rows:
+        return None, None
+    if len(rows) > 1 and rows[0][0] == group.rotation_cursor:
+        # The last post of the old cycle does not open the new one: it moves to the end
+        top = (await session.execute(select(func.max(Post.shuffle_key)).where(Post.group_id == group.id))).scalar()
+        await session.execute(
+            update(Post).where(Post.id == rows[0][0]).values(shuffle_key=top + 1).execution_options(synchronize_session=False)
+        )
+        return tuple(rows[1])
+    return tuple(rows[0])
+
+
+async def pick_posts(session: AsyncSession, groups: Iterable[Group], rng: random.Random = random) -> Dict[int, int]:
+    """
+    Picks the next rotation post of each group and advances the groups' cursors.
+    One query for all groups, each an index seek whatever the size of the library;
+    a shuffle cycle that ran out is reshuffled first (once per cycle). Groups without
+    posts are left out of the result.
+    """
+    groups = list(groups)
+    if not groups:
+        return {}
+    # Cursors advanced by an earlier pick of this transaction must reach the query (no autoflush)
+    await session.flush()
+
+    # Weighted groups get their random point here; without weights they rotate sequentially
+    points = {
+        group.id: rng.randrange(group.rotation_weight_total)
+        for group in groups
+        if group.rotation_mode == 'weighted' and group.rotation_weight_total
+    }
+    candidate = aliased(Post)
+    whens = [(Group.rotation_mode == 'shuffle', _next_shuffled(candidate))]
+    if points:
+        whens.insert(0, (Group.id.in_(list(points)), _weighted(candidate, points)))
+    pick = case(*whens, else_=func.coalesce(_next_by_id(candidate), _first_by_id(candidate)))
+
+    picked = select(Group.id.label("group_id"), pick.label("post_id")).where(Group.id.in_([group.id for group in groups])).subquery()
+    stmt = (
+        select(picked.c.group_id, Post.id, Post.shuffle_key)
+        .select_from(picked)
+        .outerjoin(Post, Post.id == picked.c.post_id)
+    )
+    found = {group_id: (post_id, key) for group_id, post_id, key in (await session.execute(stmt)).all()}
+
+    picks = {}
+    for group in groups:
+        post_id, key = found.get(group.id, (None, None))
+        if post_id is None and group.rotation_mode == 'shuffle':
+            post_id, key = await _new_cycle(session, group)
+        if post_id is None:
+            continue
+        group.rotation_cursor = post_id
+        group.rotation_cursor_key = key
+        picks[group.id] = post_id
+    return picks
+
+
+def _set_weight_total(session: AsyncSession, group_id: int, total: int):
+    """Mirrors a weight total written with a bulk UPDATE on the group loaded in this session, if any."""
+    group = session.identity_map.get(identity_key(Group, group_id))
+    if group is not None:
+        set_committed_value(group, "rotation_weight_total", total)
+
+
+async def append_post(session: AsyncSession, post: Post):
+    """Places a new post at the end of its group's weight ranges and somewhere in the shuffle cycle."""
+    weight = post.weight or 1
+    res = await session.execute(
+        update(Group)
+        .where(Group.id == post.group_id)
+        .values(rotation_weight_total=func.coalesce(Group.rotation_weight_total, 0) + weight)
+        .returning(Group.rotation_weight_total)
+        .execution_options(synchronize_session=False)
+    )
+    total = res.scalar()
+    _set_weight_total(session, post.group_id, total)
+    post.weight = weight
+    post.weight_offset = total - weight
+    post.shuffle_key = random.random()
+
+
+async def rebuild_weights(session: AsyncSession, group_id: int):
+    """Recomputes the weight ranges of a group after a post was deleted or reweighted."""
+    # The app's sessions do not autoflush: the deletion or new weight must reach the SELECT
+    await session.flush()
+    rows = (await session.execute(
+        select(Post.id, Post.weight).where(Post.group_id == group_id).order_by(Post.id)
+    )).all()
+    offset = 0
+    params = []
+    for post_id, weight in rows:
+        params.append({"id": post_id, "weight_offset": offset})
+        offset += weight or 1
+    if params:
+        await session.execute(update(Post), params)
+    await session.execute(
+        update(Group).where(Group.id == group_id).values(rotation_weight_total=offset).execution_options(synchronize_session=False)
+    )
+    _set_weight_total(session, group_id, offset)
+
+
+async def backfill_rotation(session: AsyncSession) -> int:
+    """
+    Sets up groups created before rotation cursors: weight ranges, shuffle keys, and a cursor
+    that continues the old next_post_index position.
+    """
+    groups = (await session.execute(select(Group).where(Group.rotation_weight_total.is_(None)))).scalars().all()
+    for group in groups:
+        await rebuild_weights(session, group.id)
+        await session.execute(
+            update(Post)
+            .where(Post.group_id == group.id, Post.shuffle_key.is_(None))
+            .values(shuffle_key=func.random())
+            .execution_options(synchronize_session=False)
+        )
+        if group.rotation_cursor is None and group.next_post_index:
+            ids = (await session.execute(select(Post.id).where(Post.group_id == group.id).order_by(Post.id))).scalars().all()
+            if group.next_post_index <= len(ids):
+                group.rotation_cursor = ids[group.next_post_index - 1]
+    await session.commit()
+    return len(groups)
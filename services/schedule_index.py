@@ -0,0 +1,108 @@
+import asyncio
+import heapq
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import ScheduleTimes
+
+
+class ScheduleIndex:
+    """
+    In-memory min-heap of schedule ids ordered by next_run_at (naive UTC).
+    Loaded once at startup and kept current by the admin handlers that write schedules
+    and by the scheduler as it advances fired schedules. The scheduler sleeps until the
+    top of the heap is due; adding a schedule wakes it to look again.
+
+    With sharded dispatch (SCHEDULER_SHARDS) a worker's index holds only its shard of
+    groups, and the main process's index forwards every change to its listeners.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._next_by_id: Dict[int, datetime] = {}
+        self.loaded = False
+        self._changed: Optional[asyncio.Event] = None
+        # (index, count): only groups with id % count == index are loaded
+        self.shard: Optional[Tuple[int, int]] = None
+        self._listeners: List[Callable[..., None]] = []
+
+    def __len__(self) -> int:
+        return len(self._next_by_id)
+
+    def subscribe(self, listener: Callable[..., None]):
+        """listener("add", schedule_id, next_run_at, group_id) / listener("remove", schedule_id) on every change."""
+        self._listeners.append(listener)
+
+    def add(self, schedule_id: int, next_run_at: Optional[datetime], group_id: Optional[int] = None):
+        """(Re)places a schedule; None (no runs left) removes it. group_id routes the change to its shard."""
+        for listener in self._listeners:
+            listener("add", schedule_id, next_run_at, group_id)
+        if next_run_at is None:
+            self._remove(schedule_id)
+            return
+        self._next_by_id[schedule_id] = next_run_at
+        # The previous entry stays in the heap and is skipped as stale
+        heapq.heappush(self._heap, (next_run_at, schedule_id))
+        if self._changed is not None:
+            self._changed.set()
+
+    def remove(self, schedule_id: int):
+        for listener in self._listeners:
+            listener("remove", schedule_id)
+        self._remove(schedule_id)
+
+    def _remove(self, schedule_id: int):
+        self._next_by_id.pop(schedule_id, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            moment, schedule_id = self._heap[0]
+            if self._next_by_id.get(schedule_id) == moment:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[datetime]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def due(self, now: datetime) -> Set[int]:
+        """Ids whose next run is at or before `now`. They stay indexed until re-added with their next run."""
+        due = set()
+        popped = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[1] not in due:
+                due.add(entry[1])
+                popped.append(entry)
+            self._drop_stale()
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return due
+
+    async def wait(self, timeout: Optional[float]):
+        """Sleeps up to `timeout` seconds (None: until woken), returning early when a schedule is added."""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def load(self, session: AsyncSession):
+        self._heap = []
+        self._next_by_id = {}
+        stmt = select(ScheduleTimes.id, ScheduleTimes.next_run_at).where(ScheduleTimes.next_run_at.is_not(None))
+        if self.shard is not None:
+            stmt = stmt.where(ScheduleTimes.group_id % self.shard[1] == self.shard[0])
+        res = await session.execute(stmt)
+        for schedule_id, next_run_at in res.all():
+            self._next_by_id[schedule_id] = next_run_at
+            self._heap.append((next_run_at, schedule_id))
+        heapq.heapify(self._heap)
+        self.loaded = True
+
+
+schedule_index = ScheduleIndex()
@@ -1,113 +1,240 @@
 import asyncio
 import random
-import json
-from datetime import datetime
-import pytz
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
-from sqlalchemy import select
+from aiogram.methods import TelegramMethod
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import SCHEDULER_MAX_SLEEP, SCHEDULER_PRESTAGE_SECONDS, SCHEDULER_RESYNC_SECONDS, SCHEDULER_SHARDS
 from database.engine import AsyncSessionLocal
-from database.models import ScheduleTimes, Group, Post
+from database.models import Delivery, ScheduleTimes
+from services.schedule_index import schedule_index
+from services.dispatch import SendJob, dispatcher
+from services.outbox import outbox, to_utc, utcnow
+from services.shards import ShardSupervisor
+from services.post_payloads import post_payloads
+from services.post_content import load_post_items
 
-scheduler = AsyncIOScheduler(timezone="Asia/Tashkent")
+# Housekeeping jobs only; posts are driven by run_scheduler
+scheduler = AsyncIOScheduler(timezone="UTC")
+# A tick and the startup catch-up must not plan the same occurrence concurrently
+_tick_lock = asyncio.Lock()
+_loop_task: Optional[asyncio.Task] = None
+_supervisor: Optional[ShardSupervisor] = None
+# Pause after a failed tick (e.g. the database is down) before trying again
+SCHEDULER_ERROR_DELAY = 5
+SCHEDULER_MIN_SLEEP = 1.0
 
-async def check_scheduled_posts(bot: Bot):
+async def send_prepared(bot: Bot, chat_id: int, method: Optional[TelegramMethod]):
+    # Unsupported content types have no method and are skipped
+    if method is not None:
+        await bot(method)
+
+async def deliver_pending(
+    bot: Bot,
+    session: AsyncSession,
+    now_utc: datetime,
+    horizon: Optional[datetime] = None,
+    started: Optional[float] = None
+):
     """
-    Checks if there are any posts scheduled for the current minute.
+    Sends the pending deliveries due by `horizon` (default: `now_utc`) and records the
+    outcome in the outbox. Deliveries claimed ahead of their time are prepared right away
+    and released when their attempt time comes, so the send itself is a queue flush.
+    Fired one-time schedules are deleted in the same transaction.
+
+    `started` is the dispatcher clock read together with `now_utc`; wall-clock times
+    below are now_utc plus the time since then, planning included.
     """
-    tz = pytz.timezone("Asia/Tashkent")
-    now_time = datetime.now(tz).strftime("%H:%M")
-    
-    async with AsyncSessionLocal() as session:
-        # Find all groups that have a schedule at this time
-        stmt = select(ScheduleTimes).where(ScheduleTimes.time == now_time)
-        result = await session.execute(stmt)
-        schedules = result.scalars().all()
-        
-        for schedule in schedules:
-            group_stmt = select(Group).where(Group.id == schedule.group_id)
-            group_res = await session.execute(group_stmt)
-            group = group_res.scalars().first()
-            
-            if not group:
-                continue
-                
-            post_to_send = None
-
-            if schedule.post_id:
-                # Specific post
-                post_stmt = select(Post).where(Post.id == schedule.post_id)
-                post_res = await session.execute(post_stmt)
-                post_to_send = post_res.scalars().first()
+    if started is None:
+        started = dispatcher.clock()
+    claimed = await outbox.claim(session, now_utc, horizon)
+    # Album items are read only for payloads that are not prepared yet
+    album_ids = {
+        post.id for _, group, post, _ in claimed
+        if post is not None and post.content_type == 'album' and not post_payloads.cached(post, group.telegram_id)
+    }
+    album_items = await load_post_items(session, album_ids)
+    batches: Dict[datetime, List[Tuple[SendJob, Delivery, int]]] = defaultdict(list)
+    for delivery, group, post, is_recurring in claimed:
+        if post is None:
+            # Deleted since it was planned; nothing to retry
+            delivery.status = 'failed'
+            delivery.last_error = "post deleted"
+            continue
+        # Prepared once per post version
+        method = post_payloads.get(post, group.telegram_id, album_items.get(post.id))
+        job = SendJob(chat_id=group.telegram_id, payload=method, title=group.title, schedule_id=delivery.schedule_id)
+        batches[max(delivery.next_attempt_at, now_utc)].append((job, delivery, is_recurring))
+
+    sent_once: List[int] = []
+    for release_at in sorted(batches):
+        batch = batches[release_at]
+        delay = (release_at - now_utc).total_seconds() - (dispatcher.clock() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # Concurrent, rate-limited fan-out; RetryAfter re-queues only the affected chat
+        report = await dispatcher.run(bot, [job for job, _, _ in batch], send_prepared)
+        done_at = now_utc + timedelta(seconds=report.finished_at - started)
+        for job, delivery, is_recurring in batch:
+            if job.sent:
+                outbox.mark_sent(delivery, now_utc + timedelta(seconds=job.sent_at - started))
+                if is_recurring == 0:
+                    sent_once.append(delivery.schedule_id)
             else:
-                # Random/Sequential Rotation
-                posts_stmt = select(Post).where(Post.group_id == group.id)
-                posts_res = await session.execute(posts_stmt)
-                posts = posts_res.scalars().all()
-                
-                if posts:
-                    current_index = group.next_post_index
-                    if current_index >= len(posts):
-                        current_index = 0
-                    
-                    post_to_send = posts[current_index]
-                    
-                    # Update next index
-                    group.next_post_index = (current_index + 1) % len(posts)
-                    session.add(group)
-                    await session.commit()
-            
-            if not post_to_send:
-                continue
-
-            # Load entities
-            entities = None
-            if post_to_send.entities:
-                try:
-                    entities = json.loads(post_to_send.entities)
-                    # Aiogram 3 expects list of objects or similar?
-                    # send_message(entities=...) expects list of MessageEntity
-                    # We need to re-hydrate them into types.MessageEntity if aiogram strictness requires it.
-                    # Actually json dicts usually work if pydantic validates, but usually passing list of dicts can work or fail.
-                    # Best to re-instantiate.
-                    from aiogram.types import MessageEntity
-                    entities = [MessageEntity(**e) for e in entities]
-                except Exception as e:
-                    print(f"Error parsing entities: {e}")
-                    entities = None
-
-            try:
-                if post_to_send.content_type == 'text':
-                    await bot.send_message(
-                        chat_id=group.telegram_id,
-                        text=post_to_send.text,
-                        entities=entities
-                    )
-                elif post_to_send.content_type == 'photo':
-                    await bot.send_photo(
-                        chat_id=group.telegram_id,
-                        photo=post_to_send.file_id,
-                        caption=post_to_send.caption,
-                        caption_entities=entities
-                    )
-                elif post_to_send.content_type == 'video':
-                    await bot.send_video(
-                        chat_id=group.telegram_id,
-                        video=post_to_send.file_id,
-                        caption=post_to_send.caption,
-                        caption_entities=entities
-                    )
-                # Add more types as needed
-                
-                # If not recurring, delete schedule
-                if schedule.is_recurring == 0:
-                   await session.delete(schedule)
-                   await session.commit()
-                   print(f"One-time schedule for group {group.title} deleted.")
-
-            except Exception as e:
-                print(f"Failed to send scheduled post to {group.title}: {e}")
+                outbox.mark_failed(delivery, done_at, job.error)
+        lateness = [delivery.lateness_ms for job, delivery, _ in batch if job.sent]
+        print(f"Scheduled posts: {report.format()}, lateness max {max(lateness, default=0)}ms")
+
+    if sent_once:
+        await session.execute(delete(ScheduleTimes).where(ScheduleTimes.id.in_(sent_once)))
+        for schedule_id in sent_once:
+            schedule_index.remove(schedule_id)
+        print(f"{len(sent_once)} one-time schedules deleted.")
+
+    # Outbox updates, rotation indexes (dirty Group rows) and deletions in one transaction
+    await session.commit()
+    await outbox.load_next_retry(session)
+
+async def plan_due(session: AsyncSession, due_ids, now_utc: datetime, horizon: Optional[datetime] = None) -> int:
+    try:
+        planned = await outbox.plan(session, due_ids, now_utc, horizon)
+        await session.commit()
+        return planned
+    except IntegrityError:
+        # Another replica planned the same occurrence first; the outbox key kept it single
+        await session.rollback()
+        print("Due schedules were planned by another replica.")
+        return 0
+
+def _as_utc(now: Optional[datetime]) -> datetime:
+    """Naive UTC of `now` (default: the current time); a naive `now` is taken as UTC."""
+    if now is None:
+        return utcnow()
+    if now.tzinfo is None:
+        return now
+    return to_utc(now)
+
+async def check_scheduled_posts(bot: Bot, now: Optional[datetime] = None):
+    """
+    Plans the schedules whose next run comes within SCHEDULER_PRESTAGE_SECONDS into the
+    outbox, prepares them and sends whatever is pending at its exact time, including
+    retries of earlier failures.
+    """
+    now_utc = _as_utc(now)
+    started = dispatcher.clock()
+    horizon = now_utc + timedelta(seconds=SCHEDULER_PRESTAGE_SECONDS)
+
+    async with _tick_lock:
+        async with AsyncSessionLocal() as session:
+            if not schedule_index.loaded:
+                await schedule_index.load(session)
+
+            # Heap lookup: no query at all when nothing is due and no retry is waiting
+            due_ids = schedule_index.due(horizon)
+            if not due_ids and not outbox.retry_due(horizon):
+                return
+
+            if due_ids:
+                await plan_due(session, due_ids, now_utc, horizon)
+            await deliver_pending(bot, session, now_utc, horizon, started)
+
+async def catch_up_missed_posts(bot: Bot, now: Optional[datetime] = None):
+    """
+    Startup pass: plans every overdue schedule (occurrences older than
+    DELIVERY_GRACE_MINUTES are skipped, the outbox key skips the ones already
+    delivered), expires older pending deliveries and sends the rest.
+    """
+    now_utc = _as_utc(now)
+    started = dispatcher.clock()
+
+    async with _tick_lock:
+        async with AsyncSessionLocal() as session:
+            if not schedule_index.loaded:
+                await schedule_index.load(session)
+
+            expired = await outbox.expire_stale(session, now_utc)
+            await session.commit()
+            planned = await plan_due(session, schedule_index.due(now_utc), now_utc)
+            if planned or expired:
+                print(f"Catch-up: {planned} missed posts planned, {expired} stale deliveries expired.")
+
+            await deliver_pending(bot, session, now_utc, started=started)
+
+def seconds_until_next(now_utc: datetime) -> float:
+    """
+    Sleep until SCHEDULER_PRESTAGE_SECONDS before the next due schedule or retry, capped at
+    SCHEDULER_MAX_SLEEP. At least SCHEDULER_MIN_SLEEP: a row another replica holds locked
+    stays due until it commits.
+    """
+    candidates = [moment for moment in (schedule_index.next_due(), outbox.next_retry_at) if moment is not None]
+    if not candidates:
+        return SCHEDULER_MAX_SLEEP
+    wake_in = (min(candidates) - now_utc).total_seconds() - SCHEDULER_PRESTAGE_SECONDS
+    return min(SCHEDULER_MAX_SLEEP, max(SCHEDULER_MIN_SLEEP, wake_in))
+
+async def resync():
+    """Reloads the index and the next retry, picking up schedules written by other replicas."""
+    async with AsyncSessionLocal() as session:
+        await schedule_index.load(session)
+        await outbox.load_next_retry(session)
+
+async def run_scheduler(bot: Bot):
+    """
+    Sends due posts, then sleeps until the next fire instant (or until a new
+    schedule is added) instead of waking up every minute.
+    """
+    try:
+        await catch_up_missed_posts(bot)
+    except Exception as e:
+        print(f"Catch-up failed: {e}")
+
+    synced_at = time.monotonic()
+    while True:
+        try:
+            if time.monotonic() - synced_at >= SCHEDULER_RESYNC_SECONDS:
+                await resync()
+                synced_at = time.monotonic()
+            await check_scheduled_posts(bot)
+        except Exception as e:
+            print(f"Scheduler tick failed: {e}")
+            await asyncio.sleep(SCHEDULER_ERROR_DELAY)
+        resync_in = SCHEDULER_RESYNC_SECONDS - (time.monotonic() - synced_at)
+        await schedule_index.wait(max(0.0, min(seconds_until_next(utcnow()), resync_in)))
+
+async def prune_deliveries():
+    async with AsyncSessionLocal() as session:
+        now_utc = utcnow()
+        await outbox.expire_stale(session, now_utc)
+        await outbox.prune(session, now_utc)
+        await session.commit()
 
 def setup_scheduler(bot: Bot):
-    scheduler.add_job(check_scheduled_posts, 'cron', second=0, args=[bot])
+    global _loop_task, _supervisor
+    scheduler.add_job(prune_deliveries, 'cron', hour=22, minute=30)
     scheduler.start()
+    if SCHEDULER_SHARDS > 0:
+        # Worker processes run the scheduler loops; this process forwards schedule changes to them
+        _supervisor = ShardSupervisor(SCHEDULER_SHARDS)
+        schedule_index.subscribe(_supervisor.publish)
+        _supervisor.start()
+        return
+    _loop_task = asyncio.get_running_loop().create_task(run_scheduler(bot))
+
+async def stop_scheduler():
+    global _loop_task, _supervisor
+    if _loop_task is not None:
+        _loop_task.cancel()
+        await asyncio.gather(_loop_task, return_exceptions=True)
+        _loop_task = None
+    if _supervisor is not None:
+        await _supervisor.stop()
+        _supervisor = None
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
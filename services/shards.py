@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import multiprocessing
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between liveness checks of the shard workers
+WATCH_INTERVAL = 5
+
+
+def shard_of(group_id: int, shards: int) -> int:
+    """Shard of a group; the SQL filters use the same Group.id % shards."""
+    return group_id % shards
+
+
+def shard_dispatcher(shards: int):
+    """
+    Dispatcher of a shard worker. SEND_RATE is the bot's budget, not a process's: the N
+    workers split it evenly, minus the BROADCAST_RATE share set aside for broadcasts,
+    which the main process sends outside the workers' buckets.
+    """
+    from config import SEND_RATE, BROADCAST_RATE
+    from services.dispatch import Dispatcher
+    if SEND_RATE <= 0:
+        return Dispatcher(rate=0)
+    return Dispatcher(rate=(SEND_RATE - BROADCAST_RATE) / shards)
+
+
+class ShardSupervisor:
+    """
+    Sharded scheduled dispatch: N worker processes, each with its own event loop,
+    bot session and scheduler loop for the groups with id % N == its index.
+
+    The main process keeps handling updates. It forwards every schedule change made by
+    the admin handlers to the owning worker's queue (removals go to all of them, the
+    group is not known there) and restarts workers that die.
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        self._context = multiprocessing.get_context("spawn")
+        self.queues = [self._context.Queue() for _ in range(shards)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * shards
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def _spawn(self, shard: int):
+        process = self._context.Process(
+            target=run_worker,
+            args=(shard, self.shards, self.queues[shard]),
+            name=f"scheduler-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+        logger.info("Started scheduler shard %s/%s (pid %s)", shard, self.shards, process.pid)
+
+    def start(self):
+        for shard in range(self.shards):
+            self._spawn(shard)
+        self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+
+    def publish(self, action: str, schedule_id: int, next_run_at: Optional[datetime] = None, group_id: Optional[int] = None):
+        """ScheduleIndex listener."""
+        if action == "add" and group_id is not None:
+            self.queues[shard_of(group_id, self.shards)].put(("add", schedule_id, next_run_at))
+            return
+        # Without the group the owning shard is unknown; an unknown id is a no-op for the others
+        message = ("remove", schedule_id, None) if action == "remove" or next_run_at is None else ("add", schedule_id, next_run_at)
+        for queue in self.queues:
+            queue.put(message)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for shard, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.warning("Scheduler shard %s exited with %s, restarting", shard, process.exitcode)
+                    self._spawn(shard)
+
+    async def stop(self, timeout: float = 10.0):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        for queue in self.queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def run_worker(shard: int, shards: int, queue):
+    """Entry point of a shard worker process."""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_worker(shard, shards, queue))
+
+
+async def _apply_changes(queue, stop: asyncio.Event):
+    from services.schedule_index import schedule_index
+
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await loop.run_in_executor(None, queue.get)
+        if message is None:
+            stop.set()
+            return
+        action, schedule_id, next_run_at = message
+        if action == "add":
+            schedule_index.add(schedule_id, next_run_at)
+        else:
+            schedule_index.remove(schedule_id)
+
+
+async def _worker(shard: int, shards: int, queue):
+    # Imported here: the spawned process builds its own engine, bot and singletons
+    from aiogram import Bot
+    from config import BOT_TOKEN
+    from services import scheduler
+    from services.outbox import outbox
+    from services.schedule_index import schedule_index
+    from services.scheduler import run_scheduler
+
+    outbox.shard = schedule_index.shard = (shard, shards)
+    scheduler.dispatcher = shard_dispatcher(shards)
+    bot = Bot(token=BOT_TOKEN)
+    stop = asyncio.Event()
+    changes = asyncio.create_task(_apply_changes(queue, stop))
+    scheduler_loop = asyncio.create_task(run_scheduler(bot))
+    try:
+        await stop.wait()
+    finally:
+        scheduler_loop.cancel()
+        changes.cancel()
+        await asyncio.gather(scheduler_loop, changes, return_exceptions=True)
+        await bot.session.close()
@@ -0,0 +1,261 @@
+"""
+Dry-run of the post scheduler: replays a time range against a snapshot of the schedules
+on a virtual clock, with a fake bot that records the API calls instead of sending them.
+
+The real scheduler code runs unchanged (planning, rotation, outbox, pre-staging and the
+rate-limited dispatcher) against an in-memory SQLite copy of the snapshot. Only time is
+simulated: a day replays in seconds, which also makes the dry run a scheduler benchmark.
+"""
+import asyncio
+import contextlib
+import io
+import selectors
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import pytz
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from config import SEND_WORKERS, SEND_RATE, SEND_CHAT_INTERVAL, SEND_MAX_RETRIES
+from database.models import Base, Delivery, Group, ScheduleTimes
+from services.dispatch import Dispatcher
+from services.outbox import Outbox
+from services.post_payloads import PostPayloadCache
+from services.recurrence import group_tz, next_run_utc
+from services.rotation import backfill_rotation
+from services.schedule_index import ScheduleIndex
+
+# What a schedule replay needs; deliveries start empty
+SNAPSHOT_TABLES = ("groups", "posts", "post_items", "schedule_times")
+
+
+class _VirtualSelector:
+    """
+    Selector wrapper of VirtualClockLoop: when the loop would sleep until its next timer
+    and no I/O is ready, the clock jumps to that timer instead. With no timer pending the
+    loop blocks on real I/O, which is how the SQLite worker thread's results come in.
+    """
+
+    def __init__(self, selector: selectors.BaseSelector, loop: "VirtualClockLoop"):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is None:
+            return self._selector.select(None)
+        events = self._selector.select(0)
+        if not events and timeout > 0:
+            self._loop.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose time() only moves forward when every task is waiting on a timer.
+    Sleeps, call_later and anything reading loop.time() run in virtual time. A database
+    call must not be in flight while a timer is pending (it would not cost virtual time),
+    which holds for the scheduler: it never awaits the database and a timer at once.
+    """
+
+    def __init__(self):
+        self._virtual_time = 0.0
+        super().__init__()
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        self._virtual_time += seconds
+
+
+class RecordingBot:
+    """Stands in for aiogram.Bot: records (virtual time, method) of every call, each taking `latency` seconds."""
+
+    def __init__(self, clock, latency: float = 0.0):
+        self._clock = clock
+        self.latency = latency
+        self.calls: List[Tuple[float, Any]] = []
+
+    async def __call__(self, method):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append((self._clock(), method))
+
+
+@dataclass
+class Snapshot:
+    """Rows of SNAPSHOT_TABLES as column dicts."""
+    tables: Dict[str, List[dict]] = field(default_factory=dict)
+
+
+async def load_snapshot(session: AsyncSession) -> Snapshot:
+    snapshot = Snapshot()
+    for name in SNAPSHOT_TABLES:
+        table = Base.metadata.tables[name]
+        res = await session.execute(select(table))
+        snapshot.tables[name] = [dict(row) for row in res.mappings().all()]
+    return snapshot
+
+
+@dataclass
+class SimulationReport:
+    start: datetime
+    end: datetime
+    ticks: int = 0
+    deliveries: int = 0
+    sent: int = 0
+    failed: int = 0
+    per_group: Dict[str, int] = field(default_factory=dict)
+    # API calls per minute (naive UTC), from the fake bot
+    per_minute: Counter = field(default_factory=Counter)
+    # Seconds between the scheduled and the actual send, per delivered post
+    lateness: List[float] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def peak_minute(self) -> Tuple[Optional[datetime], int]:
+        if not self.per_minute:
+            return None, 0
+        return max(self.per_minute.items(), key=lambda item: (item[1], -item[0].timestamp()))
+
+    def lateness_percentile(self, p: float) -> float:
+        if not self.lateness:
+            return 0.0
+        values = sorted(self.lateness)
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    def format(self, top_groups: int = 10) -> str:
+        peak_at, peak = self.peak_minute
+        lines = [
+            f"Simulated {self.start:%Y-%m-%d %H:%M} - {self.end:%Y-%m-%d %H:%M} UTC in {self.wall_seconds:.2f}s ({self.ticks} ticks)",
+            f"Deliveries: {self.deliveries} planned, {self.sent} sent, {self.failed} failed",
+            f"Peak: {peak} calls at {peak_at:%H:%M} UTC" if peak_at else "Peak: no calls",
+            "Lateness p50/p99/max: "
+            f"{self.lateness_percentile(0.50):.2f}s / {self.lateness_percentile(0.99):.2f}s / {max(self.lateness, default=0.0):.2f}s",
+        ]
+        if self.per_group:
+            lines.append("Deliveries per group:")
+            for title, count in sorted(self.per_group.items(), key=lambda item: -item[1])[:top_groups]:
+                lines.append(f"  {title}: {count}")
+            if len(self.per_group) > top_groups:
+                lines.append(f"  ... and {len(self.per_group) - top_groups} more groups")
+        return "\n".join(lines)
+
+
+async def _build_database(snapshot: Snapshot, start: datetime):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for name in SNAPSHOT_TABLES:
+            rows = snapshot.tables.get(name)
+            if rows:
+                await conn.execute(insert(Base.metadata.tables[name]), rows)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+    async with Session() as session:
+        await backfill_rotation(session)
+        # Pending schedules restart from the beginning of the range; fired one-time ones stay fired
+        after = pytz.utc.localize(start - timedelta(seconds=1))
+        rows = (await session.execute(
+            select(ScheduleTimes, Group)
+            .join(Group, Group.id == ScheduleTimes.group_id)
+            .where(ScheduleTimes.next_run_at.is_not(None))
+        )).all()
+        for schedule, group in rows:
+            schedule.next_run_at = next_run_utc(schedule, after, group_tz(group))
+        await session.commit()
+    return engine, Session
+
+
+async def simulate(
+    snapshot: Snapshot,
+    start: datetime,
+    hours: float = 24,
+    workers: int = SEND_WORKERS,
+    rate: float = SEND_RATE,
+    chat_interval: float = SEND_CHAT_INTERVAL,
+    max_retries: int = SEND_MAX_RETRIES,
+    latency: float = 0.05,
+    verbose: bool = False
+) -> SimulationReport:
+    """
+    Replays [start, start + hours) (naive UTC) through the scheduler. Runs on a
+    VirtualClockLoop, see run_simulation.
+    """
+    from services import scheduler
+
+    loop = asyncio.get_running_loop()
+    started_wall = time.perf_counter()
+    end = start + timedelta(hours=hours)
+    report = SimulationReport(start=start, end=end)
+    engine, Session = await _build_database(snapshot, start)
+
+    index = ScheduleIndex()
+    state = {
+        "schedule_index": index,
+        "AsyncSessionLocal": Session,
+        "dispatcher": Dispatcher(workers=workers, rate=rate, chat_interval=chat_interval, max_retries=max_retries, clock=loop.time),
+        "outbox": Outbox(index=index, replica_id="simulator"),
+        "post_payloads": PostPayloadCache(),
+    }
+    saved = {name: getattr(scheduler, name) for name in state}
+    bot = RecordingBot(loop.time, latency)
+    origin = loop.time()
+
+    def virtual_now() -> datetime:
+        return start + timedelta(seconds=loop.time() - origin)
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        for name, value in state.items():
+            setattr(scheduler, name, value)
+        with output:
+            while virtual_now() < end:
+                await scheduler.check_scheduled_posts(bot, now=virtual_now())
+                report.ticks += 1
+                await asyncio.sleep(scheduler.seconds_until_next(virtual_now()))
+
+        async with Session() as session:
+            res = await session.execute(
+                select(Group.title, Group.id, func.count(Delivery.id))
+                .join(Delivery, Delivery.group_id == Group.id)
+                .where(Delivery.fire_at < end)
+                .group_by(Group.id, Group.title)
+            )
+            report.per_group = {title or str(group_id): count for title, group_id, count in res.all()}
+            res = await session.execute(select(Delivery.status, Delivery.lateness_ms).where(Delivery.fire_at < end))
+            for status, lateness_ms in res.all():
+                report.deliveries += 1
+                if status == 'sent':
+                    report.sent += 1
+                    report.lateness.append((lateness_ms or 0) / 1000)
+                elif status == 'failed':
+                    report.failed += 1
+    finally:
+        for name, value in saved.items():
+            setattr(scheduler, name, value)
+        await engine.dispose()
+
+    for moment, _ in bot.calls:
+        sent_at = start + timedelta(seconds=moment - origin)
+        if sent_at < end:
+            report.per_minute[sent_at.replace(second=0, microsecond=0)] += 1
+    report.wall_seconds = time.perf_counter() - started_wall
+    return report
+
+
+def run_simulation(snapshot: Snapshot, start: datetime, **options) -> SimulationReport:
+    """Runs simulate() on a fresh VirtualClockLoop; must not be called from a running loop."""
+    loop = VirtualClockLoop()
+    try:
+        return loop.run_until_complete(simulate(snapshot, start, **options))
+    finally:
+        loop.close()
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from datetime import timedelta
+from aiogram import Bot
+from aiogram.types import ChatPermissions
+from services.spam_digest import SpamDigest
+from services.spam_samples import SampleRecorder, sample_recorder
+from keyboards.inline.admin_kbs import not_spam_keyboard
+from config import SPAM_QUEUE_SIZE, SPAM_QUEUE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpamAction:
+    bot: Bot
+    chat_id: int
+    message_id: int
+    group_title: Optional[str]
+    owner_telegram_id: Optional[int]
+    keyword: Optional[str]
+    notify_owner: bool = True
+    # Set for floods: restrict the sender for mute_seconds after deleting
+    mute_user_id: Optional[int] = None
+    mute_seconds: int = 0
+    # Content-based hits keep the text as a classifier training sample
+    group_id: Optional[int] = None
+    text: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class SpamActionQueue:
+    """
+    Bounded queue of spam deletions/owner notifications, drained by a pool of workers
+    so the message middleware never waits on Telegram.
+    """
+
+    def __init__(
+        self,
+        max_size: int = SPAM_QUEUE_SIZE,
+        workers: int = SPAM_QUEUE_WORKERS,
+        digest: Optional[SpamDigest] = None,
+        samples: SampleRecorder = sample_recorder
+    ):
+        self.max_size = max_size
+        self.worker_count = workers
+        self.digest = digest if digest is not None else SpamDigest()
+        self.samples = samples
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        # Enqueue-to-done latency of the most recent actions, in seconds
+        self._latencies = deque(maxlen=1000)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout: float = 5.0):
+        """Gives pending actions a moment to finish, then stops the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Spam action queue stopped with %s pending actions", self._queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.digest.flush_all()
+
+    def enqueue(self, action: SpamAction) -> bool:
+        self.start()
+        try:
+            self._queue.put_nowait(action)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning("Spam action queue is full, %s actions dropped so far", self.dropped)
+            return False
+        self.enqueued += 1
+        return True
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self):
+        while True:
+            action = await self._queue.get()
+            try:
+                await self.process(action)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error in spam filter: {e}")
+            finally:
+                self._latencies.append(time.monotonic() - action.enqueued_at)
+                self._queue.task_done()
+
+    async def process(self, action: SpamAction):
+        notify = bool(action.owner_telegram_id) and action.notify_owner
+        forward = notify
+        if notify and self.digest.enabled:
+            # Owner gets one summary per window; only the first few messages are forwarded
+            forward = self.digest.add(action.bot, action.owner_telegram_id, action.group_title, action.keyword)
+            notify = False
+
+        # Forward first: Telegram can't forward a message that is already deleted
+        if forward:
+            try:
+                await action.bot.forward_message(
+                    chat_id=action.owner_telegram_id,
+                    from_chat_id=action.chat_id,
+                    message_id=action.message_id
+                )
+            except Exception as e:
+                print(f"Failed to forward spam to owner {action.owner_telegram_id}: {e}")
+
+        await action.bot.delete_message(chat_id=action.chat_id, message_id=action.message_id)
+        self.samples.add(action.group_id, action.chat_id, action.message_id, action.text, label=1, source="filter")
+
+        if action.mute_user_id and action.mute_seconds > 0:
+            await action.bot.restrict_chat_member(
+                chat_id=action.chat_id,
+                user_id=action.mute_user_id,
+                permissions=ChatPermissions(can_send_messages=False),
+                until_date=timedelta(seconds=action.mute_seconds)
+            )
+
+        if notify:
+            await action.bot.send_message(
+                chat_id=action.owner_telegram_id,
+                text=f"Spam detected in group {action.group_title} and deleted.\nKeyword: {action.keyword}",
+                reply_markup=not_spam_keyboard(action.chat_id, action.message_id) if action.text else None
+            )
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "workers": len(self._workers),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+spam_actions = SpamActionQueue()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import re
+import zlib
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from config import CLASSIFIER_THRESHOLD, CLASSIFIER_BATCH_SIZE, CLASSIFIER_BATCH_DELAY
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+N_FEATURES = 1 << 18
+
+
+def hash_features(texts: Sequence[str], n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashing trick: every text becomes a bag of hashed word unigrams and bigrams.
+    Returns CSR-style (indptr, indices); crc32 keeps the hashes stable across processes.
+    """
+    indptr = [0]
+    indices: List[int] = []
+    for text in texts:
+        words = _TOKEN_RE.findall((text or "").lower())
+        tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        indices.extend(zlib.crc32(t.encode()) % n_features for t in tokens)
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64)
+
+
+class SpamClassifier:
+    """
+    Multinomial naive Bayes over hashed features, stored as one log-odds weight per bucket.
+    Scoring a batch is a gather plus a segmented sum.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float = CLASSIFIER_THRESHOLD):
+        self.weights = weights.astype(np.float32, copy=False)
+        self.bias = float(bias)
+        self.threshold = threshold
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[int], n_features: int = N_FEATURES, alpha: float = 1.0) -> "SpamClassifier":
+        labels = np.asarray(labels, dtype=np.int64)
+        indptr, indices = hash_features(texts, n_features)
+        # Label of every token occurrence
+        token_labels = np.repeat(labels, np.diff(indptr))
+
+        counts = np.zeros((2, n_features), dtype=np.float64)
+        np.add.at(counts, (token_labels, indices), 1.0)
+        counts += alpha
+        log_probs = np.log(counts) - np.log(counts.sum(axis=1, keepdims=True))
+
+        spam = max(int(labels.sum()), 1)
+        ham = max(len(labels) - int(labels.sum()), 1)
+        return cls(log_probs[1] - log_probs[0], np.log(spam) - np.log(ham))
+
+    def log_odds(self, texts: Sequence[str]) -> np.ndarray:
+        indptr, indices = hash_features(texts, self.n_features)
+        token_scores = self.weights[indices]
+        # Segmented sum per text; cumsum handles texts without tokens
+        cumulative = np.concatenate(([0.0], np.cumsum(token_scores, dtype=np.float64)))
+        return cumulative[indptr[1:]] - cumulative[indptr[:-1]] + self.bias
+
+    def score(self, texts: Sequence[str]) -> np.ndarray:
+        """Spam probability for each text."""
+        return 1.0 / (1.0 + np.exp(-np.clip(self.log_odds(texts), -50, 50)))
+
+    def save(self, path: str):
+        np.savez(path, weights=self.weights, bias=np.float64(self.bias))
+
+    @classmethod
+    def load(cls, path: str, threshold: float = CLASSIFIER_THRESHOLD) -> "SpamClassifier":
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), threshold=threshold)
+
+
+class ClassifierBatcher:
+    """
+    Collects texts from concurrent middleware calls and scores them together,
+    flushing when the batch is full or after a few milliseconds.
+    """
+
+    def __init__(self, model: Optional[SpamClassifier] = None, batch_size: int = CLASSIFIER_BATCH_SIZE, max_delay: float = CLASSIFIER_BATCH_DELAY):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def load(self, path: str) -> bool:
+        if not path or not os.path.exists(path):
+            return False
+        self.model = SpamClassifier.load(path)
+        return True
+
+    @property
+    def enabled(self) -> bool:
+        return self.model is not None
+
+    def is_spam(self, probability: float) -> bool:
+        return probability >= self.model.threshold
+
+    async def score(self, text: str) -> float:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            scores = self.model.score([text for text, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), value in zip(pending, scores):
+            if not future.done():
+                future.set_result(float(value))
+
+
+classifier_batcher = ClassifierBatcher()
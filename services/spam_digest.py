@@ -0,0 +1,82 @@
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from aiogram import Bot
+from config import SPAM_DIGEST_WINDOW, SPAM_DIGEST_SAMPLES
+
+
+@dataclass
+class DigestBucket:
+    bot: Bot
+    started_at: float = field(default_factory=time.monotonic)
+    total: int = 0
+    samples: int = 0
+    by_keyword: Counter = field(default_factory=Counter)
+    by_group: Counter = field(default_factory=Counter)
+
+
+class SpamDigest:
+    """
+    Collects spam events per owner over a window and sends one summary message
+    instead of a notice per deleted message. Only the first few messages of a
+    window are forwarded to the owner as samples.
+    """
+
+    def __init__(self, window: float = SPAM_DIGEST_WINDOW, samples: int = SPAM_DIGEST_SAMPLES):
+        self.window = window
+        self.samples = samples
+        self._buckets: Dict[int, DigestBucket] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def add(self, bot: Bot, owner_telegram_id: int, group_title: Optional[str], reason: Optional[str]) -> bool:
+        """Records one deleted message. Returns True if it should be forwarded as a sample."""
+        bucket = self._buckets.get(owner_telegram_id)
+        if bucket is None:
+            bucket = DigestBucket(bot=bot)
+            self._buckets[owner_telegram_id] = bucket
+            task = asyncio.get_running_loop().create_task(self._flush_later(owner_telegram_id))
+            self._tasks.append(task)
+            task.add_done_callback(self._tasks.remove)
+
+        bucket.total += 1
+        bucket.by_keyword[reason or "-"] += 1
+        bucket.by_group[group_title or "-"] += 1
+
+        if bucket.samples < self.samples:
+            bucket.samples += 1
+            return True
+        return False
+
+    async def _flush_later(self, owner_telegram_id: int):
+        await asyncio.sleep(self.window)
+        await self.flush(owner_telegram_id)
+
+    async def flush(self, owner_telegram_id: int):
+        bucket = self._buckets.pop(owner_telegram_id, None)
+        if bucket is None or not bucket.total:
+            return
+        try:
+            await bucket.bot.send_message(chat_id=owner_telegram_id, text=self.format(bucket))
+        except Exception as e:
+            print(f"Failed to send spam digest to {owner_telegram_id}: {e}")
+
+    async def flush_all(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for owner_telegram_id in list(self._buckets):
+            await self.flush(owner_telegram_id)
+
+    def format(self, bucket: DigestBucket) -> str:
+        minutes = max(1, round((time.monotonic() - bucket.started_at) / 60))
+        lines = [f"Spam digest: {bucket.total} messages deleted in the last {minutes} min."]
+        lines.append("\nBy group:")
+        lines += [f"- {title}: {count}" for title, count in bucket.by_group.most_common(10)]
+        lines.append("\nBy keyword:")
+        lines += [f"- {kw}: {count}" for kw, count in bucket.by_keyword.most_common(10)]
+        return "\n".join(lines)
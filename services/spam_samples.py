@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+from sqlalchemy import update
+from database.engine import AsyncSessionLocal
+from database.models import SpamSample
+
+logger = logging.getLogger(__name__)
+
+
+class SampleRecorder:
+    """
+    Buffers classifier training samples (deleted spam, owner feedback, sampled normal
+    messages) and writes them to the database in batches, off the message path.
+    """
+
+    def __init__(self, max_buffer: int = 5000, flush_interval: float = 30.0):
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, group_id: Optional[int], chat_id: int, message_id: int, text: Optional[str], label: int, source: str):
+        if not text:
+            return
+        self._buffer.append({
+            "group_id": group_id,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "label": label,
+            "source": source,
+        })
+
+    async def mark_not_spam(self, chat_id: int, message_id: int):
+        """Owner feedback: the deleted message was not spam."""
+        for sample in self._buffer:
+            if sample["chat_id"] == chat_id and sample["message_id"] == message_id:
+                sample["label"] = 0
+                sample["source"] = "owner"
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                update(SpamSample)
+                .where(SpamSample.chat_id == chat_id, SpamSample.message_id == message_id)
+                .values(label=0, source="owner")
+            )
+            await session.execute(stmt)
+            await session.commit()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch = list(self._buffer)
+        self._buffer.clear()
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add_all([SpamSample(**sample) for sample in batch])
+                await session.commit()
+        except Exception as e:
+            logger.warning("Failed to store %s spam samples: %s", len(batch), e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+sample_recorder = SampleRecorder()
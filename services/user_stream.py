@@ -0,0 +1,36 @@
+from typing import AsyncIterator, List, Sequence
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import USER_STREAM_BATCH_SIZE
+from database.models import User
+
+
+async def user_pages(session: AsyncSession, columns: Sequence, batch_size: int = USER_STREAM_BATCH_SIZE, after: int = 0) -> AsyncIterator[List[Row]]:
+    """
+    Rows of (users.id, *columns) in id order, one keyset page (`id > last id`) at a time.
+    Every page is a short query of its own, so the caller may commit or wait between
+    pages; the broadcast cursor is the last id of a page.
+    """
+    while True:
+        rows = (await session.execute(
+            select(User.id, *columns).where(User.id > after).order_by(User.id).limit(batch_size)
+        )).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+async def stream_users(session: AsyncSession, columns: Sequence, batch_size: int = USER_STREAM_BATCH_SIZE) -> AsyncIterator[List[Row]]:
+    """
+    Rows of `columns` for every user in id order, in batches from one server-side cursor:
+    a single consistent read, for a reader that consumes it in one go (the export).
+    """
+    result = await session.stream(
+        select(*columns).order_by(User.id).execution_options(yield_per=batch_size)
+    )
+    try:
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        await result.close()
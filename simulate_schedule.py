@@ -0,0 +1,47 @@
+"""
+Dry run of the post scheduler: replays a time range against a snapshot of the current
+database without sending anything, and prints the planned deliveries per group, the
+busiest minute and the lateness the configured rate limits would cause.
+
+    python3 simulate_schedule.py                              # the next 24 hours
+    python3 simulate_schedule.py --start 2025-05-01T00:00 --hours 6 --rate 30
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from config import SEND_WORKERS, SEND_RATE, SEND_CHAT_INTERVAL
+from database.engine import AsyncSessionLocal, engine
+from services.outbox import utcnow
+from services.simulator import load_snapshot, run_simulation
+
+async def take_snapshot():
+    async with AsyncSessionLocal() as session:
+        snapshot = await load_snapshot(session)
+    await engine.dispose()
+    return snapshot
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", help="UTC start, e.g. 2025-05-01T00:00 (default: now)")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--workers", type=int, default=SEND_WORKERS)
+    parser.add_argument("--rate", type=float, default=SEND_RATE)
+    parser.add_argument("--chat-interval", type=float, default=SEND_CHAT_INTERVAL)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per simulated API call")
+    parser.add_argument("--top", type=int, default=20, help="groups listed in the report")
+    args = parser.parse_args()
+
+    start = datetime.fromisoformat(args.start) if args.start else utcnow().replace(second=0, microsecond=0)
+    # Read with a normal event loop; the simulation itself runs on a virtual clock
+    snapshot = asyncio.run(take_snapshot())
+    print(f"Snapshot: {len(snapshot.tables['groups'])} groups, {len(snapshot.tables['schedule_times'])} schedules")
+
+    report = run_simulation(
+        snapshot, start,
+        hours=args.hours, workers=args.workers, rate=args.rate,
+        chat_interval=args.chat_interval, latency=args.latency
+    )
+    print(report.format(args.top))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, BroadcastJob, User
+from services.broadcast import BroadcastRunner
+
+ADMIN_CHAT = 999
+
+class FakeBot:
+    """Records broadcast sends and progress edits; `blocked` users answer Forbidden."""
+
+    def __init__(self, blocked=(), on_send=None):
+        self.blocked = set(blocked)
+        self.on_send = on_send
+        self.sent = []
+        self.admin_messages = []
+        self.edits = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id == ADMIN_CHAT:
+            self.admin_messages.append(text)
+            return SimpleNamespace(message_id=len(self.admin_messages))
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=MagicMock(), message="Forbidden: bot was blocked by the user")
+        self.sent.append(chat_id)
+        if self.on_send:
+            await self.on_send(chat_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+async def build_database(user_count):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    async with Session() as session:
+        session.add_all([User(id=i, telegram_id=1000 + i, full_name=f"User {i}") for i in range(1, user_count + 1)])
+        await session.commit()
+    return engine, Session
+
+def runner_for(Session, **options):
+    return BroadcastRunner(session_factory=Session, workers=4, rate=0, batch_size=10, progress_interval=0, replica_id="test",
+                           shared_bucket=None, **options)
+
+class TestBroadcast(unittest.IsolatedAsyncioTestCase):
+    async def test_sends_everyone_in_batches(self):
+        engine, Session = await build_database(25)
+        runner = runner_for(Session)
+        bot = FakeBot(blocked={1007})
+        async with Session() as session:
+            job = await runner.create(session, bot, "Salom", ADMIN_CHAT, created_by=1)
+        await runner.join()
+
+        self.assertEqual(sorted(bot.sent), [1000 + i for i in range(1, 26) if i != 7])
+        async with Session() as session:
+            job = await session.get(BroadcastJob, job.id)
+        self.assertEqual((job.status, job.cursor, job.sent, job.failed, job.total), ('done', 25, 24, 1, 25))
+        self.assertIsNone(job.lease_until)
+        # Progress after each batch, then the final state without buttons and a closing message
+        self.assertTrue(len(bot.edits) >= 3)
+        self.assertIn("tugadi", bot.edits[-1][0])
+        self.assertIsNone(bot.edits[-1][1])
+        self.assertEqual(bot.admin_messages[-1], "Xabar yuborish tugadi. 24 foydalanuvchilarga yuborildi.")
+        await engine.dispose()
+
+    async def test_pause_resume_cancel(self):
+        engine, Session = await build_database(25)
+        runner = runner_for(Session)
+
+        async def pause_midway(chat_id):
+            if chat_id == 1012:
+                async with Session() as session:
+                    await runner.pause(session, job.id)
+
+        bot = FakeBot(on_send=pause_midway)
+        async with Session() as session:
+            job = await runner.create(session, bot, "Salom", ADMIN_CHAT, created_by=1)
+        await runner.join()
+
+        # The batch in flight finishes, then the job waits
+        self.assertEqual(len(bot.sent), 20)
+        async with Session() as session:
+            paused = await session.get(BroadcastJob, job.id)
+            self.assertEqual((paused.status, paused.cursor), ('paused', 20))
+
+            self.assertIsNotNone(await runner.resume(session, bot, job.id))
+            await runner.join()
+            self.assertEqual(Counter(bot.sent), Counter(1000 + i for i in range(1, 26)))
+            # Over: neither cancel nor resume apply any more
+            self.assertIsNone(await runner.cancel(session, job.id))
+            self.assertIsNone(await runner.resume(session, bot, job.id))
+
+            job = BroadcastJob(text="x", status='paused', cursor=5, total=25, sent=5, failed=0)
+            session.add(job)
+            await session.commit()
+            cancelled = await runner.cancel(session, job.id)
+            self.assertEqual(cancelled.status, 'cancelled')
+            self.assertIsNotNone(cancelled.finished_at)
+            self.assertIsNone(await runner.resume(session, bot, job.id))
+        await engine.dispose()
+
+    async def test_resumes_after_restart(self):
+        engine, Session = await build_database(25)
+        past = datetime.utcnow() - timedelta(minutes=1)
+        future = datetime.utcnow() + timedelta(minutes=5)
+        async with Session() as session:
+            # Died mid-job (lease ran out), and one still being sent by a live replica
+            session.add(BroadcastJob(id=1, text="a", status='running', cursor=15, total=25, sent=15, failed=0,
+                                    progress_chat_id=ADMIN_CHAT, progress_message_id=1, claimed_by="dead", lease_until=past))
+            session.add(BroadcastJob(id=2, text="b", status='running', cursor=0, total=25, sent=0, failed=0, claimed_by="other", lease_until=future))
+            await session.commit()
+
+        runner = runner_for(Session)
+        bot = FakeBot()
+        self.assertEqual(await runner.resume_all(bot), 2)
+        # Job 2 keeps waiting for the other replica's lease, so wait for job 1 alone
+        for _ in range(200):
+            if bot.admin_messages:
+                break
+            await asyncio.sleep(0.02)
+        await runner.stop(timeout=1)
+
+        self.assertEqual(sorted(bot.sent), [1000 + i for i in range(16, 26)])
+        async with Session() as session:
+            done = await session.get(BroadcastJob, 1)
+            self.assertEqual((done.status, done.sent, done.claimed_by), ('done', 25, "test"))
+            other = await session.get(BroadcastJob, 2)
+            self.assertEqual((other.status, other.cursor, other.claimed_by), ('running', 0, "other"))
+        await engine.dispose()
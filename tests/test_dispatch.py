@@ -0,0 +1,137 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from aiogram.exceptions import TelegramRetryAfter
+from services.dispatch import Dispatcher, SendJob, TokenBucket
+
+class TestDispatch(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_fan_out(self):
+        dispatcher = Dispatcher(workers=10, rate=0, chat_interval=0)
+        jobs = [SendJob(chat_id=-i, payload=i) for i in range(50)]
+
+        async def send(bot, chat_id, payload):
+            await asyncio.sleep(0.05)
+
+        started = time.monotonic()
+        report = await dispatcher.run(None, jobs, send)
+        elapsed = time.monotonic() - started
+
+        # 50 sends of 50ms each on 10 workers, not 2.5s one after another
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(report.sent, 50)
+        self.assertTrue(all(job.sent for job in jobs))
+        self.assertLess(report.spread, 0.5)
+        print("Test Concurrent Fan-out: PASSED")
+
+    async def test_retry_after_does_not_block_other_chats(self):
+        dispatcher = Dispatcher(workers=2, rate=0, chat_interval=0)
+        jobs = [SendJob(chat_id=-1, payload="slow"), SendJob(chat_id=-2, payload="a"), SendJob(chat_id=-3, payload="b")]
+        sent = []
+        throttled = {"slow": 1}
+
+        async def send(bot, chat_id, payload):
+            if throttled.get(payload):
+                throttled[payload] -= 1
+                raise TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0.1)
+            sent.append(payload)
+
+        report = await dispatcher.run(None, jobs, send)
+
+        self.assertEqual(sent, ["a", "b", "slow"])
+        self.assertEqual(report.retried, 1)
+        self.assertEqual(report.sent, 3)
+        print("Test RetryAfter Re-queue: PASSED")
+
+    async def test_global_backoff_holds_every_chat(self):
+        dispatcher = Dispatcher(workers=1, rate=0, chat_interval=0, global_backoff=True)
+        jobs = [SendJob(chat_id=-1, payload="slow"), SendJob(chat_id=-2, payload="a")]
+        sent = {}
+        throttled = {"slow": 1}
+        started = time.monotonic()
+
+        async def send(bot, chat_id, payload):
+            if throttled.get(payload):
+                throttled[payload] -= 1
+                raise TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0.2)
+            sent[payload] = time.monotonic() - started
+
+        report = await dispatcher.run(None, jobs, send)
+
+        self.assertEqual(report.sent, 2)
+        # A bot-wide RetryAfter (broadcasts) holds back the other chats too
+        self.assertGreaterEqual(sent["a"], 0.19)
+
+    async def test_retry_limit_and_chat_interval(self):
+        dispatcher = Dispatcher(workers=4, rate=0, chat_interval=0.05, max_retries=1)
+        jobs = [SendJob(chat_id=-1, payload=i) for i in range(3)] + [SendJob(chat_id=-2, payload="throttled")]
+        times = []
+
+        async def send(bot, chat_id, payload):
+            if payload == "throttled":
+                raise TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0)
+            times.append(time.monotonic())
+
+        report = await dispatcher.run(None, jobs, send)
+
+        self.assertEqual(report.sent, 3)
+        self.assertEqual(report.failed, 1)
+        self.assertFalse(jobs[-1].sent)
+        # Posts to one chat are spaced by the chat interval
+        self.assertTrue(all(b - a >= 0.04 for a, b in zip(times, times[1:])))
+        print("Test Retry Limit: PASSED")
+
+    async def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        started = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        # One token up front, then 10 more at 100/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        print("Test Token Bucket: PASSED")
+
+    async def test_token_bucket_on_a_stepped_clock(self):
+        # A clock that only moves by the slept time (the simulator's virtual clock): refill
+        # rounding must not turn into endless sub-nanosecond sleeps
+        now = [0.0]
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > 1000:
+                raise RuntimeError("token bucket is not making progress")
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=7, burst=1, clock=lambda: now[0])
+        with patch("services.dispatch.asyncio.sleep", fake_sleep):
+            for _ in range(71):
+                await bucket.acquire()
+        self.assertEqual(len(sleeps), 70)
+        self.assertAlmostEqual(now[0], 10, places=6)
+
+    async def test_shared_budget(self):
+        # Broadcasts (a share of 50/s) and scheduled posts draw from one 100/s budget
+        budget = TokenBucket(rate=100, burst=1)
+        broadcasts = Dispatcher(workers=4, rate=50, chat_interval=0, parent_bucket=budget)
+        scheduled = Dispatcher(workers=4, rate=0, chat_interval=0, parent_bucket=budget)
+
+        async def send(bot, chat_id, payload):
+            pass
+
+        started = time.monotonic()
+        await asyncio.gather(
+            broadcasts.run(None, [SendJob(chat_id=-i, payload=i) for i in range(10)], send),
+            scheduled.run(None, [SendJob(chat_id=i, payload=i) for i in range(1, 11)], send)
+        )
+        # 20 sends at 100/s together, not two separate budgets
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+        # A RetryAfter on the share holds the whole budget
+        broadcasts.bucket.pause(0.1)
+        started = time.monotonic()
+        await budget.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from aiogram.types import MessageEntity
+from services.domain_matcher import DomainMatcher, entity_links, normalize_domain
+
+class TestDomainMatcher(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize_domain("https://WWW.Example.com/path?q=1"), "example.com")
+        self.assertEqual(normalize_domain("@SpamChannel"), "spamchannel.t.me")
+        self.assertEqual(normalize_domain("t.me/spamchannel/12"), "spamchannel.t.me")
+        self.assertIsNone(normalize_domain("not a domain!"))
+
+    def test_suffix_rules_with_allow_override(self):
+        matcher = DomainMatcher([("example.com", False), ("docs.example.com", True), ("t.me/spam", False)])
+        self.assertTrue(matcher.is_blocked("example.com"))
+        self.assertTrue(matcher.is_blocked("cdn.example.com"))
+        self.assertFalse(matcher.is_blocked("docs.example.com"))
+        self.assertFalse(matcher.is_blocked("badexample.com"))
+        self.assertEqual(matcher.find_blocked(["@Spam", "https://ok.org"]), "spam.t.me")
+        self.assertIsNone(matcher.find_blocked(["@friend"]))
+
+    def test_entity_links_include_hidden_urls(self):
+        text = "😀 see example.com and @spam, or click here"
+        entities = [
+            MessageEntity(type="url", offset=7, length=11),
+            MessageEntity(type="mention", offset=23, length=5),
+            MessageEntity(type="text_link", offset=37, length=4, url="https://hidden.net/x"),
+            MessageEntity(type="bold", offset=0, length=2),
+        ]
+        self.assertEqual(entity_links(text, entities), ["example.com", "@spam", "https://hidden.net/x"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from services.fingerprint import FingerprintIndex, simhash
+
+SPAM = "Earn 500$ a day from home, no experience needed! Write to our manager now"
+
+class TestFingerprintIndex(unittest.TestCase):
+    def test_near_duplicates_share_fingerprint(self):
+        a = simhash(SPAM)
+        b = simhash(SPAM.upper() + "!!!")
+        self.assertLessEqual(bin(a ^ b).count("1"), 3)
+
+    def test_counts_distinct_groups_in_window(self):
+        index = FingerprintIndex(window=60, max_entries=100, min_chars=10)
+        counts = [index.observe(chat, SPAM, now=chat) for chat in (1, 2, 2, 3)]
+        self.assertEqual(counts, [1, 2, 2, 3])
+
+        # Unrelated text starts its own entry
+        self.assertEqual(index.observe(4, "Meeting moved to Thursday at the usual place", now=5), 1)
+
+        # After the window the old sightings are gone
+        self.assertEqual(index.observe(5, SPAM, now=200), 1)
+
+    def test_short_text_ignored_and_memory_bounded(self):
+        index = FingerprintIndex(window=60, max_entries=3, min_chars=10)
+        self.assertEqual(index.observe(1, "hi", now=0), 0)
+        for i in range(10):
+            index.observe(1, f"message number {i} with some distinct words {i * 7919}", now=i)
+        self.assertLessEqual(len(index), 3)
+
+if __name__ == "__main__":
+    unittest.main()
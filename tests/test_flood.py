@@ -0,0 +1,32 @@
+import unittest
+from services.flood import FloodDetector
+
+class TestFloodDetector(unittest.TestCase):
+    def test_user_limit_in_window(self):
+        detector = FloodDetector(idle_ttl=60, max_keys=100)
+        results = [detector.check(-1, 7, user_limit=3, chat_limit=0, window=10, now=t) for t in (0, 1, 2, 3)]
+
+        self.assertEqual([r[0] for r in results], [None, None, "user", "user"])
+        # Only the first flooding message of a burst asks for a mute
+        self.assertEqual([r[1] for r in results], [False, False, True, False])
+
+        # Slow senders never trip
+        self.assertEqual(detector.check(-1, 8, user_limit=3, chat_limit=0, window=10, now=0)[0], None)
+        self.assertEqual(detector.check(-1, 8, user_limit=3, chat_limit=0, window=10, now=20)[0], None)
+        self.assertEqual(detector.check(-1, 8, user_limit=3, chat_limit=0, window=10, now=40)[0], None)
+
+    def test_chat_limit(self):
+        detector = FloodDetector(idle_ttl=60, max_keys=100)
+        reasons = [detector.check(-1, user, user_limit=0, chat_limit=3, window=5, now=0)[0] for user in range(1, 5)]
+        self.assertEqual(reasons, [None, None, "chat", "chat"])
+
+    def test_idle_eviction(self):
+        detector = FloodDetector(idle_ttl=30, max_keys=100)
+        detector.check(-1, 7, user_limit=3, chat_limit=3, window=10, now=0)
+        self.assertEqual(len(detector), 2)
+
+        detector.check(-2, 9, user_limit=3, chat_limit=0, window=10, now=100)
+        self.assertEqual(len(detector), 1)
+
+if __name__ == "__main__":
+    unittest.main()
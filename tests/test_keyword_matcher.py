@@ -0,0 +1,26 @@
+import unittest
+from services.keyword_matcher import KeywordMatcher
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_case_insensitive_first_match(self):
+        matcher = KeywordMatcher(["BadWord", "spam"])
+        self.assertEqual(matcher.find_first("hello SPAM and badword"), "spam")
+        self.assertIsNone(matcher.find_first("hello good world"))
+
+    def test_overlapping_keywords(self):
+        # "he", "she", "hers" overlap; all of them must be reported
+        matcher = KeywordMatcher(["he", "she", "hers", "his"])
+        self.assertEqual(matcher.find_all("ushers"), ["she", "he", "hers"])
+
+    def test_blank_and_duplicate_keywords_ignored(self):
+        matcher = KeywordMatcher(["", "  ", "Spam", "spam "])
+        self.assertEqual(len(matcher), 1)
+        self.assertEqual(matcher.find_all("spam spam"), ["Spam"])
+
+    def test_empty_matcher(self):
+        matcher = KeywordMatcher([])
+        self.assertFalse(matcher)
+        self.assertEqual(matcher.find_all("anything"), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from aiogram.methods import SendDocument, SendMediaGroup, SendMessage, SendPhoto, SendVoice
+from aiogram.types import Chat, Document, Message, PhotoSize, Sticker, Video
+from database.models import Post, PostItem
+from services.post_content import AlbumCollector, album_items, message_content
+from services.post_payloads import PostPayloadCache, build_method
+
+def message(message_id, **fields):
+    return Message(message_id=message_id, date=datetime(2024, 1, 1), chat=Chat(id=1, type="private"), **fields)
+
+class TestPostPayloads(unittest.TestCase):
+    def test_payload_reused_until_edited(self):
+        cache = PostPayloadCache(max_size=10)
+        post = Post(
+            id=1, content_type="text", text="Hello world", version=1,
+            entities=json.dumps([{"type": "bold", "offset": 0, "length": 5}])
+        )
+
+        first = cache.get(post, -100)
+        self.assertIsInstance(first, SendMessage)
+        self.assertEqual(first.chat_id, -100)
+        self.assertEqual(first.entities[0].type, "bold")
+        # Same object, nothing parsed again
+        self.assertIs(cache.get(post, -100), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # An edit in another process is noticed through the version
+        post.content_type, post.file_id, post.caption, post.entities, post.version = "photo", "FILE", "New", None, 2
+        second = cache.get(post, -100)
+        self.assertIsInstance(second, SendPhoto)
+        self.assertEqual(second.photo, "FILE")
+
+        cache.invalidate(1)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get(Post(id=2, content_type="sticker", version=1), -100))
+
+    def test_lru_bound(self):
+        cache = PostPayloadCache(max_size=2)
+        for post_id in range(3):
+            cache.get(Post(id=post_id, content_type="text", text="x", version=1), -1)
+        self.assertEqual(len(cache), 2)
+
+    def test_extended_types(self):
+        document = build_method(Post(id=1, content_type="document", file_id="DOC", caption="Menu", version=1), -1)
+        self.assertIsInstance(document, SendDocument)
+        self.assertEqual(document.document, "DOC")
+        self.assertIsInstance(build_method(Post(id=2, content_type="voice", file_id="VOICE", version=1), -1), SendVoice)
+
+    def test_album_is_one_media_group(self):
+        items = [
+            PostItem(position=0, content_type="photo", file_id="P1", caption="Sale",
+                     entities=json.dumps([{"type": "bold", "offset": 0, "length": 4}])),
+            PostItem(position=1, content_type="video", file_id="V1"),
+        ]
+        cache = PostPayloadCache()
+        post = Post(id=1, content_type="album", version=1)
+
+        self.assertFalse(cache.cached(post, -1))
+        method = cache.get(post, -1, items)
+        self.assertIsInstance(method, SendMediaGroup)
+        self.assertEqual([m.media for m in method.media], ["P1", "V1"])
+        self.assertEqual(method.media[0].caption_entities[0].type, "bold")
+        # Once prepared the items are not needed again
+        self.assertTrue(cache.cached(post, -1))
+        self.assertIs(cache.get(post, -1), method)
+        self.assertIsNone(build_method(Post(id=2, content_type="album", version=1), -1, []))
+
+class TestPostContent(unittest.IsolatedAsyncioTestCase):
+    async def test_message_content(self):
+        photo = message(1, photo=[PhotoSize(file_id="small", file_unique_id="s", width=90, height=90),
+                                  PhotoSize(file_id="big", file_unique_id="b", width=900, height=900)], caption="Hi")
+        self.assertEqual(message_content(photo)["file_id"], "big")
+        document = message(2, document=Document(file_id="DOC", file_unique_id="d"))
+        self.assertEqual(message_content(document)["content_type"], "document")
+        sticker = message(3, sticker=Sticker(file_id="S", file_unique_id="s", type="regular", width=1, height=1,
+                                             is_animated=False, is_video=False))
+        self.assertIsNone(message_content(sticker))
+
+    async def test_album_messages_become_one_post(self):
+        collector = AlbumCollector(delay=0.05)
+        parts = [
+            message(12, media_group_id="A", video=Video(file_id="V", file_unique_id="v", width=1, height=1, duration=1)),
+            message(11, media_group_id="A", photo=[PhotoSize(file_id="P", file_unique_id="p", width=1, height=1)], caption="Sale"),
+        ]
+        results = await asyncio.gather(*(collector.collect(part) for part in parts))
+
+        self.assertIsNone(results[1])
+        items = album_items(results[0])
+        self.assertEqual([(i.position, i.content_type, i.file_id) for i in items], [(0, "photo", "P"), (1, "video", "V")])
+        self.assertEqual(items[0].caption, "Sale")
+
+if __name__ == "__main__":
+    unittest.main()
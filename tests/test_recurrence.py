@@ -0,0 +1,64 @@
+import unittest
+from datetime import date, datetime, timezone
+from database.models import Group, ScheduleTimes
+from services.recurrence import TZ, describe, group_tz, next_run, next_run_utc, parse_rule
+
+def local(*args):
+    return TZ.localize(datetime(*args))
+
+class TestRecurrence(unittest.TestCase):
+    def test_daily_and_one_time(self):
+        daily = ScheduleTimes(time="09:00", is_recurring=1)
+        self.assertEqual(next_run(daily, local(2024, 1, 1, 8, 0)), local(2024, 1, 1, 9, 0))
+        # Strictly after: a run that just fired moves to the next day
+        self.assertEqual(next_run(daily, local(2024, 1, 1, 9, 0)), local(2024, 1, 2, 9, 0))
+        self.assertEqual(next_run_utc(daily, local(2024, 1, 1, 8, 0)), datetime(2024, 1, 1, 4, 0))
+
+        self.assertIsNone(next_run(ScheduleTimes(time="25:00", is_recurring=1), local(2024, 1, 1, 8, 0)))
+
+    def test_weekdays_hours_and_dates(self):
+        # 2024-01-01 is a Monday
+        weekly = ScheduleTimes(time="10:00", **parse_rule("du,ju"))
+        self.assertEqual(next_run(weekly, local(2024, 1, 1, 11, 0)), local(2024, 1, 5, 10, 0))
+        self.assertEqual(next_run(weekly, local(2024, 1, 5, 11, 0)), local(2024, 1, 8, 10, 0))
+
+        hourly = ScheduleTimes(time="09:30", **parse_rule("5h"))
+        self.assertEqual(next_run(hourly, local(2024, 1, 1, 10, 0)), local(2024, 1, 1, 14, 30))
+        self.assertEqual(next_run(hourly, local(2024, 1, 1, 19, 30)), local(2024, 1, 2, 9, 30))
+
+        ranged = ScheduleTimes(time="08:00", **parse_rule("2024-02-01 2024-01-20"))
+        self.assertEqual(ranged.start_date, date(2024, 1, 20))
+        self.assertEqual(next_run(ranged, local(2024, 1, 1, 0, 0)), local(2024, 1, 20, 8, 0))
+        self.assertIsNone(next_run(ranged, local(2024, 2, 1, 8, 0)))
+
+        once = ScheduleTimes(time="12:00", **parse_rule("2024-03-08"))
+        self.assertEqual(once.is_recurring, 0)
+        self.assertEqual(next_run(once, local(2024, 1, 1, 0, 0)), local(2024, 3, 8, 12, 0))
+        self.assertIsNone(next_run(once, local(2024, 3, 9, 0, 0)))
+        self.assertEqual(describe(once), "12:00, 2024-03-08, bir martalik")
+
+    def test_dst_and_group_timezones(self):
+        berlin = group_tz(Group(timezone="Europe/Berlin"))
+        self.assertIs(group_tz(Group(timezone=None)), TZ)
+        self.assertIs(group_tz(Group(timezone="Mars/Base")), TZ)
+
+        daily = ScheduleTimes(time="09:00", is_recurring=1)
+        # Same wall-clock time, different UTC instant across the spring-forward jump
+        self.assertEqual(next_run_utc(daily, local(2024, 3, 30, 0, 0), berlin), datetime(2024, 3, 30, 8, 0))
+        self.assertEqual(next_run_utc(daily, local(2024, 3, 31, 0, 0), berlin), datetime(2024, 3, 31, 7, 0))
+
+        # 02:30 does not exist on 2024-03-31 in Berlin and fires at 03:30 instead
+        skipped = ScheduleTimes(time="02:30", is_recurring=1)
+        self.assertEqual(next_run(skipped, berlin.localize(datetime(2024, 3, 31, 0, 0)), berlin).strftime("%H:%M %Z"), "03:30 CEST")
+        # 02:30 happens twice on 2024-10-27 and fires once
+        first = next_run_utc(skipped, berlin.localize(datetime(2024, 10, 27, 0, 0)), berlin)
+        self.assertEqual(first, datetime(2024, 10, 27, 1, 30))
+        self.assertEqual(next_run_utc(skipped, first.replace(tzinfo=timezone.utc), berlin), datetime(2024, 10, 28, 1, 30))
+
+    def test_invalid_rules(self):
+        for text in ("har kuni", "30h", "2024-01-01 2024-01-02 2024-01-03", "du,xx"):
+            with self.assertRaises(ValueError):
+                parse_rule(text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import random
+import unittest
+from collections import Counter
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, Group, Post
+from services.rotation import append_post, backfill_rotation, pick_posts, rebuild_weights
+
+async def build_database():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Same options as database/engine.py
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    return engine, Session
+
+async def add_posts(session, group_id, ids, weights=None):
+    # As in the app, the group is in the database before posts are added to it
+    await session.flush()
+    for post_id in ids:
+        post = Post(id=post_id, group_id=group_id, content_type="text", text=f"post {post_id}", weight=(weights or {}).get(post_id, 1))
+        session.add(post)
+        await append_post(session, post)
+    await session.commit()
+
+async def fire(session, group, times, rng=random):
+    picked = []
+    for _ in range(times):
+        picked.append((await pick_posts(session, [group], rng))[group.id])
+    await session.commit()
+    return picked
+
+class TestRotation(unittest.IsolatedAsyncioTestCase):
+    async def test_sequential_follows_ids_and_wraps(self):
+        engine, Session = await build_database()
+        async with Session() as session:
+            group = Group(id=1, telegram_id=-1, title="G1", rotation_mode="sequential")
+            session.add(group)
+            await add_posts(session, 1, [12, 10, 11])
+
+            self.assertEqual(await fire(session, group, 4), [10, 11, 12, 10])
+
+            # A deleted post is skipped, a new one takes its place in id order
+            await session.delete(await session.get(Post, 11))
+            await add_posts(session, 1, [20])
+            self.assertEqual(await fire(session, group, 4), [12, 20, 10, 12])
+        await engine.dispose()
+
+    async def test_shuffle_sends_every_post_once_per_cycle(self):
+        engine, Session = await build_database()
+        async with Session() as session:
+            group = Group(id=1, telegram_id=-1, title="G1", rotation_mode="shuffle")
+            session.add(group)
+            await add_posts(session, 1, range(1, 6))
+
+            picked = await fire(session, group, 25)
+        for cycle in range(5):
+            self.assertEqual(sorted(picked[cycle * 5:cycle * 5 + 5]), [1, 2, 3, 4, 5])
+        # Not even across a reshuffle does a post come twice in a row
+        self.assertTrue(all(a != b for a, b in zip(picked, picked[1:])))
+        await engine.dispose()
+
+    async def test_weighted_follows_weights(self):
+        engine, Session = await build_database()
+        async with Session() as session:
+            group = Group(id=1, telegram_id=-1, title="G1", rotation_mode="weighted")
+            session.add(group)
+            await add_posts(session, 1, [1, 2, 3], weights={1: 1, 2: 3, 3: 6})
+
+            counts = Counter(await fire(session, group, 300, random.Random(7)))
+            self.assertTrue(10 < counts[1] < 50)
+            self.assertTrue(60 < counts[2] < 120)
+            self.assertTrue(150 < counts[3] < 210)
+
+            # Deleting a post rebuilds the ranges instead of handing its share to a neighbour
+            await session.delete(await session.get(Post, 3))
+            await rebuild_weights(session, 1)
+            await session.commit()
+            counts = Counter(await fire(session, group, 100, random.Random(7)))
+            self.assertEqual(set(counts), {1, 2})
+            self.assertTrue(10 < counts[1] < 40)
+        await engine.dispose()
+
+    async def test_rebuild_sees_unflushed_changes(self):
+        engine, Session = await build_database()
+        async with Session() as session:
+            group = Group(id=1, telegram_id=-1, title="G1", rotation_mode="weighted")
+            session.add(group)
+            await add_posts(session, 1, [1, 2, 3])
+
+            # Deleting the first post (as the admin handlers do, without a flush)
+            await session.delete(await session.get(Post, 1))
+            await rebuild_weights(session, 1)
+            await session.commit()
+            self.assertEqual(group.rotation_weight_total, 2)
+            offsets = (await session.execute(select(Post.weight_offset).order_by(Post.id))).scalars().all()
+            self.assertEqual(offsets, [0, 1])
+            # No point falls outside the ranges, so no slot is skipped
+            self.assertEqual(len(await fire(session, group, 30, random.Random(7))), 30)
+            self.assertNotIn(None, await fire(session, group, 30, random.Random(7)))
+
+            # Reweighting
+            post = await session.get(Post, 2)
+            post.weight = 4
+            await rebuild_weights(session, 1)
+            await session.commit()
+            self.assertEqual(group.rotation_weight_total, 5)
+        await engine.dispose()
+
+    async def test_one_query_for_all_groups(self):
+        engine, Session = await build_database()
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        async with Session() as session:
+            modes = ["sequential", "weighted", "shuffle"]
+            groups = [Group(id=g, telegram_id=-g, title=f"G{g}", rotation_mode=modes[g % 3]) for g in range(1, 31)]
+            session.add_all(groups)
+            for group in groups:
+                await add_posts(session, group.id, range(group.id * 100, group.id * 100 + 10))
+
+            statements.clear()
+            picks = await pick_posts(session, groups)
+        self.assertEqual(len([s for s in statements if s.lstrip().upper().startswith("SELECT")]), 1)
+        self.assertEqual(len(picks), 30)
+        self.assertTrue(all(picks[g] // 100 == g for g in picks))
+        self.assertEqual(picks[3], 300)
+        await engine.dispose()
+
+    async def test_backfill_continues_the_old_index(self):
+        engine, Session = await build_database()
+        async with Session() as session:
+            group = Group(id=1, telegram_id=-1, title="G1", next_post_index=2)
+            session.add(group)
+            session.add_all([Post(id=i, group_id=1, content_type="text", text="x", weight=1) for i in (5, 7, 9)])
+            await session.commit()
+
+            self.assertEqual(await backfill_rotation(session), 1)
+            await session.refresh(group)
+            self.assertEqual(group.rotation_weight_total, 3)
+            self.assertEqual(group.rotation_cursor, 7)
+            offsets = (await session.execute(select(Post.weight_offset).order_by(Post.id))).scalars().all()
+            self.assertEqual(offsets, [0, 1, 2])
+            self.assertEqual(await fire(session, group, 2), [9, 5])
+        await engine.dispose()
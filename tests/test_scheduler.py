@@ -0,0 +1,378 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from aiogram.methods import SendMediaGroup
+from database.models import Base, Delivery, Group, Post, PostItem, ScheduleTimes
+from services.recurrence import TZ, backfill_next_run_at
+from services.schedule_index import ScheduleIndex
+from services import scheduler
+from services.dispatch import Dispatcher
+from services.outbox import Outbox
+from services.post_payloads import PostPayloadCache
+
+class TestScheduleIndex(unittest.TestCase):
+    def test_heap_order(self):
+        index = ScheduleIndex()
+        index.add(1, datetime(2024, 1, 1, 4, 0))
+        index.add(2, datetime(2024, 1, 1, 4, 0))
+        index.add(3, datetime(2024, 1, 1, 18, 59))
+        index.add(4, None)  # no runs left, never fires
+
+        self.assertEqual(index.due(datetime(2024, 1, 1, 4, 0)), {1, 2})
+        self.assertEqual(index.due(datetime(2024, 1, 1, 3, 59)), set())
+        self.assertEqual(len(index), 3)
+
+        # Re-adding moves the schedule, removing clears it; due ids stay until advanced
+        index.add(1, datetime(2024, 1, 1, 5, 30))
+        index.remove(2)
+        self.assertEqual(index.due(datetime(2024, 1, 1, 4, 0)), set())
+        self.assertEqual(index.due(datetime(2024, 1, 1, 6, 0)), {1})
+        self.assertEqual(index.due(datetime(2024, 1, 1, 6, 0)), {1})
+        self.assertEqual(index.next_due(), datetime(2024, 1, 1, 5, 30))
+
+def at(*args):
+    """Tashkent wall-clock time, the default group timezone."""
+    return TZ.localize(datetime(*args))
+
+async def build_database(group_count: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+    async with Session() as session:
+        for g in range(1, group_count + 1):
+            session.add(Group(id=g, telegram_id=-g, title=f"G{g}", next_post_index=0))
+            session.add_all([Post(id=g * 10 + i, group_id=g, content_type="text", text=f"post {i}") for i in range(3)])
+            # One specific one-time post and one rotation slot per group at 09:00
+            session.add(ScheduleTimes(id=g * 2, group_id=g, post_id=g * 10, time="09:00", is_recurring=0))
+            session.add(ScheduleTimes(id=g * 2 + 1, group_id=g, post_id=None, time="09:00", is_recurring=1))
+        await session.commit()
+        await backfill_next_run_at(session, at(2024, 1, 1, 8, 0))
+
+        index = ScheduleIndex()
+        await index.load(session)
+    return engine, Session, index
+
+class TestSchedulerTick(unittest.IsolatedAsyncioTestCase):
+    def patch_scheduler(self, index, session_factory):
+        for name, value in (
+            ("schedule_index", index),
+            ("AsyncSessionLocal", session_factory),
+            ("dispatcher", Dispatcher(rate=0, chat_interval=0)),
+            ("outbox", Outbox(backoff=60, grace_minutes=30, index=index)),
+            ("post_payloads", PostPayloadCache()),
+            ("SCHEDULER_PRESTAGE_SECONDS", 0),
+        ):
+            patcher = patch.object(scheduler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_empty_slot_runs_no_query(self):
+        index = ScheduleIndex()
+        index.loaded = True
+        session = AsyncMock()
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__.return_value = session
+        self.patch_scheduler(index, session_factory)
+
+        await scheduler.check_scheduled_posts(AsyncMock())
+
+        session.execute.assert_not_called()
+
+    async def test_tick_uses_set_based_queries(self):
+        engine, Session, index = await build_database(20)
+        self.patch_scheduler(index, Session)
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        bot = AsyncMock()
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0))
+
+        self.assertEqual(bot.await_count, 40)
+        # Plan (schedules, rotation picks), claim (ids, rows) and next-retry lookup, whatever the group count
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 5)
+
+        async with Session() as session:
+            remaining = (await session.execute(select(ScheduleTimes))).scalars().all()
+            groups = (await session.execute(select(Group))).scalars().all()
+            sent = (await session.execute(select(Delivery).where(Delivery.status == "sent"))).scalars().all()
+        self.assertEqual(len(remaining), 20)
+        self.assertEqual(len(sent), 40)
+        # Each rotation slot took its group's lowest post id
+        self.assertTrue(all(g.rotation_cursor == g.id * 10 for g in groups))
+        # Recurring schedules moved to tomorrow 09:00 Tashkent (04:00 UTC)
+        self.assertTrue(all(s.next_run_at == datetime(2024, 1, 2, 4, 0) for s in remaining))
+        self.assertEqual(index.next_due(), datetime(2024, 1, 2, 4, 0))
+        await engine.dispose()
+
+    async def test_same_slot_is_sent_once(self):
+        engine, Session, index = await build_database(2)
+        self.patch_scheduler(index, Session)
+        bot = AsyncMock()
+
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0))
+        # A duplicate tick and a restart inside the grace window
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0, 30))
+        await scheduler.catch_up_missed_posts(bot, now=at(2024, 1, 1, 9, 10))
+        self.assertEqual(bot.await_count, 4)
+
+        # A process that did not see next_run_at advance plans the same occurrence again
+        async with Session() as session:
+            schedule = await session.get(ScheduleTimes, 3)
+            schedule.next_run_at = datetime(2024, 1, 1, 4, 0)
+            await session.commit()
+        index.add(3, datetime(2024, 1, 1, 4, 0))
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 11))
+
+        self.assertEqual(bot.await_count, 4)
+        await engine.dispose()
+
+    async def test_failed_send_is_retried_with_backoff(self):
+        engine, Session, index = await build_database(1)
+        self.patch_scheduler(index, Session)
+        bot = AsyncMock()
+        bot.side_effect = [Exception("Bad Gateway"), None, None]
+
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0))
+        self.assertEqual(bot.await_count, 2)
+
+        async with Session() as session:
+            failed = (await session.execute(select(Delivery).where(Delivery.status == "pending"))).scalar_one()
+        self.assertEqual(failed.attempts, 1)
+        self.assertEqual(failed.last_error, "Bad Gateway")
+        self.assertIsNotNone(scheduler.outbox.next_retry_at)
+
+        # Not before the 60s backoff, then on the next tick although nothing is scheduled for it
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0, 30))
+        self.assertEqual(bot.await_count, 2)
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 1, 1))
+        self.assertEqual(bot.await_count, 3)
+        self.assertIsNone(scheduler.outbox.next_retry_at)
+        await engine.dispose()
+
+    async def test_prestaged_sends_wait_for_their_minute(self):
+        engine, Session, index = await build_database(2)
+        self.patch_scheduler(index, Session)
+        patcher = patch.object(scheduler, "SCHEDULER_PRESTAGE_SECONDS", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        send_times = []
+        bot = AsyncMock(side_effect=lambda method: send_times.append(asyncio.get_running_loop().time()))
+
+        # Woken 2s early: 200ms before 09:00 everything is planned and claimed, then released on the minute
+        self.assertEqual(scheduler.seconds_until_next(datetime(2024, 1, 1, 3, 59, 0)), 58)
+        started = asyncio.get_running_loop().time()
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 8, 59, 59, 800000))
+        self.assertEqual(bot.await_count, 4)
+        self.assertGreaterEqual(min(send_times) - started, 0.19)
+
+        async with Session() as session:
+            deliveries = (await session.execute(select(Delivery))).scalars().all()
+            stats = await scheduler.outbox.stats(session, datetime(2024, 1, 1))
+        self.assertEqual({d.status for d in deliveries}, {"sent"})
+        self.assertTrue(all(0 <= d.lateness_ms < 500 for d in deliveries))
+        self.assertEqual(stats["sent"], 4)
+        self.assertLess(stats["lateness_max"], 0.5)
+        await engine.dispose()
+
+    async def test_planning_time_counts_towards_release_and_lateness(self):
+        engine, Session, index = await build_database(1)
+        self.patch_scheduler(index, Session)
+        patcher = patch.object(scheduler, "SCHEDULER_PRESTAGE_SECONDS", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        plan = scheduler.outbox.plan
+
+        async def slow_plan(*args, **kwargs):
+            await asyncio.sleep(0.3)
+            return await plan(*args, **kwargs)
+
+        scheduler.outbox.plan = slow_plan
+        send_times = []
+        bot = AsyncMock(side_effect=lambda method: send_times.append(asyncio.get_running_loop().time()))
+
+        # Due 100ms after the tick, but planning takes 300ms: no extra wait, and 200ms late
+        started = asyncio.get_running_loop().time()
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 8, 59, 59, 900000))
+        self.assertEqual(bot.await_count, 2)
+        self.assertLess(max(send_times) - started, 0.38)
+
+        async with Session() as session:
+            deliveries = (await session.execute(select(Delivery))).scalars().all()
+        self.assertTrue(all(150 <= d.lateness_ms < 300 for d in deliveries))
+        await engine.dispose()
+
+    async def test_album_goes_out_in_one_call(self):
+        engine, Session, index = await build_database(1)
+        async with Session() as session:
+            post = await session.get(Post, 10)
+            post.content_type, post.text = "album", None
+            session.add_all([PostItem(post_id=10, position=i, content_type="photo", file_id=f"P{i}") for i in range(3)])
+            await session.commit()
+        self.patch_scheduler(index, Session)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        bot = AsyncMock()
+
+        await scheduler.check_scheduled_posts(bot, now=at(2024, 1, 1, 9, 0))
+
+        # The specific slot and the rotation slot (which starts at post 10) both send the album
+        albums = [c.args[0] for c in bot.await_args_list if isinstance(c.args[0], SendMediaGroup)]
+        self.assertEqual(bot.await_count, 2)
+        self.assertEqual(len(albums), 2)
+        self.assertEqual([m.media for m in albums[0].media], ["P0", "P1", "P2"])
+        # Items read once, for the payload that was not prepared yet
+        self.assertEqual(len([s for s in statements if "post_items" in s]), 1)
+        await engine.dispose()
+
+    async def test_catch_up_after_downtime(self):
+        engine, Session, index = await build_database(3)
+        self.patch_scheduler(index, Session)
+        bot = AsyncMock()
+
+        # Down from 08:50 to 09:20: the 09:00 slot is inside the 30 minute grace window
+        await scheduler.catch_up_missed_posts(bot, now=at(2024, 1, 1, 9, 20))
+        self.assertEqual(bot.await_count, 6)
+
+        # Down for a whole day: nothing older than the window is sent
+        await scheduler.catch_up_missed_posts(bot, now=at(2024, 1, 2, 10, 0))
+        self.assertEqual(bot.await_count, 6)
+        await engine.dispose()
+
+    async def test_catch_up_steps_through_hourly_runs(self):
+        engine, Session, index = await build_database(1)
+        async with Session() as session:
+            schedule = await session.get(ScheduleTimes, 3)
+            schedule.every_hours = 1
+            await session.commit()
+        self.patch_scheduler(index, Session)
+        scheduler.outbox.grace_minutes = 90
+        bot = AsyncMock()
+
+        # Down from 08:50 to 11:20: the 09:00 runs are older than the window and expire,
+        # the hourly 10:00 and 11:00 ones inside it are still sent
+        await scheduler.catch_up_missed_posts(bot, now=at(2024, 1, 1, 11, 20))
+        async with Session() as session:
+            sent = (await session.execute(select(Delivery.fire_at).order_by(Delivery.fire_at))).scalars().all()
+            schedule = await session.get(ScheduleTimes, 3)
+        self.assertEqual(sent, [datetime(2024, 1, 1, 5, 0), datetime(2024, 1, 1, 6, 0)])
+        self.assertEqual(bot.await_count, 2)
+        # Next run is 12:00 Tashkent
+        self.assertEqual(schedule.next_run_at, datetime(2024, 1, 1, 7, 0))
+
+        # Planned runs are not planned twice by a replica that still sees an old next_run_at
+        async with Session() as session:
+            schedule = await session.get(ScheduleTimes, 3)
+            schedule.next_run_at = datetime(2024, 1, 1, 5, 0)
+            await session.commit()
+        index.add(3, datetime(2024, 1, 1, 5, 0))
+        await scheduler.catch_up_missed_posts(bot, now=at(2024, 1, 1, 11, 25))
+        self.assertEqual(bot.await_count, 2)
+        await engine.dispose()
+
+    async def test_group_timezone_and_sleep(self):
+        engine, Session, index = await build_database(2)
+        async with Session() as session:
+            group = await session.get(Group, 2)
+            group.timezone = "Europe/Berlin"
+            for schedule in (await session.execute(select(ScheduleTimes).where(ScheduleTimes.group_id == 2))).scalars():
+                schedule.next_run_at = None
+            await session.commit()
+            await backfill_next_run_at(session, at(2024, 1, 1, 8, 0))
+            await index.load(session)
+        self.patch_scheduler(index, Session)
+        bot = AsyncMock()
+
+        # 09:00 Tashkent is 04:00 UTC, 09:00 Berlin is 08:00 UTC
+        self.assertEqual(scheduler.seconds_until_next(datetime(2024, 1, 1, 3, 0)), 3600)
+        await scheduler.check_scheduled_posts(bot, now=datetime(2024, 1, 1, 4, 0))
+        self.assertEqual({c.args[0].chat_id for c in bot.await_args_list}, {-1})
+        self.assertEqual(index.next_due(), datetime(2024, 1, 1, 8, 0))
+        self.assertEqual(scheduler.seconds_until_next(datetime(2024, 1, 1, 7, 30)), 1800)
+
+        await scheduler.check_scheduled_posts(bot, now=datetime(2024, 1, 1, 8, 0))
+        self.assertEqual(bot.await_count, 4)
+        await engine.dispose()
+
+    async def test_added_schedule_wakes_the_loop(self):
+        index = ScheduleIndex()
+        waiter = asyncio.create_task(index.wait(60))
+        await asyncio.sleep(0)
+        index.add(1, datetime(2024, 1, 1, 4, 0))
+        await asyncio.wait_for(waiter, 1)
+
+class TestReplicas(unittest.IsolatedAsyncioTestCase):
+    async def test_two_replicas_send_each_post_once(self):
+        engine, Session, index_a = await build_database(3)
+        async with Session() as session:
+            index_b = ScheduleIndex()
+            await index_b.load(session)
+        replica_a = Outbox(grace_minutes=30, index=index_a, replica_id="a", lease_seconds=60)
+        replica_b = Outbox(grace_minutes=30, index=index_b, replica_id="b", lease_seconds=60)
+        now = datetime(2024, 1, 1, 4, 0)
+
+        # Both indexes say the 09:00 schedules are due; the second replica finds them planned
+        async with Session() as session:
+            self.assertEqual(await replica_a.plan(session, index_a.due(now), now), 6)
+            await session.commit()
+        async with Session() as session:
+            self.assertEqual(await replica_b.plan(session, index_b.due(now), now), 0)
+            await session.commit()
+        # ...and learns their next run instead of firing them again
+        self.assertEqual(index_b.due(now), set())
+        self.assertEqual(index_b.next_due(), datetime(2024, 1, 2, 4, 0))
+
+        async with Session() as session:
+            claimed_a = await replica_a.claim(session, now)
+        async with Session() as session:
+            claimed_b = await replica_b.claim(session, now)
+        self.assertEqual(len(claimed_a), 6)
+        self.assertEqual(claimed_b, [])
+        self.assertTrue(all(d.status == "sending" and d.claimed_by == "a" for d, _, _, _ in claimed_a))
+
+        # Replica a dies mid-send: its lease runs out and b takes the posts over
+        async with Session() as session:
+            await replica_b.load_next_retry(session)
+            self.assertEqual(replica_b.next_retry_at, now + timedelta(seconds=60))
+            claimed_b = await replica_b.claim(session, now + timedelta(seconds=61))
+        self.assertEqual({d.id for d, _, _, _ in claimed_b}, {d.id for d, _, _, _ in claimed_a})
+        self.assertTrue(all(d.claimed_by == "b" for d, _, _, _ in claimed_b))
+        await engine.dispose()
+
+    async def test_deleted_schedule_is_not_claimed(self):
+        engine, Session, index = await build_database(1)
+        outbox = Outbox(grace_minutes=30, index=index, replica_id="a", lease_seconds=60)
+        now = datetime(2024, 1, 1, 4, 0)
+        async with Session() as session:
+            self.assertEqual(await outbox.plan(session, index.due(now), now), 2)
+            await session.commit()
+
+        # The admin deletes the rotation slot between planning and sending
+        async with Session() as session:
+            await session.delete(await session.get(ScheduleTimes, 3))
+            await session.commit()
+        async with Session() as session:
+            claimed = await outbox.claim(session, now)
+        self.assertEqual([d.schedule_id for d, _, _, _ in claimed], [2])
+        async with Session() as session:
+            orphan = (await session.execute(select(Delivery).where(Delivery.schedule_id == 3))).scalar_one()
+            # Left as it was, not leased to a replica that will never send it
+            self.assertEqual((orphan.status, orphan.claimed_by), ("pending", None))
+
+            # The admin handlers expire it along with the schedule
+            self.assertEqual(await outbox.cancel_schedule(session, 3), 1)
+            await session.commit()
+            await session.refresh(orphan)
+            self.assertEqual(orphan.status, "expired")
+        await engine.dispose()
+
+if __name__ == "__main__":
+    unittest.main()
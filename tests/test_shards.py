@@ -0,0 +1,69 @@
+import asyncio
+import queue
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from services.outbox import Outbox
+from services.schedule_index import ScheduleIndex
+from services.shards import ShardSupervisor, _apply_changes, shard_dispatcher
+from tests.test_scheduler import build_database
+
+class TestShards(unittest.IsolatedAsyncioTestCase):
+    async def test_outbox_shards_split_groups(self):
+        engine, Session, _ = await build_database(5)
+        now = datetime(2024, 1, 1, 4, 0)
+        planned = {}
+        for shard in range(2):
+            index = ScheduleIndex()
+            index.shard = (shard, 2)
+            outbox = Outbox(grace_minutes=30, index=index)
+            outbox.shard = (shard, 2)
+            async with Session() as session:
+                await index.load(session)
+                await outbox.plan(session, index.due(now), now)
+                await session.commit()
+                planned[shard] = {group.id for _, group, _, _ in await outbox.claim(session, now)}
+
+        # Every group is planned and claimed by exactly one shard
+        self.assertEqual(planned[0], {2, 4})
+        self.assertEqual(planned[1], {1, 3, 5})
+        await engine.dispose()
+
+    def test_workers_share_the_send_rate(self):
+        # Broadcasts' share is set aside, the rest split between the workers
+        with patch("config.SEND_RATE", 24.0), patch("config.BROADCAST_RATE", 8.0):
+            self.assertEqual(shard_dispatcher(4).bucket.rate, 4.0)
+        # Unlimited stays unlimited
+        with patch("config.SEND_RATE", 0.0):
+            self.assertEqual(shard_dispatcher(4).bucket.rate, 0.0)
+
+    def test_supervisor_routes_changes(self):
+        supervisor = ShardSupervisor(3)
+        supervisor.queues = [queue.Queue() for _ in range(3)]
+        index = ScheduleIndex()
+        index.subscribe(supervisor.publish)
+
+        index.add(10, datetime(2024, 1, 1, 4, 0), group_id=4)
+        index.remove(11)
+
+        self.assertEqual(supervisor.queues[1].get_nowait(), ("add", 10, datetime(2024, 1, 1, 4, 0)))
+        for q in supervisor.queues:
+            self.assertEqual(q.get_nowait(), ("remove", 11, None))
+            self.assertTrue(q.empty())
+
+    async def test_worker_applies_changes(self):
+        index = ScheduleIndex()
+        changes = queue.Queue()
+        for message in (("add", 1, datetime(2024, 1, 1, 4, 0)), ("add", 2, datetime(2024, 1, 1, 5, 0)), ("remove", 1, None), None):
+            changes.put(message)
+
+        stop = asyncio.Event()
+        with patch("services.schedule_index.schedule_index", index):
+            await _apply_changes(changes, stop)
+
+        self.assertTrue(stop.is_set())
+        self.assertEqual(index.next_due(), datetime(2024, 1, 1, 5, 0))
+        self.assertEqual(len(index), 1)
+
+if __name__ == "__main__":
+    unittest.main()
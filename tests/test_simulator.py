@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+from services import scheduler
+from services.simulator import Snapshot, run_simulation
+
+START = datetime(2024, 1, 1)
+
+def snapshot(group_count, times, every_hours=None):
+    groups, posts, schedules = [], [], []
+    for g in range(1, group_count + 1):
+        groups.append({"id": g, "telegram_id": -g, "title": f"G{g}", "timezone": "UTC", "next_post_index": 0, "rotation_mode": "sequential"})
+        posts += [{"id": g * 10 + i, "group_id": g, "content_type": "text", "text": "x", "version": 1, "weight": 1} for i in range(2)]
+        for i, at in enumerate(times):
+            schedules.append({
+                "id": g * 10 + i, "group_id": g, "post_id": None, "time": at,
+                "is_recurring": 1, "every_hours": every_hours, "next_run_at": START
+            })
+    return Snapshot({"groups": groups, "posts": posts, "post_items": [], "schedule_times": schedules})
+
+class TestSimulator(unittest.TestCase):
+    def test_day_of_schedules(self):
+        saved = scheduler.dispatcher
+        report = run_simulation(snapshot(3, ["09:00", "18:30"]), START, hours=24, latency=0)
+
+        self.assertEqual(report.per_group, {"G1": 2, "G2": 2, "G3": 2})
+        self.assertEqual((report.deliveries, report.sent, report.failed), (6, 6, 0))
+        self.assertEqual(report.peak_minute, (datetime(2024, 1, 1, 9, 0), 3))
+        self.assertEqual(sum(report.per_minute.values()), 6)
+        self.assertTrue(max(report.lateness) < 1)
+        # The scheduler's own state is back in place
+        self.assertIs(scheduler.dispatcher, saved)
+
+    def test_rate_limit_shows_as_lateness(self):
+        # 20 groups at the same minute through 2 sends/s: the last waits about 10s
+        report = run_simulation(snapshot(20, ["12:00"]), START, hours=24, rate=2, latency=0)
+        self.assertEqual(report.sent, 20)
+        self.assertTrue(8 < max(report.lateness) < 12)
+        self.assertTrue(report.lateness_percentile(0.5) > 3)
+        self.assertEqual(sum(report.per_minute.values()), 20)
+
+    def test_range_and_fast_forward(self):
+        # Every 2 hours from 00:00: 6 runs in the first 12 hours, replayed in (real) seconds
+        report = run_simulation(snapshot(1, ["00:00"], every_hours=2), START, hours=12, latency=0)
+        self.assertEqual(report.per_group, {"G1": 6})
+        self.assertEqual(report.end, datetime(2024, 1, 1, 12, 0))
+        self.assertTrue(report.wall_seconds < 10)
+        self.assertIn("6 sent", report.format())
@@ -0,0 +1,53 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock
+from services.spam_actions import SpamAction, SpamActionQueue
+from services.spam_digest import SpamDigest
+
+class TestSpamActions(unittest.IsolatedAsyncioTestCase):
+    async def test_digest_coalesces_notifications(self):
+        queue = SpamActionQueue(max_size=100, workers=2, digest=SpamDigest(window=0.05, samples=2))
+        bot = AsyncMock()
+
+        for i in range(5):
+            queue.enqueue(SpamAction(
+                bot=bot,
+                chat_id=-100 - (i % 2),
+                message_id=i,
+                group_title=f"Group {i % 2}",
+                owner_telegram_id=42,
+                keyword="casino" if i < 3 else "crypto"
+            ))
+        await queue.join()
+
+        # Every message is deleted, only the first samples are forwarded
+        self.assertEqual(bot.delete_message.call_count, 5)
+        self.assertEqual(bot.forward_message.call_count, 2)
+        bot.send_message.assert_not_called()
+
+        await asyncio.sleep(0.1)
+
+        # One summary for the whole window
+        bot.send_message.assert_called_once()
+        text = bot.send_message.call_args.kwargs["text"]
+        self.assertIn("5 messages deleted", text)
+        self.assertIn("- casino: 3", text)
+        self.assertIn("- Group 0: 3", text)
+
+        await queue.stop()
+        print("Test Spam Digest: PASSED")
+
+    async def test_full_queue_drops(self):
+        queue = SpamActionQueue(max_size=1, workers=1)
+        bot = AsyncMock()
+        action = SpamAction(bot=bot, chat_id=-1, message_id=1, group_title="G", owner_telegram_id=None, keyword="x")
+
+        self.assertTrue(queue.enqueue(action))
+        self.assertFalse(queue.enqueue(action))
+        self.assertEqual(queue.stats()["dropped"], 1)
+
+        await queue.stop()
+        print("Test Full Queue: PASSED")
+
+if __name__ == "__main__":
+    unittest.main()
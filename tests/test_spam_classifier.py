@@ -0,0 +1,44 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from services.spam_classifier import ClassifierBatcher, SpamClassifier
+
+TEXTS = [
+    "free bonus casino win money now",
+    "crypto profit guaranteed join casino",
+    "win free money bonus link",
+    "see you at the meeting tomorrow",
+    "thanks for the homework answer",
+    "what time is the lesson today",
+]
+LABELS = [1, 1, 1, 0, 0, 0]
+
+class TestSpamClassifier(unittest.IsolatedAsyncioTestCase):
+    def test_train_score_and_reload(self):
+        model = SpamClassifier.train(TEXTS, LABELS, n_features=1 << 12)
+        spam, ham, empty = model.score(["casino bonus money", "meeting tomorrow lesson", ""])
+        self.assertGreater(spam, 0.5)
+        self.assertLess(ham, 0.5)
+        self.assertAlmostEqual(empty, 0.5, places=3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.npz")
+            model.save(path)
+            loaded = SpamClassifier.load(path)
+        self.assertEqual(list(loaded.score(["casino bonus money"])), list(model.score(["casino bonus money"])))
+
+    async def test_batcher_scores_concurrent_texts_together(self):
+        model = SpamClassifier.train(TEXTS, LABELS, n_features=1 << 12)
+        batcher = ClassifierBatcher(model, batch_size=3, max_delay=0.01)
+
+        calls = []
+        original = model.score
+        model.score = lambda texts: calls.append(len(texts)) or original(texts)
+
+        scores = await asyncio.gather(*(batcher.score(t) for t in ["casino bonus", "lesson today", "free money", "hello"]))
+        self.assertEqual(calls, [3, 1])
+        self.assertGreater(scores[0], scores[1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
 from aiogram.types import Message, Chat
@@ -9,8 +10,14 @@ from utils.spam_filter_test_helper import check_spam
 
 from middlewares.spam_filter import SpamFilterMiddleware
 from database.models import Group, Keyword, User
+from services.group_cache import GroupCache, group_cache
+from services.spam_actions import spam_actions
 
 class TestSpamFilter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Group/keyword cache is process-wide; start every test cold
+        group_cache.clear()
+
     async def test_spam_detection(self):
         # Setup Middleware
         middleware = SpamFilterMiddleware()
@@ -60,7 +67,10 @@ class TestSpamFilter(unittest.IsolatedAsyncioTestCase):
         # Side effect for session.execute
         # We can just return different mocks based on query or call count.
         # Simpler: use side_effect with an iterator
-        session.execute.side_effect = [mock_res_group, mock_res_kw, mock_res_owner]
+        mock_res_domains = MagicMock()
+        mock_res_domains.all.return_value = []
+        
+        session.execute.side_effect = [mock_res_group, mock_res_kw, mock_res_domains, mock_res_owner]
         
         # Run Middleware
         result = await middleware(handler, event, data)
@@ -69,8 +79,11 @@ class TestSpamFilter(unittest.IsolatedAsyncioTestCase):
         # Should not call handler (blocked)
         handler.assert_not_called()
         
+        # Deletion and notifications run in the background queue
+        await spam_actions.join()
+        
         # Should delete message
-        event.delete.assert_called_once()
+        event.bot.delete_message.assert_called_once_with(chat_id=-100123456789, message_id=123)
         
         # Should forward to owner
         event.bot.forward_message.assert_called_once_with(
@@ -105,7 +118,10 @@ class TestSpamFilter(unittest.IsolatedAsyncioTestCase):
         mock_res_kw = MagicMock()
         mock_res_kw.scalars().all.return_value = mock_keywords
         
-        session.execute.side_effect = [mock_res_group, mock_res_kw]
+        mock_res_domains = MagicMock()
+        mock_res_domains.all.return_value = []
+        
+        session.execute.side_effect = [mock_res_group, mock_res_kw, mock_res_domains]
         
         result = await middleware(handler, event, data)
         
@@ -114,8 +130,127 @@ class TestSpamFilter(unittest.IsolatedAsyncioTestCase):
         
         # Should NOT delete
         event.delete.assert_not_called()
+        self.assertEqual(spam_actions.stats()["depth"], 0)
         
         print("Test No Spam: PASSED")
 
+    async def test_cached_group_skips_db(self):
+        middleware = SpamFilterMiddleware()
+        handler = AsyncMock(return_value="Passed")
+
+        event = MagicMock(spec=Message)
+        event.text = "Hello good world"
+        event.caption = None
+        event.chat = MagicMock(spec=Chat)
+        event.chat.type = "supergroup"
+        event.chat.id = -100123456789
+
+        session = AsyncMock()
+        data = {"session": session}
+
+        mock_group = Group(id=1, telegram_id=-100123456789, title="Test Group", owner_id=1)
+
+        mock_res_group = MagicMock()
+        mock_res_group.scalars().first.return_value = mock_group
+
+        mock_res_kw = MagicMock()
+        mock_res_kw.scalars().all.return_value = ["badword"]
+
+        mock_res_domains = MagicMock()
+        mock_res_domains.all.return_value = []
+
+        session.execute.side_effect = [mock_res_group, mock_res_kw, mock_res_domains]
+
+        await middleware(handler, event, data)
+        await middleware(handler, event, data)
+
+        # Second message is served from cache
+        self.assertEqual(session.execute.call_count, 3)
+        self.assertEqual(handler.call_count, 2)
+
+        # A keyword write drops the entry, so the next message reloads it
+        group_cache.invalidate_group(1)
+        mock_res_kw.scalars().all.return_value = ["good"]
+        mock_res_owner = MagicMock()
+        mock_res_owner.scalars().first.return_value = User(id=1, telegram_id=987654321)
+        session.execute.side_effect = [mock_res_group, mock_res_kw, mock_res_domains, mock_res_owner]
+        event.message_id = 124
+        event.bot = AsyncMock()
+
+        await middleware(handler, event, data)
+
+        self.assertEqual(session.execute.call_count, 7)
+        self.assertEqual(handler.call_count, 2)
+        await spam_actions.join()
+        event.bot.delete_message.assert_called_once()
+
+        print("Test Cached Group: PASSED")
+
+    async def test_unregistered_chat_skips_db(self):
+        middleware = SpamFilterMiddleware()
+        handler = AsyncMock(return_value="Passed")
+
+        event = MagicMock(spec=Message)
+        event.text = "Hello badword"
+        event.caption = None
+        event.chat = MagicMock(spec=Chat)
+        event.chat.type = "supergroup"
+        event.chat.id = -100555
+
+        session = AsyncMock()
+        data = {"session": session}
+
+        mock_res_group = MagicMock()
+        mock_res_group.scalars().first.return_value = None
+        session.execute.return_value = mock_res_group
+
+        # First miss goes to the DB, then the negative cache answers
+        await middleware(handler, event, data)
+        await middleware(handler, event, data)
+        self.assertEqual(session.execute.call_count, 1)
+        self.assertEqual(handler.call_count, 2)
+
+        # Registration clears the negative entry
+        group_cache.mark_registered(-100555)
+        await middleware(handler, event, data)
+        self.assertEqual(session.execute.call_count, 2)
+
+        # With the bloom prefilter loaded, chats outside it never reach the DB
+        group_cache.set_known_ids([-100123456789])
+        event.chat.id = -100777
+        await middleware(handler, event, data)
+        self.assertEqual(session.execute.call_count, 2)
+
+        print("Test Unregistered Chat: PASSED")
+
+    async def test_known_ids_are_refreshed(self):
+        cache = GroupCache(refresh_interval=0.01)
+        registered = [-100111]
+
+        async def select_ids(stmt):
+            # A chat registered in this process while the query runs
+            cache.mark_registered(-100222)
+            result = MagicMock()
+            result.scalars().all.return_value = list(registered)
+            return result
+
+        session = AsyncMock()
+        session.execute.side_effect = select_ids
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__.return_value = session
+
+        await cache.load_known_ids(session)
+        self.assertIn(-100222, cache.known)
+        self.assertNotIn(-100333, cache.known)
+
+        # Registered by another replica after it was cached as unknown
+        cache.negative.add(-100333)
+        registered.append(-100333)
+        cache.start(session_factory)
+        await asyncio.sleep(0.05)
+        await cache.stop()
+        self.assertIn(-100333, cache.known)
+        self.assertNotIn(-100333, cache.negative)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from openpyxl import load_workbook
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.models import Base, User
+from services.excel import USER_EXPORT_COLUMNS, USER_EXPORT_HEADERS, export_users_to_excel
+from services.user_stream import stream_users, user_pages
+
+async def build_database(user_count):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as session:
+        # Ids with gaps, inserted out of order
+        session.add_all([User(id=i * 3, telegram_id=1000 + i, full_name=f"User {i}", username=f"u{i}", is_admin=0) for i in range(user_count, 0, -1)])
+        await session.commit()
+    return engine, Session
+
+class TestUserStream(unittest.IsolatedAsyncioTestCase):
+    async def test_keyset_pages(self):
+        engine, Session = await build_database(25)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        async with Session() as session:
+            pages = [page async for page in user_pages(session, (User.telegram_id,), batch_size=10)]
+            self.assertEqual([len(page) for page in pages], [10, 10, 5])
+            self.assertEqual([row[0] for page in pages for row in page], [i * 3 for i in range(1, 26)])
+            # One query per page plus the empty one that ends it; each selects only what it needs
+            self.assertEqual(len(statements), 4)
+            self.assertNotIn("full_name", statements[0])
+
+            # Resuming after a cursor (the broadcast's last sent id)
+            rest = [row.telegram_id async for page in user_pages(session, (User.telegram_id,), batch_size=10, after=60) for row in page]
+            self.assertEqual(rest, [1000 + i for i in range(21, 26)])
+        await engine.dispose()
+
+    async def test_export_streams_to_file(self):
+        engine, Session = await build_database(2500)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.xlsx")
+            async with Session() as session:
+                batches = []
+
+                async def counted():
+                    async for rows in stream_users(session, USER_EXPORT_COLUMNS, batch_size=1000):
+                        batches.append(len(rows))
+                        yield rows
+
+                count = await export_users_to_excel(counted(), path)
+
+            # One cursor, read in batches
+            self.assertEqual(count, 2500)
+            self.assertEqual(batches, [1000, 1000, 500])
+            self.assertEqual(len(statements), 1)
+
+            sheet = load_workbook(path, read_only=True)["Users"]
+            rows = list(sheet.iter_rows(values_only=True))
+            self.assertEqual(rows[0], USER_EXPORT_HEADERS)
+            self.assertEqual(len(rows), 2501)
+            self.assertEqual(rows[1], (3, 1001, "User 1", "u1", 0))
+        await engine.dispose()
+
+    async def test_export_of_no_users(self):
+        engine, Session = await build_database(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            async with Session() as session:
+                count = await export_users_to_excel(stream_users(session, USER_EXPORT_COLUMNS), os.path.join(tmp, "users.xlsx"))
+        self.assertEqual(count, 0)
+        await engine.dispose()
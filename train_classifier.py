@@ -0,0 +1,50 @@
+import asyncio
+import random
+import sys
+import time
+from sqlalchemy import select
+from database.engine import AsyncSessionLocal, engine
+from database.models import SpamSample
+from services.spam_classifier import SpamClassifier
+from config import CLASSIFIER_MODEL_PATH, CLASSIFIER_THRESHOLD
+
+async def train(path: str):
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(select(SpamSample.text, SpamSample.label))
+        rows = [(text, label) for text, label in res.all() if text]
+    await engine.dispose()
+
+    spam = sum(1 for _, label in rows if label == 1)
+    ham = len(rows) - spam
+    print(f"Loaded {len(rows)} samples ({spam} spam, {ham} not spam)")
+    if not spam or not ham:
+        print("Need both spam and not-spam samples. Enable CLASSIFIER_HAM_SAMPLE_RATE or collect owner feedback first.")
+        return
+
+    # Hold out 20% to report how the model does before it goes live
+    random.seed(0)
+    random.shuffle(rows)
+    split = max(1, len(rows) // 5)
+    test, train_rows = rows[:split], rows[split:]
+
+    started = time.perf_counter()
+    model = SpamClassifier.train([t for t, _ in train_rows], [l for _, l in train_rows])
+    print(f"Trained on {len(train_rows)} samples in {time.perf_counter() - started:.2f}s")
+
+    scores = model.score([t for t, _ in test])
+    predicted = scores >= CLASSIFIER_THRESHOLD
+    actual = [l == 1 for _, l in test]
+    tp = sum(1 for p, a in zip(predicted, actual) if p and a)
+    fp = sum(1 for p, a in zip(predicted, actual) if p and not a)
+    fn = sum(1 for p, a in zip(predicted, actual) if not p and a)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    print(f"Holdout at threshold {CLASSIFIER_THRESHOLD}: precision {precision:.3f}, recall {recall:.3f}")
+
+    # Final model uses every sample
+    model = SpamClassifier.train([t for t, _ in rows], [l for _, l in rows])
+    model.save(path)
+    print(f"Model saved to {path}")
+
+if __name__ == "__main__":
+    asyncio.run(train(sys.argv[1] if len(sys.argv) > 1 else CLASSIFIER_MODEL_PATH))